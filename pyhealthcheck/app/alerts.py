@@ -0,0 +1,163 @@
+"""
+Alert emails to `emails_to_alert` of healthstacks, enabled with `ALERTS_ENABLED`
+and `SMTP_HOST` settings.
+
+Outcomes of server side checks (`app/checks.py`) and of check results sent by
+workers are reported to one `AlertDispatcher` (see `app/core/alerts.py`). Every
+batch of alerts is sent as one email per recipient, all of them through one
+reused SMTP connection (see `app/core/mail.py`). When sending fails in the
+middle of a batch, only recipients that did not get their email yet get it on
+retry.
+
+Streaks and pending alerts live in memory of the process running the
+dispatcher, outcomes reported in any other process are dropped. Alerting
+therefore needs a single instance deployment with one API process, which gets
+all worker results and runs the scheduler, and must be enabled only there.
+"""
+
+from collections import defaultdict
+from datetime import timezone
+from email.message import EmailMessage
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+
+from app import models, schemas
+from app.core.alerts import Alert, AlertDispatcher
+from app.core.config import settings
+from app.core.mail import SmtpSender
+from app.session import async_session
+
+
+async def load_stacks(stack_ids: Iterable[int]) -> dict[int, tuple[str, list[str]]]:
+    """
+    Returns names and emails to alert of healthstacks, deleted ones are skipped.
+    """
+    async with async_session() as session:
+        result = await session.execute(
+            select(
+                models.HealthStack.id,
+                models.HealthStack.custom_name,
+                models.HealthStack.emails_to_alert,
+            ).where(models.HealthStack.id.in_(set(stack_ids)))
+        )
+        return {
+            stack_id: (custom_name or f"HealthStack {stack_id}", emails)
+            for stack_id, custom_name, emails in result
+        }
+
+
+def build_messages(
+    alerts: list[Alert],
+    stacks: dict[int, tuple[str, list[str]]],
+    delivered: Optional[dict[Alert, set[str]]] = None,
+) -> list[EmailMessage]:
+    """
+    One message per recipient, recipients in `delivered` of an alert are skipped.
+    """
+    delivered = delivered or {}
+    by_recipient: dict[str, list[tuple[str, Alert]]] = defaultdict(list)
+    for alert in sorted(alerts, key=lambda alert: (alert.is_up, alert.stack_id)):
+        if alert.stack_id not in stacks:
+            continue
+        name, emails = stacks[alert.stack_id]
+        for email in dict.fromkeys(emails):
+            if email not in delivered.get(alert, ()):
+                by_recipient[email].append((name, alert))
+
+    messages = []
+    for recipient, recipient_alerts in by_recipient.items():
+        down = sum(not alert.is_up for _, alert in recipient_alerts)
+        up = len(recipient_alerts) - down
+        subject = ", ".join(
+            part
+            for part in (
+                f"{down} healthstack(s) down" if down else "",
+                f"{up} healthstack(s) back up" if up else "",
+            )
+            if part
+        )
+        message = EmailMessage()
+        message["From"] = settings.ALERT_FROM_EMAIL
+        message["To"] = recipient
+        message["Subject"] = f"[{settings.PROJECT_NAME}] {subject}"
+        message.set_content(
+            "\n".join(
+                f"{'UP' if alert.is_up else 'DOWN'}: {name} (id {alert.stack_id}) "
+                f"since {alert.changed_at:%Y-%m-%d %H:%M:%S} UTC"
+                for name, alert in recipient_alerts
+            )
+        )
+        messages.append(message)
+    return messages
+
+
+sender: Optional[SmtpSender] = None
+
+
+async def notify(alerts: list[Alert], delivered: dict[Alert, set[str]]) -> None:
+    """
+    Messages are sent one by one and recorded in `delivered` right after.
+    """
+    assert sender is not None
+    stacks = await load_stacks(alert.stack_id for alert in alerts)
+    for message in build_messages(alerts, stacks, delivered):
+        await sender.send([message])
+        recipient = message["To"]
+        for alert in alerts:
+            if alert.stack_id in stacks and recipient in stacks[alert.stack_id][1]:
+                delivered[alert].add(recipient)
+
+
+dispatcher: AlertDispatcher = AlertDispatcher(
+    notify,
+    down_threshold=settings.ALERT_DOWN_THRESHOLD,
+    up_threshold=settings.ALERT_UP_THRESHOLD,
+    batch_seconds=settings.ALERT_BATCH_SECONDS,
+    queue_size=settings.ALERT_QUEUE_SIZE,
+)
+
+
+def report(stack_id: int, is_up: bool) -> None:
+    dispatcher.report(stack_id, is_up)
+
+
+def forget(stack_id: int) -> None:
+    dispatcher.forget(stack_id)
+
+
+def report_results(results: list[schemas.CheckResultCreate]) -> None:
+    """
+    Stack is up at a given time when every domain checked at that time is up.
+    """
+    outcomes: dict[tuple, bool] = {}
+    for result in results:
+        checked_at = result.checked_at
+        if checked_at.tzinfo is None:
+            checked_at = checked_at.replace(tzinfo=timezone.utc)
+        key = (checked_at, result.healthstack_id)
+        outcomes[key] = outcomes.get(key, True) and result.is_up
+    for (_, stack_id), is_up in sorted(outcomes.items()):
+        dispatcher.report(stack_id, is_up)
+
+
+async def start() -> None:
+    global sender
+    if not settings.ALERTS_ENABLED or settings.SMTP_HOST is None:
+        return
+    sender = SmtpSender(
+        host=settings.SMTP_HOST,
+        port=settings.SMTP_PORT,
+        username=settings.SMTP_USERNAME,
+        password=settings.SMTP_PASSWORD,
+        starttls=settings.SMTP_STARTTLS,
+    )
+    await dispatcher.start()
+
+
+async def stop() -> None:
+    global sender
+    await dispatcher.stop()
+    if sender is not None:
+        await sender.close()
+        sender = None
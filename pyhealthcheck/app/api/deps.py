@@ -10,11 +10,20 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app import schemas
 from app.core import security
 from app.core.config import settings
+from app.core.ttlcache import TTLCache
 from app.models import User
 from app.session import async_session
 
 reusable_oauth2 = OAuth2PasswordBearer(tokenUrl="v1/auth/access-token")
 
+# detached users loaded by `get_current_user`, they are never changed, every
+# request gets its own copy. Endpoints that change or delete users must call
+# `user_cache.invalidate`, other API instances see the change after at most
+# `AUTH_USER_CACHE_SECONDS`.
+user_cache: TTLCache[int, User] = TTLCache(
+    maxsize=settings.AUTH_USER_CACHE_SIZE, ttl=settings.AUTH_USER_CACHE_SECONDS
+)
+
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session() as session:
@@ -36,12 +45,19 @@ async def get_current_user(
             detail="Could not validate credentials",
         )
 
+    cached = user_cache.get(token_data.sub)
+    if cached is not None:
+        # attach a copy to the session without SELECT
+        return await session.merge(cached, load=False)
+
     result = await session.execute(select(User).where(User.id == token_data.sub))
     user: Optional[User] = result.scalars().first()
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    session.expunge(user)
+    user_cache.set(user.id, user)
+    return await session.merge(user, load=False)
 
 
 async def get_normal_user(current_user: User = Depends(get_current_user)) -> User:
@@ -10,10 +10,11 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.responses import JSONResponse
 
-from app import models, schemas
+from app import changes, models, schemas
 from app.api import deps
 from app.core import security
 from app.core.config import settings
+from app.core.hashing import hasher
 from app.models import User
 
 router = APIRouter(prefix="/auth")
@@ -34,7 +35,7 @@ async def login_access_token(
     if user is None:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
 
-    if not security.verify_password(form_data.password, user.hashed_password):  # type: ignore
+    if not await hasher.verify(form_data.password, user.hashed_password):  # type: ignore
         raise HTTPException(status_code=400, detail="Incorrect username or password")
 
     access_token, expire_at = security.create_access_token(user.id)
@@ -130,7 +131,7 @@ async def register_me(
 
     user = User(
         username=new_user.username,
-        hashed_password=security.get_password_hash(new_user.password),
+        hashed_password=await hasher.hash(new_user.password),
     )
 
     session.add(user)
@@ -153,12 +154,29 @@ async def register_worker(
 ):
     """
     Create new worker user, return created user instance with password.
+    Without `healthstack_id`, worker joins the pool of shard workers that split all the healthstacks without dedicated worker between them, see `/healthstack/worker/shard`.
     """
     if new_worker.register_key != settings.PYHEALTHCHECK_WORKER_REGISTER_KEY:
         return JSONResponse(
             status_code=404,
             content={"message": "Provided register key is not valid."},
         )
+    username = str(uuid.uuid4())
+    password = secrets.token_urlsafe()
+
+    if new_worker.healthstack_id is None:
+        user = User(
+            username=username,
+            is_worker=True,
+            is_shard_worker=True,
+            hashed_password=await hasher.hash(password),
+        )
+        session.add(user)
+        await changes.notify_changed(session)
+        await session.commit()
+        await session.refresh(user)
+        return schemas.UserWorkerWithPassword(**user.__dict__, password=password)
+
     result = await session.execute(
         select(models.HealthStack).where(
             models.HealthStack.id == new_worker.healthstack_id
@@ -175,13 +193,10 @@ async def register_worker(
             status_code=404,
             content={"message": "HealthStack already has a worker"},
         )
-    username = str(uuid.uuid4())
-    password = secrets.token_urlsafe()
-
     user = User(
         username=username,
         is_worker=True,
-        hashed_password=security.get_password_hash(password),
+        hashed_password=await hasher.hash(password),
     )
 
     session.add(user)
@@ -199,6 +214,17 @@ async def register_worker(
 
     healthstack.worker_id = user.id
     session.add(healthstack)
+    await changes.notify_changed(session)
     await session.commit()
 
     return schemas.UserWorkerWithPassword(**user.__dict__, password=password)
+
+
+@router.get("/password-hashing/stats", response_model=schemas.PasswordHashingStats)
+async def read_password_hashing_stats(
+    current_user: models.User = Depends(deps.get_root_user),
+):
+    """
+    Password hashing pool of this API process: queue wait, hash time and rejected calls. Root permission is required.
+    """
+    return hasher.stats
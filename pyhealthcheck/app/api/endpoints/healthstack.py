@@ -1,11 +1,19 @@
-from fastapi import APIRouter, Depends
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Mapping, Optional, Union
+
+from fastapi import APIRouter, Depends, Query, Request, Response
 from fastapi.responses import JSONResponse
-from sqlalchemy import select
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import and_, bindparam, delete, func, insert, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import aliased, joinedload
 
-from app import models, schemas
-from app.api import deps
+from app import alerts, changes, checks, models, results, rollups, schemas
+from app.api import deps, etag, pagination, serializers
+from app.core import hashring
+from app.core.config import settings
 
 router = APIRouter(prefix="/healthstack")
 
@@ -24,52 +32,442 @@ async def create_healthstack(
         user=current_user,
     )
     session.add(new_healthstack)
+    await changes.notify_changed(session)
     await session.commit()
     await session.refresh(new_healthstack)
+    checks.schedule_healthstack(new_healthstack)
     return new_healthstack
 
 
+BULK_INSERT_CHUNK = 500
+HEALTHSTACK_COLUMNS = (
+    "custom_name",
+    "domains",
+    "delay_between_checks",
+    "emails_to_alert",
+)
+
+
+def _validate_bulk_items(
+    model: type[BaseModel], items: list[Any]
+) -> tuple[list[tuple[int, Any]], dict[int, schemas.HealthStackBulkItem]]:
+    """
+    Valid items as (index, parsed item) and failed items by index.
+    """
+    valid = []
+    failed = {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            failed[index] = schemas.HealthStackBulkItem(
+                index=index, error="Item must be an object"
+            )
+            continue
+        try:
+            valid.append((index, model.parse_obj(item)))
+        except ValidationError as error:
+            message = "; ".join(
+                f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}"
+                for err in error.errors()
+            )
+            failed[index] = schemas.HealthStackBulkItem(index=index, error=message)
+    return valid, failed
+
+
+def _bulk_key(values: Mapping[str, Any]) -> tuple:
+    return tuple(
+        tuple(value) if isinstance(value, list) else value
+        for value in (values[column] for column in HEALTHSTACK_COLUMNS)
+    )
+
+
+def _bulk_response(
+    size: int,
+    succeeded: dict[int, schemas.HealthStackBulkItem],
+    failed: dict[int, schemas.HealthStackBulkItem],
+) -> schemas.HealthStackBulkResponse:
+    return schemas.HealthStackBulkResponse(
+        succeeded=len(succeeded),
+        failed=len(failed),
+        results=[succeeded.get(index) or failed[index] for index in range(size)],
+    )
+
+
+def _atomic_failure(response: schemas.HealthStackBulkResponse) -> JSONResponse:
+    return JSONResponse(
+        status_code=400,
+        content={
+            "message": "Some healthstacks are invalid, nothing was changed",
+            **response.dict(),
+        },
+    )
+
+
+@router.post("/bulk/create", response_model=schemas.HealthStackBulkResponse)
+async def bulk_create_healthstacks(
+    bulk_data: schemas.HealthStackBulkCreate,
+    current_user: models.User = Depends(deps.get_normal_user),
+    session: AsyncSession = Depends(deps.get_session),
+):
+    """
+    Create up to `HEALTHSTACK_BULK_MAX_ITEMS` healthstacks in one transaction with multi-row `INSERT ... RETURNING`.
+    Invalid items are reported in `results` (in order of the request) and the rest is created,
+    unless `atomic` is set, then nothing is created and 400 is returned.
+    """
+    valid, failed = _validate_bulk_items(
+        schemas.HealthStackCreate, bulk_data.healthstacks
+    )
+    size = len(bulk_data.healthstacks)
+    if failed and bulk_data.atomic:
+        return _atomic_failure(_bulk_response(size, {}, failed))
+
+    succeeded = {}
+    created = []
+    for start in range(0, len(valid), BULK_INSERT_CHUNK):
+        chunk = valid[start : start + BULK_INSERT_CHUNK]
+        # order of RETURNING rows is not guaranteed, they are matched to items
+        # by inserted values, items with equal values are interchangeable
+        indexes: dict[tuple, list[int]] = defaultdict(list)
+        for index, stack_data in chunk:
+            indexes[_bulk_key(stack_data.dict())].append(index)
+        result = await session.execute(
+            insert(models.HealthStack)
+            .values(
+                [
+                    {
+                        "user_id": current_user.id,
+                        **stack_data.dict(include=set(HEALTHSTACK_COLUMNS)),
+                    }
+                    for _, stack_data in chunk
+                ]
+            )
+            .returning(
+                models.HealthStack.id,
+                models.HealthStack.revision,
+                *(
+                    getattr(models.HealthStack, column)
+                    for column in HEALTHSTACK_COLUMNS
+                ),
+            )
+        )
+        for row in sorted(result, key=lambda row: row.id):
+            index = indexes[_bulk_key(row._mapping)].pop(0)
+            succeeded[index] = schemas.HealthStackBulkItem(
+                index=index, id=row.id, revision=row.revision
+            )
+            created.append(row)
+    if created:
+        await changes.notify_changed(session)
+    await session.commit()
+    for healthstack in created:
+        checks.schedule_healthstack(healthstack)
+    return _bulk_response(size, succeeded, failed)
+
+
+@router.post("/bulk/update", response_model=schemas.HealthStackBulkResponse)
+async def bulk_update_healthstacks(
+    bulk_data: schemas.HealthStackBulkUpdate,
+    current_user: models.User = Depends(deps.get_normal_user),
+    session: AsyncSession = Depends(deps.get_session),
+):
+    """
+    Replace up to `HEALTHSTACK_BULK_MAX_ITEMS` own healthstacks (found by `id`) in one transaction.
+    Invalid, unknown and repeated items are reported in `results` and the rest is updated,
+    unless `atomic` is set, then nothing is updated and 400 is returned.
+    """
+    valid, failed = _validate_bulk_items(
+        schemas.HealthStackUpdate, bulk_data.healthstacks
+    )
+    size = len(bulk_data.healthstacks)
+    result = await session.execute(
+        select(models.HealthStack.id).where(
+            models.HealthStack.id.in_({stack_data.id for _, stack_data in valid}),
+            models.HealthStack.user_id == current_user.id,
+        )
+    )
+    owned = set(result.scalars())
+    to_update: dict[int, tuple[int, schemas.HealthStackUpdate]] = {}
+    for index, stack_data in valid:
+        error = None
+        if stack_data.id not in owned:
+            error = "HealthStack not found"
+        elif stack_data.id in to_update:
+            error = "HealthStack is repeated in the request"
+        if error is not None:
+            failed[index] = schemas.HealthStackBulkItem(
+                index=index, id=stack_data.id, error=error
+            )
+        else:
+            to_update[stack_data.id] = (index, stack_data)
+    if failed and bulk_data.atomic:
+        return _atomic_failure(_bulk_response(size, {}, failed))
+
+    succeeded = {}
+    updated = []
+    if to_update:
+        # one statement executed for all the items, revisions are bumped by onupdate
+        await session.execute(
+            update(models.HealthStack)
+            .where(models.HealthStack.id == bindparam("_id"))
+            .values(
+                {column: bindparam(f"new_{column}") for column in HEALTHSTACK_COLUMNS}
+            )
+            .execution_options(synchronize_session=False),
+            [
+                {
+                    "_id": id,
+                    **{
+                        f"new_{column}": getattr(stack_data, column)
+                        for column in HEALTHSTACK_COLUMNS
+                    },
+                }
+                for id, (_, stack_data) in to_update.items()
+            ],
+        )
+        result = await session.execute(
+            select(
+                models.HealthStack.id,
+                models.HealthStack.revision,
+                models.HealthStack.domains,
+                models.HealthStack.delay_between_checks,
+            ).where(models.HealthStack.id.in_(to_update))
+        )
+        for row in result:
+            index = to_update[row.id][0]
+            succeeded[index] = schemas.HealthStackBulkItem(
+                index=index, id=row.id, revision=row.revision
+            )
+            updated.append(row)
+        await changes.notify_changed(session)
+    await session.commit()
+    for healthstack in updated:
+        checks.schedule_healthstack(healthstack)
+    return _bulk_response(size, succeeded, failed)
+
+
+@router.post("/bulk/delete", response_model=schemas.HealthStackBulkResponse)
+async def bulk_delete_healthstacks(
+    bulk_data: schemas.HealthStackBulkDelete,
+    current_user: models.User = Depends(deps.get_normal_user),
+    session: AsyncSession = Depends(deps.get_session),
+):
+    """
+    Delete up to `HEALTHSTACK_BULK_MAX_ITEMS` own healthstacks in one statement, with their check results and stats.
+    Unknown and repeated ids are reported in `results` and the rest is deleted,
+    unless `atomic` is set, then nothing is deleted and 400 is returned.
+    """
+    size = len(bulk_data.ids)
+    result = await session.execute(
+        delete(models.HealthStack)
+        .where(
+            models.HealthStack.id.in_(set(bulk_data.ids)),
+            models.HealthStack.user_id == current_user.id,
+        )
+        .returning(models.HealthStack.id)
+        .execution_options(synchronize_session=False)
+    )
+    deleted = set(result.scalars())
+    succeeded = {}
+    failed = {}
+    seen = set()
+    for index, id in enumerate(bulk_data.ids):
+        error = None
+        if id not in deleted:
+            error = "HealthStack not found"
+        elif id in seen:
+            error = "HealthStack is repeated in the request"
+        if error is not None:
+            failed[index] = schemas.HealthStackBulkItem(index=index, id=id, error=error)
+        else:
+            succeeded[index] = schemas.HealthStackBulkItem(index=index, id=id)
+        seen.add(id)
+    if failed and bulk_data.atomic:
+        await session.rollback()
+        return _atomic_failure(_bulk_response(size, {}, failed))
+
+    if deleted:
+        # check results and rollups have no foreign key to cascade
+        for model in (
+            models.CheckResult,
+            *(resolution.model for resolution in rollups.RESOLUTIONS.values()),
+        ):
+            await session.execute(
+                delete(model)
+                .where(model.healthstack_id.in_(deleted))
+                .execution_options(synchronize_session=False)
+            )
+        await changes.notify_changed(session)
+    await session.commit()
+    for id in deleted:
+        checks.unschedule_healthstack(id)
+    return _bulk_response(size, succeeded, failed)
+
+
+async def _healthstacks_versions(
+    session: AsyncSession, *where: Any, offset: int = 0, limit: Optional[int] = None
+) -> list:
+    """
+    Revisions of healthstacks with their users and workers, enough for ETag and next cursor.
+    """
+    owner = aliased(models.User)
+    worker = aliased(models.User)
+    result = await session.execute(
+        select(
+            models.HealthStack.id,
+            models.HealthStack.revision,
+            owner.revision,
+            worker.revision,
+        )
+        .join(owner, models.HealthStack.user_id == owner.id)
+        .outerjoin(worker, models.HealthStack.worker_id == worker.id)
+        .where(*where)
+        .order_by(models.HealthStack.id)
+        .offset(offset)
+        .limit(limit)
+    )
+    return result.all()
+
+
 @router.get("", response_model=list[schemas.HealthStack])
 async def get_all_health_stacks(
-    offset: int = 0,
+    request: Request,
+    cursor: Optional[str] = None,
+    offset: int = Query(default=0, deprecated=True),
     limit: int = 100,
     current_user: models.User = Depends(deps.get_maintainer_user),
     session: AsyncSession = Depends(deps.get_session),
 ):
-    users_result = await session.execute(
-        select(models.HealthStack)
-        .offset(offset)
-        .limit(limit)
-        .options(joinedload("user"))
-        .options(joinedload("worker"))
+    """
+    Pass `Next-Cursor` header of a page as `cursor` to get the next one.
+    """
+    try:
+        where = pagination.after_cursor(models.HealthStack.id, cursor)
+    except ValueError:
+        return JSONResponse(
+            status_code=400,
+            content={"message": pagination.INVALID_CURSOR_MESSAGE},
+        )
+    versions = await _healthstacks_versions(session, *where, offset=offset, limit=limit)
+    ids = [row.id for row in versions]
+    healthstacks_etag = etag.make_etag(versions)
+    if etag.is_not_modified(request, healthstacks_etag):
+        not_modified = etag.not_modified(healthstacks_etag)
+        pagination.set_next_cursor(not_modified, ids, limit)
+        return not_modified
+    result = await session.execute(
+        serializers.healthstacks_statement(*where, offset=offset, limit=limit)
+    )
+    response = serializers.FastJSONResponse(
+        [serializers.healthstack_to_dict(row) for row in result]
     )
-    return users_result.scalars().all()
+    etag.set_etag(response, healthstacks_etag)
+    pagination.set_next_cursor(response, ids, limit)
+    return response
+
+
+@router.post("/search/domains", response_model=schemas.DomainSearchResponse)
+async def search_healthstacks_by_domains(
+    search: schemas.DomainSearch,
+    current_user: models.User = Depends(deps.get_maintainer_user),
+    session: AsyncSession = Depends(deps.get_session),
+):
+    """
+    Healthstacks that monitor any of `domains` (all of them with `match_all`), grouped by domain.
+    One indexed query (GIN on `domains`) for the whole batch, domains are compared lower-cased.
+    """
+    domains = list(dict.fromkeys(search.domains))
+    if search.match_all:
+        condition = models.HealthStack.domains.contains(domains)
+    else:
+        condition = models.HealthStack.domains.overlap(domains)
+    result = await session.execute(
+        select(
+            models.HealthStack.id,
+            models.HealthStack.custom_name,
+            models.HealthStack.user_id,
+            models.HealthStack.worker_id,
+            models.HealthStack.domains,
+        )
+        .where(condition)
+        .order_by(models.HealthStack.id)
+    )
+    healthstacks: dict[str, list[schemas.DomainSearchMatch]] = {
+        domain: [] for domain in domains
+    }
+    for row in result:
+        match = schemas.DomainSearchMatch(
+            id=row.id,
+            custom_name=row.custom_name,
+            user_id=row.user_id,
+            worker_id=row.worker_id,
+        )
+        for domain in set(row.domains).intersection(healthstacks):
+            healthstacks[domain].append(match)
+    return schemas.DomainSearchResponse(healthstacks=healthstacks)
 
 
 @router.get("/me", response_model=list[schemas.HealthStack])
 async def get_all_my_health_stacks(
-    offset: int = 0,
+    request: Request,
+    cursor: Optional[str] = None,
+    offset: int = Query(default=0, deprecated=True),
     limit: int = 100,
     current_user: models.User = Depends(deps.get_normal_user),
     session: AsyncSession = Depends(deps.get_session),
 ):
-    users_result = await session.execute(
-        select(models.HealthStack)
-        .where(models.HealthStack.user_id == current_user.id)
-        .offset(offset)
-        .limit(limit)
-        .options(joinedload("user"))
-        .options(joinedload("worker"))
+    """
+    Pass `Next-Cursor` header of a page as `cursor` to get the next one.
+    """
+    try:
+        where = [
+            models.HealthStack.user_id == current_user.id,
+            *pagination.after_cursor(models.HealthStack.id, cursor),
+        ]
+    except ValueError:
+        return JSONResponse(
+            status_code=400,
+            content={"message": pagination.INVALID_CURSOR_MESSAGE},
+        )
+    versions = await _healthstacks_versions(session, *where, offset=offset, limit=limit)
+    ids = [row.id for row in versions]
+    healthstacks_etag = etag.make_etag(versions)
+    if etag.is_not_modified(request, healthstacks_etag):
+        not_modified = etag.not_modified(healthstacks_etag)
+        pagination.set_next_cursor(not_modified, ids, limit)
+        return not_modified
+    result = await session.execute(
+        serializers.healthstacks_statement(*where, offset=offset, limit=limit)
+    )
+    response = serializers.FastJSONResponse(
+        [serializers.healthstack_to_dict(row) for row in result]
     )
-    return users_result.scalars().all()
+    etag.set_etag(response, healthstacks_etag)
+    pagination.set_next_cursor(response, ids, limit)
+    return response
 
 
 @router.get("/me/{id}", response_model=schemas.HealthStack)
 async def get_my_healthstack_by_id(
     id: int,
+    request: Request,
+    response: Response,
     current_user: models.User = Depends(deps.get_normal_user),
     session: AsyncSession = Depends(deps.get_session),
 ):
+    versions = await _healthstacks_versions(
+        session,
+        models.HealthStack.user_id == current_user.id,
+        models.HealthStack.id == id,
+    )
+    if not versions:
+        # no ETag of an empty result, unknown stack is not "not modified"
+        return JSONResponse(
+            status_code=404,
+            content={"message": "HealthStack not found"},
+        )
+    healthstacks_etag = etag.make_etag(versions)
+    if etag.is_not_modified(request, healthstacks_etag):
+        return etag.not_modified(healthstacks_etag)
+    etag.set_etag(response, healthstacks_etag)
     result = await session.execute(
         select(models.HealthStack)
         .where(models.HealthStack.user == current_user, models.HealthStack.id == id)
@@ -88,9 +486,22 @@ async def get_my_healthstack_by_id(
 @router.get("/{id}", response_model=schemas.HealthStack)
 async def get_healthstack_by_id(
     id: int,
+    request: Request,
+    response: Response,
     current_user: models.User = Depends(deps.get_maintainer_user),
     session: AsyncSession = Depends(deps.get_session),
 ):
+    versions = await _healthstacks_versions(session, models.HealthStack.id == id)
+    if not versions:
+        # no ETag of an empty result, unknown stack is not "not modified"
+        return JSONResponse(
+            status_code=404,
+            content={"message": "HealthStack not found"},
+        )
+    healthstacks_etag = etag.make_etag(versions)
+    if etag.is_not_modified(request, healthstacks_etag):
+        return etag.not_modified(healthstacks_etag)
+    etag.set_etag(response, healthstacks_etag)
     result = await session.execute(
         select(models.HealthStack)
         .where(models.HealthStack.id == id)
@@ -109,9 +520,26 @@ async def get_healthstack_by_id(
 @router.get("/worker/me/{id}", response_model=schemas.HealthStack)
 async def get_worker_me_healthstack_by_id(
     id: int,
+    request: Request,
+    response: Response,
     current_user: models.User = Depends(deps.get_worker_user),
     session: AsyncSession = Depends(deps.get_session),
 ):
+    versions = await _healthstacks_versions(
+        session,
+        models.HealthStack.worker_id == current_user.id,
+        models.HealthStack.id == id,
+    )
+    if not versions:
+        # no ETag of an empty result, unknown stack is not "not modified"
+        return JSONResponse(
+            status_code=404,
+            content={"message": "HealthStack not found"},
+        )
+    healthstacks_etag = etag.make_etag(versions)
+    if etag.is_not_modified(request, healthstacks_etag):
+        return etag.not_modified(healthstacks_etag)
+    etag.set_etag(response, healthstacks_etag)
     result = await session.execute(
         select(models.HealthStack)
         .where(models.HealthStack.worker == current_user, models.HealthStack.id == id)
@@ -125,3 +553,456 @@ async def get_worker_me_healthstack_by_id(
             content={"message": "HealthStack not found"},
         )
     return healthstack
+
+
+async def _live_shard_workers(session: AsyncSession, now: datetime) -> tuple[int, ...]:
+    result = await session.execute(
+        select(models.User.id).where(
+            models.User.is_shard_worker.is_(True),
+            models.User.last_seen_at
+            > now - timedelta(seconds=settings.WORKER_SHARD_TIMEOUT_SECONDS),
+        )
+    )
+    return tuple(sorted(result.scalars()))
+
+
+async def _checkable_healthstack_ids(
+    session: AsyncSession, current_user: models.User, ids: set[int]
+) -> tuple[set[int], set[int]]:
+    """
+    Returns (existing, checkable by `current_user`) among `ids`. Worker can check its dedicated stacks,
+    stacks it holds an unexpired lease of and, for shard workers, stacks of its shard.
+    """
+    result = await session.execute(
+        select(
+            models.HealthStack.id,
+            models.HealthStack.worker_id,
+            and_(
+                models.HealthStack.leased_by_id == current_user.id,
+                models.HealthStack.lease_expires_at > func.now(),
+            ),
+        ).where(models.HealthStack.id.in_(ids))
+    )
+    rows = result.all()
+    ring = None
+    if current_user.is_shard_worker:
+        workers = await _live_shard_workers(session, datetime.now(timezone.utc))
+        ring = hashring.get_ring(workers, settings.WORKER_SHARD_VIRTUAL_NODES)
+    checkable = {
+        id
+        for id, worker_id, is_leased in rows
+        if worker_id == current_user.id
+        or is_leased
+        or (
+            ring is not None
+            and worker_id is None
+            and ring.node_for(id) == current_user.id
+        )
+    }
+    return {id for id, _, _ in rows}, checkable
+
+
+async def _shard_heartbeat(
+    session: AsyncSession, current_user: models.User
+) -> tuple[int, ...]:
+    """
+    Records heartbeat of shard worker and prunes shard workers not seen in `WORKER_SHARD_TIMEOUT_SECONDS`,
+    returns live shard workers. Every change of them (worker joined, came back or was pruned) is notified,
+    so that long-polling shard workers re-check their stacks.
+    """
+    now = datetime.now(timezone.utc)
+    result = await session.execute(
+        update(models.User)
+        .where(
+            models.User.is_shard_worker.is_(True),
+            models.User.last_seen_at
+            <= now - timedelta(seconds=settings.WORKER_SHARD_TIMEOUT_SECONDS),
+        )
+        .values(last_seen_at=None, revision=models.User.revision)
+        .returning(models.User.id)
+        .execution_options(synchronize_session=False)
+    )
+    pruned = result.scalars().all()
+    workers = await _live_shard_workers(session, now)
+    await session.execute(
+        update(models.User)
+        .where(models.User.id == current_user.id)
+        .values(last_seen_at=now, revision=models.User.revision)
+        .execution_options(synchronize_session=False)
+    )
+    if pruned or current_user.id not in workers:
+        await changes.notify_changed(session)
+    await session.commit()
+    return tuple(sorted({*workers, current_user.id}))
+
+
+async def _shard_healthstacks(
+    session: AsyncSession, current_user: models.User, workers: tuple[int, ...]
+) -> list:
+    """
+    Stacks without dedicated worker that belong to `current_user` among shard `workers`,
+    only rows in ring ranges of the worker are read (by indexed `ring_position`).
+    """
+    ring = hashring.get_ring(workers, settings.WORKER_SHARD_VIRTUAL_NODES)
+    ranges = ring.ranges(current_user.id)
+    if not ranges:
+        return []
+    result = await session.execute(
+        select(
+            models.HealthStack.id,
+            models.HealthStack.custom_name,
+            models.HealthStack.domains,
+            models.HealthStack.delay_between_checks,
+            models.HealthStack.revision,
+        )
+        .where(
+            models.HealthStack.worker_id.is_(None),
+            or_(
+                *(
+                    and_(
+                        models.HealthStack.ring_position >= start,
+                        models.HealthStack.ring_position < end,
+                    )
+                    for start, end in ranges
+                )
+            ),
+        )
+        .order_by(models.HealthStack.id)
+    )
+    return result.all()
+
+
+@router.get("/worker/shard", response_model=schemas.WorkerShard)
+async def get_worker_shard(
+    current_user: models.User = Depends(deps.get_worker_user),
+    session: AsyncSession = Depends(deps.get_session),
+):
+    """
+    All the healthstacks without dedicated worker that belong to the calling shard worker.
+    Stacks are split between shard workers seen in the last `WORKER_SHARD_TIMEOUT_SECONDS` by consistent hashing,
+    so when a worker joins or leaves, only a small share of stacks moves. Workers should call it at least that often, every call counts as heartbeat.
+    """
+    if not current_user.is_shard_worker:
+        return JSONResponse(
+            status_code=404,
+            content={"message": "Worker is not a shard worker"},
+        )
+    workers = await _shard_heartbeat(session, current_user)
+    healthstacks = await _shard_healthstacks(session, current_user, workers)
+    return schemas.WorkerShard(
+        worker_id=current_user.id, workers=len(workers), healthstacks=healthstacks
+    )
+
+
+@router.get("/worker/changes", response_model=schemas.HealthStackChanges)
+async def get_worker_healthstack_changes(
+    cursor: Optional[str] = Query(default=None, max_length=64),
+    timeout: int = Query(default=30, ge=0, le=300),
+    current_user: models.User = Depends(deps.get_worker_user),
+    session: AsyncSession = Depends(deps.get_session),
+):
+    """
+    Long-poll for changes of healthstacks assigned to the calling worker (its dedicated stack or its shard).
+    Returns all of them with a new `cursor` as soon as they differ from `cursor` (right away without `cursor`),
+    or `changed: false` after `timeout` seconds. Pass returned `cursor` to the next call.
+    Waiting shard workers send heartbeat every third of `WORKER_SHARD_TIMEOUT_SECONDS`.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    heartbeat_interval = settings.WORKER_SHARD_TIMEOUT_SECONDS / 3
+    next_heartbeat = loop.time()
+    while True:
+        event = changes.listener.event()
+        if current_user.is_shard_worker:
+            if loop.time() >= next_heartbeat:
+                next_heartbeat = loop.time() + heartbeat_interval
+                workers = await _shard_heartbeat(session, current_user)
+            else:
+                live_workers = await _live_shard_workers(
+                    session, datetime.now(timezone.utc)
+                )
+                workers = tuple(sorted({*live_workers, current_user.id}))
+            healthstacks = await _shard_healthstacks(session, current_user, workers)
+        else:
+            result = await session.execute(
+                select(
+                    models.HealthStack.id,
+                    models.HealthStack.custom_name,
+                    models.HealthStack.domains,
+                    models.HealthStack.delay_between_checks,
+                    models.HealthStack.revision,
+                ).where(models.HealthStack.worker_id == current_user.id)
+            )
+            healthstacks = result.all()
+        # do not keep database connection while waiting
+        await session.commit()
+
+        new_cursor = changes.cursor_for(healthstacks)
+        if new_cursor != cursor:
+            return schemas.HealthStackChanges(
+                cursor=new_cursor, changed=True, healthstacks=healthstacks
+            )
+        # re-check stacks only on notification or change of shard workers
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return schemas.HealthStackChanges(
+                    cursor=new_cursor, changed=False, healthstacks=[]
+                )
+            if current_user.is_shard_worker:
+                remaining = min(remaining, max(next_heartbeat - loop.time(), 0))
+            if await changes.listener.wait(event, remaining):
+                break
+            if current_user.is_shard_worker and loop.time() >= next_heartbeat:
+                next_heartbeat = loop.time() + heartbeat_interval
+                if await _shard_heartbeat(session, current_user) != workers:
+                    break
+
+
+@router.post("/worker/lease", response_model=list[schemas.HealthStackLease])
+async def lease_worker_healthstacks(
+    limit: int = Query(default=100, ge=1, le=1000),
+    current_user: models.User = Depends(deps.get_worker_user),
+    session: AsyncSession = Depends(deps.get_session),
+):
+    """
+    Lease up to `limit` due healthstacks for `HEALTHSTACK_LEASE_SECONDS`.
+    Stacks are claimed with `FOR UPDATE SKIP LOCKED`, so many workers can lease at the same time without getting the same stack.
+    Stacks with a dedicated worker can be leased only by it. When lease expires before it is released, stack can be leased again by any worker.
+    """
+    now = func.now()
+    claimable = (
+        select(models.HealthStack.id)
+        .where(
+            models.HealthStack.next_check_at <= now,
+            or_(
+                models.HealthStack.lease_expires_at.is_(None),
+                models.HealthStack.lease_expires_at < now,
+            ),
+            or_(
+                models.HealthStack.worker_id.is_(None),
+                models.HealthStack.worker_id == current_user.id,
+            ),
+        )
+        .order_by(models.HealthStack.next_check_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    result = await session.execute(
+        update(models.HealthStack)
+        .where(models.HealthStack.id.in_(claimable.scalar_subquery()))
+        .values(
+            # leases are not configuration changes, keep the revision
+            revision=models.HealthStack.revision,
+            leased_by_id=current_user.id,
+            lease_expires_at=now
+            + timedelta(seconds=settings.HEALTHSTACK_LEASE_SECONDS),
+        )
+        .returning(
+            models.HealthStack.id,
+            models.HealthStack.custom_name,
+            models.HealthStack.domains,
+            models.HealthStack.delay_between_checks,
+            models.HealthStack.lease_expires_at,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    healthstacks = result.all()
+    await session.commit()
+    return healthstacks
+
+
+@router.post("/worker/lease/release", response_model=None, status_code=204)
+async def release_worker_healthstacks(
+    release_data: schemas.HealthStackLeaseRelease,
+    current_user: models.User = Depends(deps.get_worker_user),
+    session: AsyncSession = Depends(deps.get_session),
+):
+    """
+    Release leased healthstacks after checking them, every stack is due again after its `delay_between_checks`.
+    """
+    await session.execute(
+        update(models.HealthStack)
+        .where(
+            models.HealthStack.id.in_(release_data.ids),
+            models.HealthStack.leased_by_id == current_user.id,
+        )
+        .values(
+            revision=models.HealthStack.revision,
+            leased_by_id=None,
+            lease_expires_at=None,
+            next_check_at=func.greatest(
+                models.HealthStack.next_check_at
+                + func.make_interval(
+                    0, 0, 0, 0, 0, 0, models.HealthStack.delay_between_checks
+                ),
+                func.now(),
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    return None
+
+
+@router.post(
+    "/worker/results",
+    response_model=schemas.CheckResultBatchResponse,
+    status_code=201,
+)
+async def create_check_results(
+    batch: schemas.CheckResultBatch,
+    current_user: models.User = Depends(deps.get_worker_user),
+    session: AsyncSession = Depends(deps.get_session),
+):
+    """
+    Store batch of check results (up to `CHECK_RESULT_MAX_BATCH`) with a single `COPY` and add them to rollups.
+    Results must be checked at most one day ago, they are kept for `CHECK_RESULT_RETENTION_DAYS`.
+    Every stack must be checked by the calling worker: its dedicated stack, a stack it holds a lease of or a stack of its shard.
+    """
+    oldest, newest = results.accepted_range(datetime.now(timezone.utc))
+    for result in batch.results:
+        checked_at = result.checked_at
+        if checked_at.tzinfo is None:
+            checked_at = checked_at.replace(tzinfo=timezone.utc)
+        if not oldest <= checked_at <= newest:
+            return JSONResponse(
+                status_code=400,
+                content={
+                    "message": f"Result checked_at must be between {oldest.isoformat()} and {newest.isoformat()}"
+                },
+            )
+
+    healthstack_ids = {result.healthstack_id for result in batch.results}
+    existing, checkable = await _checkable_healthstack_ids(
+        session, current_user, healthstack_ids
+    )
+    if len(existing) != len(healthstack_ids):
+        return JSONResponse(
+            status_code=404,
+            content={"message": "HealthStack not found"},
+        )
+    if len(checkable) != len(healthstack_ids):
+        return JSONResponse(
+            status_code=403,
+            content={"message": "HealthStack is not checked by this worker"},
+        )
+
+    inserted = await results.copy_results(session, batch.results, current_user.id)
+    await rollups.upsert_rollups(session, batch.results)
+    await session.commit()
+    alerts.report_results(batch.results)
+    return schemas.CheckResultBatchResponse(inserted=inserted)
+
+
+async def _load_stats_rollups(
+    id: int,
+    since: Optional[datetime],
+    until: Optional[datetime],
+    resolution: Optional[schemas.CheckRollupResolution],
+    current_user: models.User,
+    session: AsyncSession,
+) -> Union[JSONResponse, tuple[dict, list[tuple[datetime, rollups.Rollup]]]]:
+    result = await session.execute(
+        select(models.HealthStack.user_id).where(models.HealthStack.id == id)
+    )
+    owner_id = result.scalar()
+    if owner_id is None or (
+        owner_id != current_user.id
+        and not current_user.is_maintainer
+        and not current_user.is_root
+    ):
+        return JSONResponse(
+            status_code=404,
+            content={"message": "HealthStack not found"},
+        )
+    now = datetime.now(timezone.utc)
+    if until is None:
+        until = now
+    elif until.tzinfo is None:
+        until = until.replace(tzinfo=timezone.utc)
+    if since is None:
+        since = until - timedelta(days=1)
+    elif since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if since >= until:
+        return JSONResponse(
+            status_code=400,
+            content={"message": "Parameter since must be earlier than until"},
+        )
+    if resolution is None:
+        resolution = schemas.CheckRollupResolution(
+            rollups.choose_resolution(since, until, now)
+        )
+    else:
+        step = rollups.RESOLUTIONS[resolution.value].step
+        if (until - since) / step > settings.CHECK_STATS_MAX_POINTS:
+            return JSONResponse(
+                status_code=400,
+                content={
+                    "message": f"Range has more than {settings.CHECK_STATS_MAX_POINTS} buckets of resolution {resolution.value}, use coarser resolution or omit it"
+                },
+            )
+    header = {
+        "healthstack_id": id,
+        "resolution": resolution,
+        "since": since,
+        "until": until,
+    }
+    return header, await rollups.load_rollups(
+        session, id, resolution.value, since, until
+    )
+
+
+@router.get("/{id}/stats", response_model=schemas.HealthStackStats)
+async def get_healthstack_stats(
+    id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    resolution: Optional[schemas.CheckRollupResolution] = None,
+    current_user: models.User = Depends(deps.get_normal_user),
+    session: AsyncSession = Depends(deps.get_session),
+):
+    """
+    Uptime and latency of own healthstack (any for maintainers) from rollups, by default for the last day.
+    When `resolution` is not given, the finest one that is cheap for the range is used,
+    explicit `resolution` is refused (400) when the range has more than `CHECK_STATS_MAX_POINTS` of its buckets.
+    Range is extended to full buckets of `resolution`.
+    """
+    loaded = await _load_stats_rollups(
+        id, since, until, resolution, current_user, session
+    )
+    if isinstance(loaded, JSONResponse):
+        return loaded
+    header, buckets = loaded
+    total = rollups.Rollup()
+    for _, rollup in buckets:
+        total.merge(rollup)
+    return schemas.HealthStackStats(**header, **total.stats())
+
+
+@router.get("/{id}/stats/series", response_model=schemas.HealthStackStatsSeries)
+async def get_healthstack_stats_series(
+    id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    resolution: Optional[schemas.CheckRollupResolution] = None,
+    current_user: models.User = Depends(deps.get_normal_user),
+    session: AsyncSession = Depends(deps.get_session),
+):
+    """
+    Same as `/healthstack/{id}/stats`, but for every bucket of `resolution` that has results.
+    """
+    loaded = await _load_stats_rollups(
+        id, since, until, resolution, current_user, session
+    )
+    if isinstance(loaded, JSONResponse):
+        return loaded
+    header, buckets = loaded
+    return schemas.HealthStackStatsSeries(
+        **header,
+        points=[
+            schemas.CheckStatsPoint(bucket=bucket, **rollup.stats())
+            for bucket, rollup in buckets
+        ],
+    )
@@ -1,12 +1,15 @@
 import asyncio
-from typing import Any, Coroutine, Optional
+import socket
+from typing import AsyncGenerator, Optional
 
-import _socket
-import aioping
-from fastapi import APIRouter, Query
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from app import schemas
+from app import models, schemas
+from app.api import deps
+from app.core import icmp, probes, rtt
+from app.core.config import settings
+from app.core.singleflight import SingleFlight
 from app.schemas.ping import SinglePingResponse
 
 router = APIRouter(prefix="/ping")
@@ -16,28 +19,156 @@ class PingErrorResponses:
     time_out = "Timed out"
     invalid_host = "Name or service not known, invalid hostname"
     unknown = "Unknown error"
-    to_many_hostnames = "Too many hostnames. Maximum number is 50."
+    to_many_hostnames = (
+        f"Too many hostnames. Maximum number is {settings.PING_MAX_HOSTNAMES}."
+    )
+    deadline_exceeded = "Request deadline exceeded before ping finished"
+    invalid_target = "Invalid probe target, use tcp://host:port, http://host/path or https://host/path"
+    bad_status = "Unexpected HTTP status code"
+    bad_response = "Malformed HTTP response"
+    forbidden_target = "Probe target is not allowed, only public addresses and allowed ports can be probed"
 
 
-async def make_ping(hostname: str, timeout: int) -> schemas.SinglePingResponse:
+ping_flights: SingleFlight[schemas.SinglePingResponse] = SingleFlight(
+    reuse_window=settings.PING_RESULT_REUSE_MS / 1000
+)
+
+
+async def make_ping(
+    hostname: str,
+    timeout: int,
+    count: int = 1,
+    interval_ms: int = 100,
+    adaptive_timeout: bool = False,
+    all_addresses: bool = False,
+) -> schemas.SinglePingResponse:
+    """
+    Identical pings (same hostname and options) running at the same time share one echo.
+    """
+    options = (timeout, count, interval_ms, adaptive_timeout, all_addresses)
+    return await ping_flights.run(
+        (hostname, *options), lambda: _make_ping(hostname, *options)
+    )
+
+
+async def _make_ping(
+    hostname: str,
+    timeout: int,
+    count: int,
+    interval_ms: int,
+    adaptive_timeout: bool,
+    all_addresses: bool,
+) -> schemas.SinglePingResponse:
     live: bool = False
     delay: Optional[float] = None
     message: str = ""
+    statistics: Optional[schemas.PingStatistics] = None
+    address: Optional[str] = None
+    addresses: Optional[list[schemas.AddressPingResponse]] = None
+    probe_timeout: float = timeout
+    if adaptive_timeout:
+        probe_timeout = rtt.estimator.timeout(hostname, maximum=timeout)
     try:
-        delay = await aioping.ping(hostname, timeout=timeout) * 1000  # type: ignore
-    except TimeoutError:
-        message = PingErrorResponses.time_out
-    except _socket.gaierror:
+        if all_addresses:
+            address_samples = await icmp.engine.samples_all_addresses(
+                hostname,
+                count=count,
+                interval=interval_ms / 1000,
+                timeout=probe_timeout,
+                stagger=settings.PING_ADDRESS_STAGGER_MS / 1000,
+            )
+        else:
+            family, sockaddr = await icmp.engine.resolve(hostname)
+            samples = await icmp.engine.samples(
+                family,
+                sockaddr,
+                count=count,
+                interval=interval_ms / 1000,
+                timeout=probe_timeout,
+            )
+            address_samples = [(sockaddr[0], samples)]
+    except socket.gaierror:
         message = PingErrorResponses.invalid_host
     except Exception:
         message = PingErrorResponses.unknown
     else:
-        message = f"Ping response in {delay} ms"
-        live = True
-    finally:
-        return schemas.SinglePingResponse.parse_obj(
-            {"hostname": hostname, "live": live, "delay": delay, "message": message}
+        address_delays = [
+            (ip, [sample * 1000 for sample in samples if sample is not None])
+            for ip, samples in address_samples
+        ]
+        if all_addresses:
+            addresses = [
+                schemas.AddressPingResponse(
+                    address=ip, live=bool(delays), delay=_average(delays)
+                )
+                for ip, delays in address_delays
+            ]
+        # fastest reachable address stands for the whole host
+        address, delays = min(
+            address_delays, key=lambda item: (not item[1], _average(item[1]) or 0)
         )
+        for sample in delays:
+            rtt.estimator.update(hostname, sample / 1000)
+        for _ in range(count - len(delays)):
+            rtt.estimator.on_timeout(hostname)
+        if count > 1:
+            statistics = ping_statistics(count, delays)
+        if delays:
+            delay = _average(delays)
+            message = f"Ping response in {delay} ms"
+            live = True
+        else:
+            message = PingErrorResponses.time_out
+    # not in `finally`, returning there would swallow CancelledError and the
+    # cancelled ping would be shared (and reused) as a timeout
+    return schemas.SinglePingResponse.parse_obj(
+        {
+            "hostname": hostname,
+            "live": live,
+            "delay": delay,
+            "message": message,
+            "statistics": statistics,
+            "address": address,
+            "addresses": addresses,
+        }
+    )
+
+
+def _average(delays: list[float]) -> Optional[float]:
+    return sum(delays) / len(delays) if delays else None
+
+
+def ping_statistics(sent: int, delays: list[float]) -> schemas.PingStatistics:
+    """
+    RTT statistics in ms of `delays` received out of `sent` echo requests.
+    Percentiles are linearly interpolated between the closest ranks.
+    """
+    received = len(delays)
+    loss = (sent - received) / sent
+    if not delays:
+        return schemas.PingStatistics(sent=sent, received=received, loss=loss)
+
+    delays = sorted(delays)
+    avg = sum(delays) / received
+    stddev = (sum((delay - avg) ** 2 for delay in delays) / received) ** 0.5
+
+    def percentile(q: float) -> float:
+        rank = (received - 1) * q
+        low = int(rank)
+        high = min(low + 1, received - 1)
+        return delays[low] + (delays[high] - delays[low]) * (rank - low)
+
+    return schemas.PingStatistics(
+        sent=sent,
+        received=received,
+        loss=loss,
+        min=delays[0],
+        avg=avg,
+        max=delays[-1],
+        stddev=stddev,
+        p50=percentile(0.5),
+        p95=percentile(0.95),
+    )
 
 
 @router.post(
@@ -49,11 +180,34 @@ async def make_ping(hostname: str, timeout: int) -> schemas.SinglePingResponse:
 async def make_single_ping(
     ping_data: schemas.SinglePing,
     timeout: int = Query(default=2, description="Timeout in seconds for every ping"),
+    count: int = Query(default=1, ge=1, le=20, description="Echo requests per host"),
+    interval_ms: int = Query(
+        default=100,
+        ge=1,
+        le=10000,
+        description="Delay in milliseconds between echo requests",
+    ),
+    adaptive_timeout: bool = Query(
+        default=False,
+        description="Derive timeout of every ping from the host's RTT history, `timeout` is the maximum",
+    ),
+    all_addresses: bool = Query(
+        default=False,
+        description="Ping every A/AAAA address of the hostname, fastest reachable one is the result",
+    ),
 ):
     """
     Make ICMP ping to single hostname or IP address.
+    With `count` > 1, echo requests are sent every `interval_ms` and `statistics` are returned.
     """
-    result = await make_ping(ping_data.hostname, timeout)
+    result = await make_ping(
+        ping_data.hostname,
+        timeout,
+        count,
+        interval_ms,
+        adaptive_timeout,
+        all_addresses,
+    )
     if result.live:
         return result
     else:
@@ -69,23 +223,245 @@ async def make_single_ping(
 async def make_many_pings(
     ping_data: schemas.ManyPings,
     timeout: int = Query(default=2, description="Timeout in seconds for every ping"),
+    count: int = Query(default=1, ge=1, le=20, description="Echo requests per host"),
+    interval_ms: int = Query(
+        default=100,
+        ge=1,
+        le=10000,
+        description="Delay in milliseconds between echo requests",
+    ),
+    adaptive_timeout: bool = Query(
+        default=False,
+        description="Derive timeout of every ping from the host's RTT history, `timeout` is the maximum",
+    ),
+    all_addresses: bool = Query(
+        default=False,
+        description="Ping every A/AAAA address of the hostname, fastest reachable one is the result",
+    ),
+    deadline_ms: Optional[int] = Query(
+        default=None,
+        ge=1,
+        description="Deadline in milliseconds for the whole request, unfinished pings are returned as pending",
+    ),
 ):
     """
-    Make ICMP pings to up to 50 hostnames or IP addresses.
+    Make ICMP pings to up to `PING_MAX_HOSTNAMES` (5000 by default) hostnames or IP addresses.
     Warning, `results` list is returned not necessarily in the order of `hostname_list`. Duplicated hostnames are ommited.
     """
-    if len(ping_data.hostname_list) > 50:
+    if len(ping_data.hostname_list) > settings.PING_MAX_HOSTNAMES:
         return JSONResponse(
             status_code=400, content={"message": PingErrorResponses.to_many_hostnames}
         )
-    async_results: list[Coroutine[Any, Any, SinglePingResponse]] = []
+    tasks: dict[asyncio.Future[SinglePingResponse], str] = {}
 
-    for hostname in ping_data.hostname_list:
-        async_results.append(make_ping(hostname, timeout))
+    for hostname in dict.fromkeys(ping_data.hostname_list):
+        tasks[
+            asyncio.ensure_future(
+                make_ping(
+                    hostname,
+                    timeout,
+                    count,
+                    interval_ms,
+                    adaptive_timeout,
+                    all_addresses,
+                )
+            )
+        ] = hostname
 
-    ping_results = await asyncio.gather(*async_results)
+    ping_results: list[SinglePingResponse] = []
+    pending_results: list[SinglePingResponse] = []
+    if tasks:
+        done, pending = await asyncio.wait(
+            tasks, timeout=deadline_ms / 1000 if deadline_ms else None
+        )
+        for task in pending:
+            task.cancel()
+            pending_results.append(
+                SinglePingResponse(
+                    hostname=tasks[task],
+                    live=False,
+                    delay=None,
+                    message=PingErrorResponses.deadline_exceeded,
+                )
+            )
+        ping_results = [task.result() for task in done]
 
     live = sum((result.live for result in ping_results))
     not_live = len(ping_results) - live
 
-    return {"live": live, "not_live": not_live, "results": ping_results}
+    return {
+        "live": live,
+        "not_live": not_live,
+        "pending": len(pending_results),
+        "results": ping_results + pending_results,
+    }
+
+
+@router.post(
+    "/many/stream",
+    status_code=200,
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {"application/x-ndjson": {}},
+            "description": "One `SinglePingResponse` per line, `ManyPingsSummary` last",
+        },
+        400: {"model": schemas.ErrorMessage},
+    },
+)
+async def make_many_pings_stream(
+    ping_data: schemas.ManyPings,
+    timeout: int = Query(default=2, description="Timeout in seconds for every ping"),
+    count: int = Query(default=1, ge=1, le=20, description="Echo requests per host"),
+    interval_ms: int = Query(
+        default=100,
+        ge=1,
+        le=10000,
+        description="Delay in milliseconds between echo requests",
+    ),
+    adaptive_timeout: bool = Query(
+        default=False,
+        description="Derive timeout of every ping from the host's RTT history, `timeout` is the maximum",
+    ),
+    all_addresses: bool = Query(
+        default=False,
+        description="Ping every A/AAAA address of the hostname, fastest reachable one is the result",
+    ),
+):
+    """
+    Same as `/ping/many`, but streamed as NDJSON: every result is written as a separate line as soon as its ping finishes,
+    the last line is a summary with `live` and `not_live` counts.
+    """
+    if len(ping_data.hostname_list) > settings.PING_MAX_HOSTNAMES:
+        return JSONResponse(
+            status_code=400, content={"message": PingErrorResponses.to_many_hostnames}
+        )
+
+    async def stream_results() -> AsyncGenerator[str, None]:
+        live = 0
+        not_live = 0
+        tasks = [
+            asyncio.ensure_future(
+                make_ping(
+                    hostname,
+                    timeout,
+                    count,
+                    interval_ms,
+                    adaptive_timeout,
+                    all_addresses,
+                )
+            )
+            for hostname in dict.fromkeys(ping_data.hostname_list)
+        ]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                result: SinglePingResponse = await next_result
+                if result.live:
+                    live += 1
+                else:
+                    not_live += 1
+                yield result.json() + "\n"
+        finally:
+            # client disconnected, do not keep pinging for nobody
+            for task in tasks:
+                task.cancel()
+        yield schemas.ManyPingsSummary(live=live, not_live=not_live).json() + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+async def make_probe(target: str, timeout: int) -> schemas.ProbeResponse:
+    live: bool = False
+    timings: Optional[probes.ProbeTimings] = None
+    message: str = ""
+    try:
+        timings = await probes.probe(probes.parse_target(target), timeout=timeout)
+    except probes.BadResponse:
+        message = PingErrorResponses.bad_response
+    except probes.ForbiddenTarget:
+        message = PingErrorResponses.forbidden_target
+    except ValueError:
+        message = PingErrorResponses.invalid_target
+    except TimeoutError:
+        message = PingErrorResponses.time_out
+    except socket.gaierror:
+        message = PingErrorResponses.invalid_host
+    except Exception:
+        message = PingErrorResponses.unknown
+    else:
+        if timings.status_code is not None and timings.status_code >= 400:
+            message = PingErrorResponses.bad_status
+        else:
+            message = f"Probe response in {timings.total * 1000} ms"
+            live = True
+    result = {"target": target, "live": live, "message": message}
+    if timings is not None:
+        result.update(
+            {
+                "status_code": timings.status_code,
+                "reused_connection": timings.reused_connection,
+            }
+        )
+        for name in ("connect", "tls", "first_byte", "total"):
+            value = getattr(timings, name)
+            result[name] = value * 1000 if value is not None else None
+    return schemas.ProbeResponse.parse_obj(result)
+
+
+@router.post(
+    "/probe",
+    status_code=200,
+    response_model=schemas.ProbeResponse,
+    responses={400: {"model": schemas.ProbeResponse}},
+)
+async def make_single_probe(
+    probe_data: schemas.Probe,
+    timeout: int = Query(default=2, description="Timeout in seconds for every probe"),
+    current_user: models.User = Depends(deps.get_current_user),
+):
+    """
+    Probe `tcp://host:port` (TCP connect) or `http(s)://host/path` (GET request) target.
+    Connections to HTTP(S) origins are kept alive and reused by next probes, new connections do a full TLS handshake.
+    Times are in milliseconds, `connect` and `tls` are `null` for reused connections.
+    Only public addresses and `PROBE_ALLOWED_PORTS` can be probed.
+    """
+    result = await make_probe(probe_data.target, timeout)
+    if result.live:
+        return result
+    else:
+        return JSONResponse(status_code=400, content=result.dict())
+
+
+@router.post(
+    "/probe/many",
+    status_code=200,
+    response_model=schemas.ManyProbesResponse,
+    responses={400: {"model": schemas.ErrorMessage}},
+)
+async def make_many_probes(
+    probe_data: schemas.ManyProbes,
+    timeout: int = Query(default=2, description="Timeout in seconds for every probe"),
+    current_user: models.User = Depends(deps.get_current_user),
+):
+    """
+    Probe up to `PING_MAX_HOSTNAMES` targets, see `/ping/probe`. Duplicated targets are ommited.
+    At most `PROBE_MAX_CONCURRENCY` probes are open at once, `timeout` starts when a probe does.
+    """
+    if len(probe_data.target_list) > settings.PING_MAX_HOSTNAMES:
+        return JSONResponse(
+            status_code=400, content={"message": PingErrorResponses.to_many_hostnames}
+        )
+    semaphore = asyncio.Semaphore(settings.PROBE_MAX_CONCURRENCY)
+
+    async def bounded_probe(target: str) -> schemas.ProbeResponse:
+        async with semaphore:
+            return await make_probe(target, timeout)
+
+    probe_results = await asyncio.gather(
+        *(bounded_probe(target) for target in dict.fromkeys(probe_data.target_list))
+    )
+
+    live = sum((result.live for result in probe_results))
+    not_live = len(probe_results) - live
+
+    return {"live": live, "not_live": not_live, "results": probe_results}
@@ -1,13 +1,13 @@
 from typing import Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request, Response
 from fastapi.responses import JSONResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core import security
 from app import models, schemas
-from app.api import deps
-from app.core.security import get_password_hash
+from app.api import deps, etag, pagination, serializers
+from app.core.hashing import hasher
 from app.models import User
 
 router = APIRouter(prefix="/users")
@@ -31,22 +31,33 @@ async def update_user_me(
                 status_code=404,
                 content={"message": is_password_strong_msg},
             )
-        current_user.hashed_password = get_password_hash(user_update.password)  # type: ignore
+        current_user.hashed_password = await hasher.hash(user_update.password)  # type: ignore
     if user_update.full_name is not None:
         current_user.full_name = user_update.full_name  # type: ignore
 
     session.add(current_user)
     await session.commit()
+    deps.user_cache.invalidate(current_user.id)
     await session.refresh(current_user)
 
     return current_user
 
 
 @router.get("/me", response_model=schemas.User)
-async def read_user_me(current_user: models.User = Depends(deps.get_normal_user)):
+async def read_user_me(
+    request: Request,
+    response: Response,
+    current_user: models.User = Depends(deps.get_normal_user),
+):
     """
     Get current user.
+    User comes from the auth cache, so after a change made through another API instance
+    the ETag can be stale for up to `AUTH_USER_CACHE_SECONDS`.
     """
+    user_etag = etag.make_etag(current_user.id, current_user.revision)
+    if etag.is_not_modified(request, user_etag):
+        return etag.not_modified(user_etag)
+    etag.set_etag(response, user_etag)
     return current_user
 
 
@@ -71,16 +82,30 @@ async def read_user(
 
 @router.get("", response_model=list[schemas.User])
 async def read_all_users(
-    offset: int = 0,
+    cursor: Optional[str] = None,
+    offset: int = Query(default=0, deprecated=True),
     limit: int = 100,
     current_user: models.User = Depends(deps.get_maintainer_user),
     session: AsyncSession = Depends(deps.get_session),
 ):
     """
     Get all users. Maintainer permission is required.
+    Pass `Next-Cursor` header of a page as `cursor` to get the next one.
     """
-    users_result = await session.execute(select(User).offset(offset).limit(limit))
-    return users_result.scalars().all()
+    try:
+        where = pagination.after_cursor(User.id, cursor)
+    except ValueError:
+        return JSONResponse(
+            status_code=400,
+            content={"message": pagination.INVALID_CURSOR_MESSAGE},
+        )
+    users_result = await session.execute(
+        serializers.users_statement(*where, offset=offset, limit=limit)
+    )
+    users = [serializers.user_to_dict(row) for row in users_result]
+    response = serializers.FastJSONResponse(users)
+    pagination.set_next_cursor(response, [user["id"] for user in users], limit)
+    return response
 
 
 @router.delete("/me", response_model=None, status_code=204)
@@ -93,6 +118,7 @@ async def read_delete_me(
     """
     await session.delete(current_user)
     await session.commit()
+    deps.user_cache.invalidate(current_user.id)
     return None
 
 
@@ -121,7 +147,7 @@ async def update_other_user(
                 status_code=404,
                 content={"message": is_password_strong_msg},
             )
-        user.hashed_password = get_password_hash(user_update.password)  # type: ignore
+        user.hashed_password = await hasher.hash(user_update.password)  # type: ignore
     if user_update.full_name is not None:
         user.full_name = user_update.full_name  # type: ignore
     if user_update.is_maintainer is not None:
@@ -130,9 +156,12 @@ async def update_other_user(
         if current_user.is_root:
             user.is_root = user_update.is_root  # type: ignore
 
-    session.add(current_user)
+    session.add(user)
     await session.commit()
-    await session.refresh(current_user)
+    deps.user_cache.invalidate(user.id)
+    await session.refresh(user)
+
+    return user
 
 
 @router.delete("/{username}", response_model=None, status_code=204)
@@ -158,4 +187,5 @@ async def delete_other_user(
         )
     await session.delete(user)
     await session.commit()
+    deps.user_cache.invalidate(user.id)
     return None
@@ -0,0 +1,45 @@
+"""
+Strong ETags from row revisions, for conditional GET requests.
+
+ETag is a hash of revisions of every row the response is built from (and of
+app version, in case response format changes), so endpoints can answer
+`304 Not Modified` after a cheap query for revisions only, without loading and
+serializing full rows.
+"""
+
+import hashlib
+from typing import Any
+
+from fastapi import Request, Response
+
+from app.core.config import settings
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: Any) -> str:
+    digest = hashlib.blake2b(repr((settings.VERSION, parts)).encode(), digest_size=16)
+    return f'"{digest.hexdigest()}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    return etag in (
+        candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")
+    )
+
+
+def not_modified(etag: str) -> Response:
+    return Response(
+        status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    )
+
+
+def set_etag(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
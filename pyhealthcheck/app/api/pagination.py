@@ -0,0 +1,52 @@
+"""
+Keyset pagination: every page continues after the last id of the previous one.
+
+Unlike `offset`, a page is a range scan of the primary key index starting at
+the cursor, so the last page of a big table is as fast as the first one, and
+rows inserted or deleted in the meantime do not shift pages. Cursors are
+opaque for clients, the next one is sent in `Next-Cursor` header of every full
+page.
+"""
+
+import base64
+import binascii
+import json
+from typing import Any, Optional
+
+from fastapi import Response
+
+NEXT_CURSOR_HEADER = "Next-Cursor"
+INVALID_CURSOR_MESSAGE = "Invalid cursor"
+
+
+def encode_cursor(last_id: int) -> str:
+    data = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Returns last id of the previous page, raises `ValueError` for invalid cursor.
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        last_id = json.loads(data)["id"]
+    except (binascii.Error, UnicodeDecodeError, TypeError, KeyError) as error:
+        raise ValueError(INVALID_CURSOR_MESSAGE) from error
+    if not isinstance(last_id, int):
+        raise ValueError(INVALID_CURSOR_MESSAGE)
+    return last_id
+
+
+def after_cursor(id_column: Any, cursor: Optional[str]) -> list[Any]:
+    """
+    Where clauses for the page after `cursor`, raises `ValueError` for invalid cursor.
+    """
+    if cursor is None:
+        return []
+    return [id_column > decode_cursor(cursor)]
+
+
+def set_next_cursor(response: Response, ids: list[int], limit: int) -> None:
+    if ids and len(ids) >= limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(ids[-1])
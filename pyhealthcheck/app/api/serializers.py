@@ -0,0 +1,83 @@
+"""
+Fast path for list endpoints: rows go straight from the database to JSON.
+
+Data read here was validated when it was written, so instead of loading ORM
+objects and validating them again through `orm_mode` schemas (`EmailStr` on
+every email, nested `User` models for every row), list endpoints select only
+the columns of the response schema and encode plain dicts with `orjson`.
+Output is the same as of `schemas.HealthStack` and `schemas.User`, see tests.
+"""
+
+from typing import Any, Optional
+
+import orjson
+from fastapi import Response
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql import Select
+
+from app import models
+
+USER_FIELDS = ("id", "username", "full_name", "is_root", "is_maintainer", "is_worker")
+HEALTHSTACK_FIELDS = (
+    "id",
+    "custom_name",
+    "domains",
+    "delay_between_checks",
+    "emails_to_alert",
+)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+def users_statement(
+    *where: Any, offset: int = 0, limit: Optional[int] = None
+) -> Select:
+    return (
+        select(*(getattr(models.User, field) for field in USER_FIELDS))
+        .where(*where)
+        .order_by(models.User.id)
+        .offset(offset)
+        .limit(limit)
+    )
+
+
+def user_to_dict(row: Any) -> dict[str, Any]:
+    return dict(row._mapping)
+
+
+def healthstacks_statement(
+    *where: Any, offset: int = 0, limit: Optional[int] = None
+) -> Select:
+    owner = aliased(models.User)
+    worker = aliased(models.User)
+    return (
+        select(
+            *(getattr(models.HealthStack, field) for field in HEALTHSTACK_FIELDS),
+            *(getattr(owner, field).label(f"user_{field}") for field in USER_FIELDS),
+            *(getattr(worker, field).label(f"worker_{field}") for field in USER_FIELDS),
+        )
+        .join(owner, models.HealthStack.user_id == owner.id)
+        .outerjoin(worker, models.HealthStack.worker_id == worker.id)
+        .where(*where)
+        .order_by(models.HealthStack.id)
+        .offset(offset)
+        .limit(limit)
+    )
+
+
+def healthstack_to_dict(row: Any) -> dict[str, Any]:
+    mapping = row._mapping
+    healthstack = {field: mapping[field] for field in HEALTHSTACK_FIELDS}
+    healthstack["user"] = {field: mapping[f"user_{field}"] for field in USER_FIELDS}
+    healthstack["worker"] = (
+        {field: mapping[f"worker_{field}"] for field in USER_FIELDS}
+        if mapping["worker_id"] is not None
+        else None
+    )
+    return healthstack
@@ -0,0 +1,122 @@
+"""
+Change notifications of healthstacks, for long-polling workers.
+
+Every change of healthstack configuration bumps its `revision` (one sequence
+for all stacks, see `app/models.py`) and is announced with Postgres
+`NOTIFY healthstack_changes` in the same transaction (`notify_changed`), so it
+reaches every API instance right after commit. Each instance listens on one
+dedicated connection and wakes up all the waiting requests at once, they
+compare their cursor with the database and either return or keep waiting.
+Only while the listener connection is down, waiting requests re-check every
+`HEALTHSTACK_CHANGES_RECHECK_SECONDS`, changes could be missed in the meantime.
+"""
+
+import asyncio
+import hashlib
+import logging
+from typing import Any, Iterable, Optional
+
+import asyncpg
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.session import async_engine
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "healthstack_changes"
+
+
+def cursor_for(healthstacks: Iterable[Any]) -> str:
+    """
+    Changes when any of `healthstacks` changes, is added or is gone.
+    """
+    digest = hashlib.blake2b(digest_size=12)
+    for healthstack in sorted(healthstacks, key=lambda healthstack: healthstack.id):
+        digest.update(f"{healthstack.id}:{healthstack.revision},".encode())
+    return digest.hexdigest()
+
+
+async def notify_changed(session: AsyncSession) -> None:
+    """
+    Notification is sent when the session's transaction is committed.
+    """
+    await session.execute(select(func.pg_notify(CHANNEL, "")))
+
+
+class ChangeListener:
+    def __init__(self, dsn: str, recheck: float) -> None:
+        self.dsn = dsn
+        self.recheck = recheck
+        self._event: Optional[asyncio.Event] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._connected = False
+
+    @property
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def event(self) -> asyncio.Event:
+        """
+        Event set on the next change, take it before reading the database.
+        """
+        if self._event is None:
+            self._event = asyncio.Event()
+        return self._event
+
+    def wake_up(self) -> None:
+        event = self.event()
+        self._event = asyncio.Event()
+        event.set()
+
+    async def wait(self, event: asyncio.Event, timeout: float) -> bool:
+        """
+        Returns `True` when `event` is set or, with listener down, after `recheck`
+        seconds (changes could be missed), `False` after `timeout` seconds.
+        """
+        recheck = not self._connected and self.recheck < timeout
+        try:
+            await asyncio.wait_for(event.wait(), self.recheck if recheck else timeout)
+        except asyncio.TimeoutError:
+            return recheck
+        return True
+
+    async def _listen_forever(self) -> None:
+        while True:
+            connection: Optional[asyncpg.Connection] = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                await connection.add_listener(CHANNEL, lambda *_: self.wake_up())
+                self._connected = True
+                # changes made while listener was down
+                self.wake_up()
+                while not connection.is_closed():
+                    await asyncio.sleep(self.recheck)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Healthstack changes listener failed")
+                await asyncio.sleep(self.recheck)
+            finally:
+                self._connected = False
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+listener: ChangeListener = ChangeListener(
+    dsn=async_engine.url.set(drivername="postgresql").render_as_string(
+        hide_password=False
+    ),
+    recheck=settings.HEALTHSTACK_CHANGES_RECHECK_SECONDS,
+)
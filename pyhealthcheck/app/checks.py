@@ -0,0 +1,119 @@
+"""
+Server side checks of healthstacks, enabled with `SCHEDULER_ENABLED` setting.
+
+Stacks are turned into a deduplicated probe plan (see `app.core.probeplan`),
+every unique domain is pinged once every shortest `delay_between_checks` of
+stacks that list it and the result fans out to all of them. Probes are run by
+`app.core.scheduler`. The plan is synced with the database every
+`SCHEDULER_SYNC_SECONDS`, stacks created or edited through the API update it
+right away. Stack is up when all of its domains are live, outcomes are
+reported to `app/alerts.py`.
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy import select
+
+from app import alerts, models
+from app.api.endpoints.ping import make_ping
+from app.core.config import settings
+from app.core.probeplan import ProbePlan
+from app.core.scheduler import CheckJob, CheckScheduler, ProbeJob
+from app.session import async_session
+
+logger = logging.getLogger(__name__)
+
+
+def job_from_healthstack(healthstack: models.HealthStack) -> CheckJob:
+    return CheckJob(
+        stack_id=healthstack.id,
+        domains=tuple(healthstack.domains),
+        delay=healthstack.delay_between_checks,
+    )
+
+
+async def load_jobs() -> list[CheckJob]:
+    async with async_session() as session:
+        result = await session.execute(
+            select(
+                models.HealthStack.id,
+                models.HealthStack.domains,
+                models.HealthStack.delay_between_checks,
+            )
+        )
+        return [
+            CheckJob(stack_id=stack_id, domains=tuple(domains), delay=delay)
+            for stack_id, domains, delay in result
+        ]
+
+
+async def probe_domain(job: ProbeJob) -> None:
+    result = await make_ping(job.domain, timeout=settings.SCHEDULER_PING_TIMEOUT)
+    logger.debug("Domain %s live: %s", job.domain, result.live)
+    for stack_id, is_up in plan.record(job.domain, result.live):
+        logger.info("Stack %s is %s", stack_id, "up" if is_up else "down")
+        alerts.report(stack_id, is_up)
+
+
+def _apply(changes: tuple[list[ProbeJob], list[str]]) -> None:
+    scheduled, unscheduled = changes
+    for domain in unscheduled:
+        scheduler.unschedule(domain)
+    for job in scheduled:
+        scheduler.schedule(job)
+
+
+def schedule_healthstack(healthstack: models.HealthStack) -> None:
+    """
+    Add new or edited stack to the probe plan, no-op when scheduler is off.
+    """
+    if scheduler.is_running:
+        _apply(plan.update(job_from_healthstack(healthstack)))
+
+
+def unschedule_healthstack(stack_id: int) -> None:
+    """
+    Remove deleted stack from the probe plan and drop its alerts state.
+    """
+    alerts.forget(stack_id)
+    if scheduler.is_running:
+        _apply(plan.remove(stack_id))
+
+
+plan: ProbePlan = ProbePlan()
+scheduler: CheckScheduler = CheckScheduler(
+    probe_domain, max_concurrency=settings.SCHEDULER_MAX_CONCURRENCY
+)
+_sync_task: Optional["asyncio.Task[None]"] = None
+
+
+async def sync_forever() -> None:
+    while True:
+        try:
+            scheduler.sync(plan.sync(await load_jobs()))
+            logger.info(
+                "Probe plan: %s unique domains of %s subscriptions",
+                len(plan),
+                plan.subscriptions,
+            )
+        except Exception:
+            logger.exception("Could not load healthstacks for scheduler")
+        await asyncio.sleep(settings.SCHEDULER_SYNC_SECONDS)
+
+
+async def start() -> None:
+    global _sync_task
+    await scheduler.start()
+    if _sync_task is None:
+        _sync_task = asyncio.create_task(sync_forever())
+
+
+async def stop() -> None:
+    global _sync_task
+    if _sync_task is not None:
+        _sync_task.cancel()
+        await asyncio.gather(_sync_task, return_exceptions=True)
+        _sync_task = None
+    await scheduler.stop()
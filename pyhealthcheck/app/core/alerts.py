@@ -0,0 +1,173 @@
+"""
+Debounced and coalesced alerts about healthstacks going down and back up.
+
+`report` only puts a check outcome on a bounded queue, so it never blocks and
+is cheap enough to be called after every check. One task consumes the queue:
+
+- stack is down after `down_threshold` failed checks in a row and up again
+  after `up_threshold` successful ones, so a flapping stack does not alert on
+  every check,
+- state changes are collected for `batch_seconds` and coalesced per stack, a
+  stack that went down and back up within that time is not alerted at all,
+- all collected alerts are passed to `notify` at once, so one message per
+  recipient can be sent. When `notify` fails, alerts are retried with the
+  next batch. `notify` records recipients that got an alert in `delivered`,
+  which is passed back on retry, so that they do not get it twice.
+
+A stack that is up from its first checks is not alerted.
+
+All state is kept in memory of one dispatcher, so all outcomes of a stack must
+be reported to the same one. Running dispatchers in many processes splits the
+streaks, which delays alerts or sends them twice.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Alert(NamedTuple):
+    stack_id: int
+    is_up: bool
+    changed_at: datetime
+
+
+class StackState:
+    __slots__ = ("is_up", "notified_is_up", "streak_is_up", "streak")
+
+    def __init__(self) -> None:
+        self.is_up: Optional[bool] = None
+        self.notified_is_up: Optional[bool] = None
+        self.streak_is_up: Optional[bool] = None
+        self.streak = 0
+
+
+class AlertDispatcher:
+    def __init__(
+        self,
+        notify: Callable[[list[Alert], dict[Alert, set[str]]], Awaitable[None]],
+        down_threshold: int,
+        up_threshold: int,
+        batch_seconds: float,
+        queue_size: int,
+    ) -> None:
+        self.notify = notify
+        self.down_threshold = down_threshold
+        self.up_threshold = up_threshold
+        self.batch_seconds = batch_seconds
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._states: dict[int, StackState] = {}
+        self._pending: dict[int, Alert] = {}
+        # recipients of alerts that failed to be sent to everyone
+        self._delivered: dict[Alert, set[str]] = {}
+        self._queue: Optional["asyncio.Queue[tuple[int, bool]]"] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self) -> list[Alert]:
+        return list(self._pending.values())
+
+    def report(self, stack_id: int, is_up: bool) -> None:
+        """
+        Queue check outcome, outcomes are dropped when dispatcher is not running
+        or the queue is full.
+        """
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait((stack_id, is_up))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def forget(self, stack_id: int) -> None:
+        """
+        Drop state of deleted stack, its pending alert is not sent.
+        """
+        self._states.pop(stack_id, None)
+        self._pending.pop(stack_id, None)
+
+    def observe(self, stack_id: int, is_up: bool) -> None:
+        state = self._states.get(stack_id)
+        if state is None:
+            state = self._states[stack_id] = StackState()
+        if state.streak_is_up == is_up:
+            state.streak += 1
+        else:
+            state.streak_is_up = is_up
+            state.streak = 1
+        threshold = self.up_threshold if is_up else self.down_threshold
+        if state.streak < threshold or state.is_up == is_up:
+            return
+
+        state.is_up = is_up
+        if state.notified_is_up is None and is_up:
+            state.notified_is_up = True
+        elif state.notified_is_up == is_up:
+            # back in the state recipients already know about
+            self._pending.pop(stack_id, None)
+        else:
+            self._pending[stack_id] = Alert(stack_id, is_up, datetime.now(timezone.utc))
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        alerts = list(self._pending.values())
+        self._pending.clear()
+        # alerts that are not pending anymore will not be retried
+        delivered = {alert: self._delivered.get(alert, set()) for alert in alerts}
+        self._delivered = {}
+        try:
+            await self.notify(alerts, delivered)
+        except Exception:
+            logger.exception("Could not send %s alerts", len(alerts))
+            for alert in alerts:
+                state = self._states.get(alert.stack_id)
+                if state is None or state.is_up != alert.is_up:
+                    continue
+                if self._pending.setdefault(alert.stack_id, alert) is alert:
+                    self._delivered[alert] = delivered[alert]
+            return
+        for alert in alerts:
+            state = self._states.get(alert.stack_id)
+            if state is not None:
+                state.notified_is_up = alert.is_up
+
+    async def start(self) -> None:
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue(self.queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._queue = None
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        while True:
+            self.observe(*await self._queue.get())
+            if not self._pending:
+                continue
+            deadline = loop.time() + self.batch_seconds
+            while True:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    outcome = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                self.observe(*outcome)
+            await self.flush()
@@ -20,7 +20,7 @@ See https://pydantic-docs.helpmanual.io/usage/settings/
 """
 
 from pathlib import Path
-from typing import Dict, List, Literal, Union
+from typing import Dict, List, Literal, Optional, Union
 
 import toml
 from pydantic import AnyHttpUrl, AnyUrl, BaseSettings, EmailStr, validator
@@ -35,6 +35,8 @@ class Settings(BaseSettings):
     ENVIRONMENT: Literal["DEV", "PYTEST", "STAGE", "PRODUCTION"]
     ACCESS_TOKEN_EXPIRE_MINUTES: int
     SECURITY_BCRYPT_DEFAULT_ROUNDS: int = 12
+    SECURITY_BCRYPT_WORKERS: int = 2
+    SECURITY_BCRYPT_MAX_QUEUE: int = 32
     REFRESH_TOKEN_EXPIRE_MINUTES: int
     BACKEND_CORS_ORIGINS: Union[str, List[AnyHttpUrl]]
 
@@ -66,6 +68,75 @@ class Settings(BaseSettings):
     # PYHEALTHCHECK SPECIFIC
     PYHEALTHCHECK_ALLOW_USER_REGISTER: bool
     PYHEALTHCHECK_WORKER_REGISTER_KEY: str
+    HEALTHSTACK_LEASE_SECONDS: int = 60
+    WORKER_SHARD_TIMEOUT_SECONDS: int = 120
+    WORKER_SHARD_VIRTUAL_NODES: int = 128
+    HEALTHSTACK_CHANGES_RECHECK_SECONDS: int = 5
+    HEALTHSTACK_BULK_MAX_ITEMS: int = 2000
+    AUTH_USER_CACHE_SIZE: int = 10000
+    AUTH_USER_CACHE_SECONDS: int = 10
+
+    # PING
+    PING_DNS_CACHE_SIZE: int = 4096
+    PING_DNS_NEGATIVE_TTL: int = 5
+    PING_RESULT_REUSE_MS: int = 0
+    PING_MAX_HOSTNAMES: int = 5000
+    PING_MAX_CONCURRENCY: int = 512
+    PING_SEND_RATE: int = 2000
+    PING_SEND_BURST: int = 100
+    PING_RTT_HISTORY_SIZE: int = 65536
+    PING_ADAPTIVE_MIN_TIMEOUT_MS: int = 20
+    PING_ADDRESS_STAGGER_MS: int = 50
+    PROBE_MAX_IDLE_PER_ORIGIN: int = 4
+    PROBE_KEEPALIVE_SECONDS: int = 60
+    PROBE_MAX_CONCURRENCY: int = 512
+    # probes must not reach internal services, None allows every port
+    PROBE_ALLOW_PRIVATE_ADDRESSES: bool = False
+    PROBE_ALLOWED_PORTS: Optional[List[int]] = [
+        21,
+        22,
+        25,
+        53,
+        80,
+        110,
+        143,
+        443,
+        465,
+        587,
+        993,
+        995,
+        8080,
+        8443,
+    ]
+
+    # SERVER SIDE CHECKS SCHEDULER
+    SCHEDULER_ENABLED: bool = False
+    SCHEDULER_MAX_CONCURRENCY: int = 256
+    SCHEDULER_SYNC_SECONDS: int = 60
+    SCHEDULER_PING_TIMEOUT: int = 2
+
+    # CHECK RESULTS
+    CHECK_RESULT_MAX_BATCH: int = 10000
+    CHECK_RESULT_RETENTION_DAYS: int = 90
+    CHECK_RESULT_PARTITIONS_AHEAD: int = 7
+    CHECK_RESULT_PARTITION_MAINTENANCE: bool = True
+    CHECK_ROLLUP_1M_RETENTION_DAYS: int = 7
+    CHECK_ROLLUP_1H_RETENTION_DAYS: int = 180
+    CHECK_STATS_MAX_POINTS: int = 1500
+
+    # ALERT EMAILS, need SMTP_HOST too. Alert state is kept in process memory,
+    # enable only in a single instance deployment running one API process
+    ALERTS_ENABLED: bool = False
+    SMTP_HOST: Optional[str] = None
+    SMTP_PORT: int = 25
+    SMTP_USERNAME: Optional[str] = None
+    SMTP_PASSWORD: Optional[str] = None
+    SMTP_STARTTLS: bool = False
+    ALERT_FROM_EMAIL: str = "pyhealthcheck@localhost"
+    ALERT_DOWN_THRESHOLD: int = 3
+    ALERT_UP_THRESHOLD: int = 2
+    ALERT_BATCH_SECONDS: int = 30
+    ALERT_QUEUE_SIZE: int = 100000
 
     # VALIDATORS
     @validator("BACKEND_CORS_ORIGINS")
@@ -0,0 +1,111 @@
+"""
+Password hashing off the event loop.
+
+bcrypt takes hundreds of milliseconds of CPU per call, so `verify_password` and
+`get_password_hash` from `app.core.security` run in a dedicated pool of
+`workers` threads (bcrypt releases the GIL). At most `max_queue` calls wait for
+a free thread, any call above that fails right away with `HasherBusy` (503 in
+the API) instead of piling up. Time spent waiting in the queue and hashing is
+tracked in `stats`.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from app.core import security
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_queue: int) -> None:
+        self.workers = workers
+        self.max_queue = max_queue
+        self.calls = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.hash_time_total = 0.0
+        self.hash_time_max = 0.0
+        # submitted and not finished calls, including the running ones
+        self._pending = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+            "calls": self.calls,
+            "rejected": self.rejected,
+            "queue_wait_avg_ms": 1000 * self.queue_wait_total / max(self.calls, 1),
+            "queue_wait_max_ms": 1000 * self.queue_wait_max,
+            "hash_time_avg_ms": 1000 * self.hash_time_total / max(self.calls, 1),
+            "hash_time_max_ms": 1000 * self.hash_time_max,
+        }
+
+    async def _run(self, func: Callable[..., T], *args: Any) -> T:
+        if self._pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HasherBusy("Too many password hashing calls")
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="password-hasher"
+            )
+        loop = asyncio.get_running_loop()
+        submitted_at = time.perf_counter()
+
+        def timed() -> tuple[float, float, T]:
+            started_at = time.perf_counter()
+            result = func(*args)
+            return started_at, time.perf_counter(), result
+
+        future = self._executor.submit(timed)
+        self._pending += 1
+        # thread keeps working when the caller is cancelled, so the slot is
+        # freed only when the call really finishes
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._on_done))
+        started_at, finished_at, result = await asyncio.wrap_future(future)
+        self._record(started_at - submitted_at, finished_at - started_at)
+        return result
+
+    def _on_done(self) -> None:
+        self._pending -= 1
+
+    def _record(self, queue_wait: float, hash_time: float) -> None:
+        self.calls += 1
+        self.queue_wait_total += queue_wait
+        self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+        self.hash_time_total += hash_time
+        self.hash_time_max = max(self.hash_time_max, hash_time)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(
+            security.verify_password, plain_password, hashed_password
+        )
+
+    async def hash(self, password: str) -> str:
+        return await self._run(security.get_password_hash, password)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+hasher: PasswordHasher = PasswordHasher(
+    workers=settings.SECURITY_BCRYPT_WORKERS,
+    max_queue=settings.SECURITY_BCRYPT_MAX_QUEUE,
+)
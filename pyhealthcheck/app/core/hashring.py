@@ -0,0 +1,84 @@
+"""
+Consistent hashing of healthstacks to workers.
+
+Every worker is put on a ring of `RING_SIZE` positions in `replicas` points, a
+stack belongs to the first worker point after the position of its id. When a
+worker joins or leaves, only stacks next to its points move (about 1/N of
+them), all the others stay with the same worker. Hashes are stable between
+processes (no `hash()`), so every API instance computes the same shards.
+
+Position of a stack (`key_position`) is multiplicative hashing of its id, simple
+enough to be computed by Postgres too: it is stored in `healthstack.ring_position`
+and a worker reads only stacks in `ranges` of its shard.
+"""
+
+import bisect
+import hashlib
+from functools import lru_cache
+from typing import Hashable, Iterable, Optional
+
+RING_SIZE = 2**32
+# Knuth's multiplicative constant, close to RING_SIZE / golden ratio
+KEY_MULTIPLIER = 2654435761
+
+
+def stable_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=4).digest(), "big")
+
+
+def key_position(key: int) -> int:
+    """
+    Must match `ring_position` column of `HealthStack`.
+    """
+    return (key * KEY_MULTIPLIER) % RING_SIZE
+
+
+class HashRing:
+    def __init__(self, nodes: Iterable[Hashable], replicas: int) -> None:
+        points = sorted(
+            (stable_hash(f"{node}-{replica}"), node)
+            for node in set(nodes)
+            for replica in range(replicas)
+        )
+        self._hashes = [point_hash for point_hash, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def __len__(self) -> int:
+        return len(set(self._nodes))
+
+    def node_for(self, key: int) -> Optional[Hashable]:
+        if not self._nodes:
+            return None
+        index = bisect.bisect(self._hashes, key_position(key))
+        return self._nodes[index % len(self._nodes)]
+
+    def ranges(self, node: Hashable) -> list[tuple[int, int]]:
+        """
+        Sorted [start, end) ranges of key positions that belong to `node`.
+        """
+        ranges = []
+        for index, point_node in enumerate(self._nodes):
+            if point_node != node:
+                continue
+            if index == 0:
+                ranges.append((0, self._hashes[0]))
+                ranges.append((self._hashes[-1], RING_SIZE))
+            else:
+                ranges.append((self._hashes[index - 1], self._hashes[index]))
+        merged: list[tuple[int, int]] = []
+        for start, end in sorted(ranges):
+            if start >= end:
+                continue
+            if merged and merged[-1][1] == start:
+                merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        return merged
+
+
+@lru_cache(maxsize=16)
+def get_ring(nodes: tuple[Hashable, ...], replicas: int) -> HashRing:
+    """
+    Ring for sorted tuple of nodes, cached because worker set rarely changes.
+    """
+    return HashRing(nodes, replicas)
@@ -0,0 +1,360 @@
+"""
+Process-wide asyncio ICMP echo engine.
+
+Instead of opening a new socket for every ping (like `aioping` does), the engine
+keeps ONE socket per address family for the whole process and multiplexes all
+echo requests over it. Every request gets its own sequence number, a single
+reader callback matches echo replies by (identifier, sequence) and resolves the
+future of the waiting coroutine.
+
+Raw sockets are used when allowed (root or CAP_NET_RAW), otherwise the engine
+falls back to unprivileged ICMP datagram sockets (Linux `net.ipv4.ping_group_range`).
+In the latter case kernel rewrites identifier to the socket "port" and delivers
+to the socket only its own replies, so only the sequence number is matched.
+
+Usage:
+
+    delay = await icmp.engine.ping("rafsaf.pl", timeout=2)  # seconds
+"""
+
+import asyncio
+import os
+import random
+import socket
+import struct
+import time
+from typing import Optional
+
+from app.core import resolver
+from app.core.config import settings
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMP6_ECHO_REQUEST = 128
+ICMP6_ECHO_REPLY = 129
+
+RECEIVE_BUFFER_SIZE = 4 * 1024 * 1024
+
+_HEADER = struct.Struct("!BBHHH")
+_PAYLOAD = b"pyhealthcheck".ljust(56, b"Q")
+
+
+def checksum(buffer: bytes) -> int:
+    """
+    RFC 1071 internet checksum.
+    """
+    if len(buffer) % 2:
+        buffer += b"\x00"
+    total = sum(struct.unpack(f"!{len(buffer) // 2}H", buffer))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo_request(family: int, identifier: int, sequence: int) -> bytes:
+    icmp_type = ICMP_ECHO_REQUEST if family == socket.AF_INET else ICMP6_ECHO_REQUEST
+    header = _HEADER.pack(icmp_type, 0, 0, identifier, sequence)
+    # for ICMPv6 the kernel computes checksum itself (pseudo-header is needed)
+    if family == socket.AF_INET:
+        header = _HEADER.pack(
+            icmp_type, 0, checksum(header + _PAYLOAD), identifier, sequence
+        )
+    return header + _PAYLOAD
+
+
+class IcmpSocket:
+    """
+    Single non-blocking ICMP socket shared by all the pings of one address family.
+    """
+
+    def __init__(self, family: int, loop: asyncio.AbstractEventLoop) -> None:
+        self.family = family
+        self.loop = loop
+        proto = (
+            socket.IPPROTO_ICMP if family == socket.AF_INET else socket.IPPROTO_ICMPV6
+        )
+        try:
+            self.sock = socket.socket(family, socket.SOCK_RAW, proto)
+            self.raw = True
+        except PermissionError:
+            self.sock = socket.socket(family, socket.SOCK_DGRAM, proto)
+            self.raw = False
+        self.sock.setblocking(False)
+        # replies of thousands of concurrent pings arrive in bursts
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER_SIZE)
+        self.identifier = (os.getpid() ^ random.getrandbits(16)) & 0xFFFF
+        self.reply_type = (
+            ICMP_ECHO_REPLY if family == socket.AF_INET else ICMP6_ECHO_REPLY
+        )
+        self._sequence = random.getrandbits(16)
+        self._waiters: dict[int, tuple[asyncio.Future[float], float]] = {}
+        self.loop.add_reader(self.sock.fileno(), self._on_readable)
+
+    def close(self) -> None:
+        self.loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+        for future, _ in self._waiters.values():
+            if not future.done():
+                future.cancel()
+        self._waiters.clear()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._waiters)
+
+    def _next_sequence(self) -> int:
+        if len(self._waiters) >= 0xFFFF:
+            raise OSError("Too many ICMP echo requests in flight")
+        while True:
+            self._sequence = (self._sequence + 1) & 0xFFFF
+            if self._sequence not in self._waiters:
+                return self._sequence
+
+    def _on_readable(self) -> None:
+        while True:
+            try:
+                packet = self.sock.recv(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            received_at = time.perf_counter()
+            offset = 0
+            # IPv4 raw sockets deliver the IP header too, IPv6 ones never do
+            if self.raw and self.family == socket.AF_INET:
+                offset = (packet[0] & 0x0F) * 4
+            if len(packet) < offset + _HEADER.size:
+                continue
+            icmp_type, _, _, identifier, sequence = _HEADER.unpack_from(packet, offset)
+            if icmp_type != self.reply_type:
+                continue
+            if self.raw and identifier != self.identifier:
+                continue
+            waiter = self._waiters.pop(sequence, None)
+            if waiter is None:
+                continue
+            future, sent_at = waiter
+            if not future.done():
+                future.set_result(received_at - sent_at)
+
+    async def _sendto(self, packet: bytes, address: tuple) -> None:
+        try:
+            self.sock.sendto(packet, address)
+            return
+        except (BlockingIOError, InterruptedError):
+            pass
+        writable: asyncio.Future[None] = self.loop.create_future()
+        fd = self.sock.fileno()
+        self.loop.add_writer(fd, writable.set_result, None)
+        try:
+            await writable
+        finally:
+            self.loop.remove_writer(fd)
+        self.sock.sendto(packet, address)
+
+    async def echo(self, address: tuple, timeout: float) -> float:
+        """
+        Send echo request to resolved `address` and wait for the reply.
+        Returns round trip time in seconds or raises `TimeoutError`.
+        """
+        sequence = self._next_sequence()
+        packet = build_echo_request(self.family, self.identifier, sequence)
+        future: asyncio.Future[float] = self.loop.create_future()
+        self._waiters[sequence] = (future, time.perf_counter())
+        try:
+            await self._sendto(packet, address)
+            # reset send timestamp, socket may have been busy for a while
+            self._waiters[sequence] = (future, time.perf_counter())
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("Ping timeout")
+        finally:
+            self._waiters.pop(sequence, None)
+
+
+def interleave_families(addresses: list[tuple[int, tuple]]) -> list[tuple[int, tuple]]:
+    """
+    RFC 8305 address ordering: IPv6 first, then alternating address families.
+    """
+    ipv6 = [address for address in addresses if address[0] == socket.AF_INET6]
+    other = [address for address in addresses if address[0] != socket.AF_INET6]
+    ordered: list[tuple[int, tuple]] = []
+    for position in range(max(len(ipv6), len(other))):
+        ordered.extend(ipv6[position : position + 1])
+        ordered.extend(other[position : position + 1])
+    return ordered
+
+
+class SendPacer:
+    """
+    Token bucket, every `wait` call takes one token, `rate` tokens per second
+    are added and up to `burst` can be collected. Callers queue up in order.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+
+    async def wait(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return
+        try:
+            await asyncio.sleep(-self._tokens / self.rate)
+        except asyncio.CancelledError:
+            self._tokens += 1
+            raise
+
+
+class IcmpEngine:
+    """
+    Lazily opens one `IcmpSocket` per address family, bound to the running loop.
+
+    At most `max_in_flight` echo requests wait for the reply at the same time
+    and they are sent no faster than `send_rate` per second (with bursts up to
+    `send_burst`), so even thousands of hosts can be probed at once without
+    bursting packets.
+    """
+
+    def __init__(self, max_in_flight: int, send_rate: float, send_burst: int) -> None:
+        self.max_in_flight = max_in_flight
+        self.send_rate = send_rate
+        self.send_burst = send_burst
+        self._sockets: dict[int, IcmpSocket] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._limiter: Optional[asyncio.Semaphore] = None
+        self._pacer: Optional[SendPacer] = None
+
+    def _bind_loop(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self.close()
+            self._loop = loop
+            self._limiter = asyncio.Semaphore(self.max_in_flight)
+            self._pacer = SendPacer(self.send_rate, self.send_burst)
+        return loop
+
+    def get_socket(self, family: int) -> IcmpSocket:
+        loop = self._bind_loop()
+        icmp_socket = self._sockets.get(family)
+        if icmp_socket is None:
+            icmp_socket = IcmpSocket(family, loop)
+            self._sockets[family] = icmp_socket
+        return icmp_socket
+
+    async def resolve(self, hostname: str) -> tuple[int, tuple]:
+        """
+        Returns (family, sockaddr) for `hostname`, raises `socket.gaierror`.
+        """
+        return random.choice(await resolver.cache.resolve(hostname))
+
+    async def echo(self, family: int, address: tuple, timeout: float) -> float:
+        """
+        Waits for a free in-flight slot and a send token, then sends echo request.
+        """
+        icmp_socket = self.get_socket(family)
+        assert self._limiter is not None and self._pacer is not None
+        async with self._limiter:
+            await self._pacer.wait()
+            return await icmp_socket.echo(address, timeout)
+
+    async def ping(self, hostname: str, timeout: float) -> float:
+        """
+        Returns round trip time in seconds to `hostname`.
+        Raises `TimeoutError`, `socket.gaierror` or `OSError`.
+        """
+        family, address = await self.resolve(hostname)
+        return await self.echo(family, address, timeout)
+
+    async def samples(
+        self,
+        family: int,
+        address: tuple,
+        count: int,
+        interval: float,
+        timeout: float,
+        start_delay: float = 0,
+    ) -> list[Optional[float]]:
+        """
+        Pipelines `count` echo requests to resolved `address`, one every `interval`
+        seconds (first after `start_delay`), without waiting for the previous replies.
+        Returns round trip times in seconds, `None` for lost ones. Raises `OSError`.
+        """
+
+        async def delayed_echo(delay: float) -> Optional[float]:
+            await asyncio.sleep(delay)
+            try:
+                return await self.echo(family, address, timeout)
+            except TimeoutError:
+                return None
+
+        results = await asyncio.gather(
+            *(delayed_echo(start_delay + i * interval) for i in range(count)),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results  # type: ignore
+
+    async def samples_all_addresses(
+        self,
+        hostname: str,
+        count: int,
+        interval: float,
+        timeout: float,
+        stagger: float,
+    ) -> list[tuple[str, list[Optional[float]]]]:
+        """
+        Like `samples`, but for every A/AAAA address of `hostname` at once. As in
+        RFC 8305, addresses are ordered IPv6 first, alternating families, and every
+        next one starts `stagger` seconds later. Unreachable addresses (e.g. no IPv6
+        route) get only lost samples. Returns list of (ip, samples).
+        Raises `socket.gaierror`.
+        """
+        addresses = interleave_families(await resolver.cache.resolve(hostname))
+
+        async def address_samples(
+            position: int, family: int, address: tuple
+        ) -> list[Optional[float]]:
+            try:
+                return await self.samples(
+                    family,
+                    address,
+                    count,
+                    interval,
+                    timeout,
+                    start_delay=position * stagger,
+                )
+            except OSError:
+                return [None] * count
+
+        results = await asyncio.gather(
+            *(
+                address_samples(position, family, address)
+                for position, (family, address) in enumerate(addresses)
+            )
+        )
+        return [
+            (address[0], samples) for (_, address), samples in zip(addresses, results)
+        ]
+
+    def close(self) -> None:
+        for icmp_socket in self._sockets.values():
+            icmp_socket.close()
+        self._sockets.clear()
+        self._loop = None
+
+
+engine: IcmpEngine = IcmpEngine(
+    max_in_flight=settings.PING_MAX_CONCURRENCY,
+    send_rate=settings.PING_SEND_RATE,
+    send_burst=settings.PING_SEND_BURST,
+)
@@ -0,0 +1,83 @@
+"""
+Sending emails through one long lived SMTP connection.
+
+`smtplib` is blocking, so all the work happens in one dedicated thread: the
+event loop is never blocked and the connection is never used by two sends at
+once. The connection is opened on the first send and reused for all the next
+ones, when the server closed it in the meantime it is reopened once.
+"""
+
+import asyncio
+import logging
+import smtplib
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SmtpSender:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = False,
+        timeout: float = 30,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.connections = 0
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smtp")
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.username and self.password:
+                smtp.login(self.username, self.password)
+        except BaseException:
+            smtp.close()
+            raise
+        self.connections += 1
+        return smtp
+
+    def _send(self, messages: list[EmailMessage]) -> None:
+        for message in messages:
+            if self._smtp is None:
+                self._smtp = self._connect()
+            try:
+                self._smtp.send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                self._smtp = self._connect()
+                self._smtp.send_message(message)
+            except smtplib.SMTPRecipientsRefused:
+                logger.warning("Recipient %s refused", message["To"])
+            except OSError:
+                self._close()
+                raise
+
+    def _close(self) -> None:
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
+
+    async def send(self, messages: list[EmailMessage]) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._send, messages)
+
+    async def close(self) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close)
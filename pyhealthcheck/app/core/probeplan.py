@@ -0,0 +1,141 @@
+"""
+Deduplicated probe plan of server side checks.
+
+Many stacks list the same popular domains, so instead of pinging every domain
+of every stack, each unique domain is probed once at the shortest delay among
+the stacks subscribed to it, and the result fans out to all of them.
+
+Stack outcome is reported once every domain of the stack got a new result
+since its previous outcome, so a stack is reported at most as often as it was
+when it was checked on its own (all of its domains are probed at least that
+often) and alert thresholds still count whole stack checks. Stack is up when
+latest results of all of its domains are live.
+
+The plan is updated incrementally, `update` and `remove` return only probe jobs
+that changed, so the scheduler keeps due times of all the other domains.
+"""
+
+from typing import Iterable
+
+from app.core.scheduler import CheckJob, ProbeJob
+
+
+class ProbePlan:
+    def __init__(self) -> None:
+        self._stacks: dict[int, CheckJob] = {}
+        self._subscribers: dict[str, set[int]] = {}
+        self._latest: dict[str, bool] = {}
+        self._waiting: dict[int, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def subscriptions(self) -> int:
+        """
+        Number of (stack, domain) pairs, that is probes per cycle without the plan.
+        """
+        return sum(len(stacks) for stacks in self._subscribers.values())
+
+    def subscribers(self, domain: str) -> set[int]:
+        return set(self._subscribers.get(domain, ()))
+
+    def _job(self, domain: str) -> ProbeJob:
+        delay = min(
+            self._stacks[stack_id].delay for stack_id in self._subscribers[domain]
+        )
+        return ProbeJob(domain=domain, delay=delay)
+
+    def jobs(self) -> list[ProbeJob]:
+        return [self._job(domain) for domain in self._subscribers]
+
+    def update(self, job: CheckJob) -> tuple[list[ProbeJob], list[str]]:
+        """
+        Add new stack or update existing one.
+
+        Returns probe jobs to schedule (new domains or domains with changed
+        delay) and domains to unschedule (no subscribers left).
+        """
+        job = job._replace(domains=tuple(dict.fromkeys(d.lower() for d in job.domains)))
+        previous = self._stacks.get(job.stack_id)
+        if previous == job:
+            return [], []
+        touched = set(job.domains)
+        if previous is not None:
+            touched.update(previous.domains)
+        before = {
+            domain: self._job(domain)
+            for domain in touched
+            if domain in self._subscribers
+        }
+        if previous is not None:
+            for domain in previous.domains:
+                self._unsubscribe(domain, job.stack_id)
+        self._stacks[job.stack_id] = job
+        for domain in job.domains:
+            self._subscribers.setdefault(domain, set()).add(job.stack_id)
+        self._waiting[job.stack_id] = set(job.domains)
+        return self._changes(touched, before)
+
+    def remove(self, stack_id: int) -> tuple[list[ProbeJob], list[str]]:
+        previous = self._stacks.get(stack_id)
+        if previous is None:
+            return [], []
+        before = {domain: self._job(domain) for domain in previous.domains}
+        for domain in previous.domains:
+            self._unsubscribe(domain, stack_id)
+        del self._stacks[stack_id]
+        del self._waiting[stack_id]
+        return self._changes(set(previous.domains), before)
+
+    def sync(self, jobs: Iterable[CheckJob]) -> list[ProbeJob]:
+        """
+        Make planned stacks exactly `jobs`, returns all probe jobs of the plan.
+        """
+        jobs = list(jobs)
+        for stack_id in set(self._stacks) - {job.stack_id for job in jobs}:
+            self.remove(stack_id)
+        for job in jobs:
+            self.update(job)
+        return self.jobs()
+
+    def record(self, domain: str, live: bool) -> list[tuple[int, bool]]:
+        """
+        Store result of a probe, returns (stack_id, is_up) of stacks that got
+        results of all of their domains since their previous outcome.
+        """
+        if domain not in self._subscribers:
+            return []
+        self._latest[domain] = live
+        outcomes = []
+        for stack_id in self._subscribers[domain]:
+            waiting = self._waiting[stack_id]
+            waiting.discard(domain)
+            if waiting:
+                continue
+            domains = self._stacks[stack_id].domains
+            outcomes.append((stack_id, all(self._latest[d] for d in domains)))
+            waiting.update(domains)
+        return outcomes
+
+    def _unsubscribe(self, domain: str, stack_id: int) -> None:
+        stacks = self._subscribers[domain]
+        stacks.discard(stack_id)
+        if not stacks:
+            del self._subscribers[domain]
+            self._latest.pop(domain, None)
+
+    def _changes(
+        self, domains: set[str], before: dict[str, ProbeJob]
+    ) -> tuple[list[ProbeJob], list[str]]:
+        scheduled = []
+        unscheduled = []
+        for domain in sorted(domains):
+            if domain not in self._subscribers:
+                if domain in before:
+                    unscheduled.append(domain)
+                continue
+            job = self._job(domain)
+            if before.get(domain) != job:
+                scheduled.append(job)
+        return scheduled, unscheduled
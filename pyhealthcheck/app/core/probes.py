@@ -0,0 +1,358 @@
+"""
+TCP connect and HTTP(S) probes for hosts that block ICMP.
+
+Targets look like `tcp://host:port`, `http://host[:port]/path` or
+`https://host[:port]/path`. Every probe reports separately time to connect,
+to finish TLS handshake and to get the first byte of the response.
+
+Only public addresses (not loopback, private, link-local etc.) and
+`PROBE_ALLOWED_PORTS` can be probed, unless `PROBE_ALLOW_PRIVATE_ADDRESSES` is
+set, so probes cannot be used to reach internal services or scan ports.
+
+HTTP(S) probes speak minimal HTTP/1.1 and keep connections alive: after a
+successful check the connection goes back to a per-origin pool and the next
+check of the same origin reuses it, skipping both TCP and TLS handshakes.
+All TLS connections share one `SSLContext`, so CA certificates are loaded once.
+
+There is no TLS session resumption: asyncio streams cannot pass an
+`ssl.SSLSession` to a new connection, so a connection that is not taken from
+the pool always does a full TLS handshake, reported in `tls`.
+"""
+
+import asyncio
+import ipaddress
+import socket
+import ssl
+import time
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit
+
+from app.core import resolver
+from app.core.config import settings
+
+MAX_HEADER_LINES = 100
+MAX_BODY_SIZE = 1024 * 1024
+USER_AGENT = f"{settings.PROJECT_NAME}/{settings.VERSION}"
+
+
+class BadResponse(Exception):
+    pass
+
+
+class ForbiddenTarget(Exception):
+    pass
+
+
+class ProbeTarget(NamedTuple):
+    scheme: str
+    host: str
+    port: int
+    path: str
+
+    @property
+    def origin(self) -> tuple[str, str, int]:
+        return self.scheme, self.host, self.port
+
+
+class ProbeTimings(NamedTuple):
+    """
+    Times in seconds, `connect` and `tls` are `None` for reused connections.
+    """
+
+    connect: Optional[float]
+    tls: Optional[float]
+    first_byte: Optional[float]
+    total: float
+    status_code: Optional[int] = None
+    reused_connection: bool = False
+
+
+def parse_target(target: str) -> ProbeTarget:
+    """
+    Raises `ValueError` for targets that are not tcp://, http:// or https:// URLs.
+    """
+    parts = urlsplit(target)
+    if parts.scheme not in ("tcp", "http", "https") or not parts.hostname:
+        raise ValueError(f"Invalid probe target {target}")
+    port = parts.port  # raises ValueError too
+    if port is None:
+        if parts.scheme == "tcp":
+            raise ValueError(f"Port is required in tcp probe target {target}")
+        port = 443 if parts.scheme == "https" else 80
+    path = parts.path or "/"
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    return ProbeTarget(parts.scheme, parts.hostname, port, path)
+
+
+class HttpConnection:
+    def __init__(
+        self,
+        origin: tuple[str, str, int],
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        self.origin = origin
+        self.reader = reader
+        self.writer = writer
+        self.idle_since = time.monotonic()
+
+    @property
+    def is_closed(self) -> bool:
+        return self.writer.is_closing() or self.reader.at_eof()
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class ConnectionPool:
+    """
+    Idle keep-alive connections, at most `max_idle_per_origin` for every
+    (scheme, host, port), closed after `keepalive` seconds without use.
+    """
+
+    def __init__(self, max_idle_per_origin: int, keepalive: float) -> None:
+        self.max_idle_per_origin = max_idle_per_origin
+        self.keepalive = keepalive
+        self._idle: dict[tuple[str, str, int], list[HttpConnection]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __len__(self) -> int:
+        return sum(len(connections) for connections in self._idle.values())
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self.close()
+            self._loop = loop
+
+    def acquire(self, origin: tuple[str, str, int]) -> Optional[HttpConnection]:
+        self._bind_loop()
+        connections = self._idle.get(origin, [])
+        now = time.monotonic()
+        while connections:
+            connection = connections.pop()
+            if connection.is_closed or now - connection.idle_since > self.keepalive:
+                connection.close()
+                continue
+            return connection
+        return None
+
+    def release(self, connection: HttpConnection) -> None:
+        self._bind_loop()
+        connections = self._idle.setdefault(connection.origin, [])
+        if connection.is_closed or len(connections) >= self.max_idle_per_origin:
+            connection.close()
+            return
+        connection.idle_since = time.monotonic()
+        connections.append(connection)
+
+    def close(self) -> None:
+        for connections in self._idle.values():
+            for connection in connections:
+                connection.close()
+        self._idle.clear()
+        self._loop = None
+
+
+_ssl_context: Optional[ssl.SSLContext] = None
+
+
+def get_ssl_context() -> ssl.SSLContext:
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = ssl.create_default_context()
+    return _ssl_context
+
+
+def check_allowed(target: ProbeTarget, ip: str) -> None:
+    """
+    Raises `ForbiddenTarget` for ports not in `PROBE_ALLOWED_PORTS` and for not public addresses.
+    """
+    allowed_ports = settings.PROBE_ALLOWED_PORTS
+    if allowed_ports is not None and target.port not in allowed_ports:
+        raise ForbiddenTarget(f"Port {target.port} is not allowed")
+    if not settings.PROBE_ALLOW_PRIVATE_ADDRESSES:
+        # scope of IPv6 link-local addresses is not a part of the address
+        if not ipaddress.ip_address(ip.split("%")[0]).is_global:
+            raise ForbiddenTarget(f"Address {ip} is not public")
+
+
+async def _connect(
+    target: ProbeTarget, tls: bool
+) -> tuple[asyncio.StreamReader, asyncio.StreamWriter, float, Optional[float]]:
+    family, address = (await resolver.cache.resolve(target.host))[0]
+    # checked after resolving, so hostnames pointing to internal addresses are refused too
+    check_allowed(target, address[0])
+    address = (address[0], target.port, *address[2:])
+    loop = asyncio.get_running_loop()
+
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    start = time.perf_counter()
+    try:
+        await loop.sock_connect(sock, address)
+    except BaseException:
+        sock.close()
+        raise
+    connected_at = time.perf_counter()
+    if not tls:
+        reader, writer = await asyncio.open_connection(sock=sock)
+        return reader, writer, connected_at - start, None
+
+    reader, writer = await asyncio.open_connection(
+        sock=sock, ssl=get_ssl_context(), server_hostname=target.host
+    )
+    return reader, writer, connected_at - start, time.perf_counter() - connected_at
+
+
+async def tcp_probe(target: ProbeTarget) -> ProbeTimings:
+    """
+    Open and close TCP connection, raises `OSError`, `socket.gaierror` or `ForbiddenTarget`.
+    """
+    _, writer, connect, _ = await _connect(target, tls=False)
+    writer.close()
+    return ProbeTimings(connect=connect, tls=None, first_byte=None, total=connect)
+
+
+async def _read_body(
+    reader: asyncio.StreamReader, headers: dict[str, str], status_code: int
+) -> bool:
+    """
+    Reads (and discards) response body, returns if connection can be reused.
+    """
+    if status_code < 200 or status_code in (204, 304):
+        return True
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        received = 0
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            received += size
+            if received > MAX_BODY_SIZE:
+                return False
+            if size == 0:
+                break
+            await reader.readexactly(size + 2)
+        # trailers end with an empty line
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        return True
+    if "content-length" in headers:
+        length = int(headers["content-length"])
+        if length > MAX_BODY_SIZE:
+            return False
+        await reader.readexactly(length)
+        return True
+    # body ends when server closes the connection
+    return False
+
+
+async def _http_request(
+    connection: HttpConnection, target: ProbeTarget
+) -> tuple[int, float, bool]:
+    default_port = 443 if target.scheme == "https" else 80
+    host = target.host if ":" not in target.host else f"[{target.host}]"
+    if target.port != default_port:
+        host = f"{host}:{target.port}"
+    request = (
+        f"GET {target.path} HTTP/1.1\r\n"
+        f"Host: {host}\r\n"
+        f"User-Agent: {USER_AGENT}\r\n"
+        "Accept: */*\r\n"
+        "Connection: keep-alive\r\n\r\n"
+    )
+    start = time.perf_counter()
+    connection.writer.write(request.encode("latin-1"))
+    await connection.writer.drain()
+
+    status_line = await connection.reader.readline()
+    first_byte = time.perf_counter() - start
+    if not status_line:
+        raise ConnectionResetError("Connection closed by server")
+    try:
+        version, status, *_ = status_line.decode("latin-1").split(" ", 2)
+        status_code = int(status)
+    except ValueError:
+        raise BadResponse(f"Invalid status line {status_line!r}")
+
+    headers: dict[str, str] = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = (await connection.reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise BadResponse("Too many response headers")
+
+    try:
+        reusable = await _read_body(connection.reader, headers, status_code)
+    except ValueError:
+        raise BadResponse("Invalid Content-Length or chunk size")
+    connection_header = headers.get("connection", "").lower()
+    if connection_header == "close" or (
+        version == "HTTP/1.0" and connection_header != "keep-alive"
+    ):
+        reusable = False
+    return status_code, first_byte, reusable
+
+
+async def http_probe(target: ProbeTarget) -> ProbeTimings:
+    """
+    GET request to the target, raises `OSError`, `socket.gaierror`, `ssl.SSLError`,
+    `ForbiddenTarget` or `BadResponse` when the reply is not valid HTTP/1.x.
+    """
+    start = time.perf_counter()
+    connection = pool.acquire(target.origin)
+    if connection is not None:
+        try:
+            status_code, first_byte, reusable = await _http_request(connection, target)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # server closed idle connection in the meantime, retry with a new one
+            connection.close()
+            connection = None
+        except BaseException:
+            connection.close()
+            raise
+        else:
+            connect = tls = None
+    if connection is None:
+        reader, writer, connect, tls = await _connect(
+            target, tls=target.scheme == "https"
+        )
+        connection = HttpConnection(target.origin, reader, writer)
+        try:
+            status_code, first_byte, reusable = await _http_request(connection, target)
+        except BaseException:
+            connection.close()
+            raise
+
+    if reusable:
+        pool.release(connection)
+    else:
+        connection.close()
+    return ProbeTimings(
+        connect=connect,
+        tls=tls,
+        first_byte=first_byte,
+        total=time.perf_counter() - start,
+        status_code=status_code,
+        reused_connection=connect is None,
+    )
+
+
+async def probe(target: ProbeTarget, timeout: float) -> ProbeTimings:
+    """
+    Raises `TimeoutError` when probe does not finish in `timeout` seconds.
+    """
+    coroutine = tcp_probe(target) if target.scheme == "tcp" else http_probe(target)
+    try:
+        return await asyncio.wait_for(coroutine, timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError("Probe timeout")
+
+
+pool: ConnectionPool = ConnectionPool(
+    max_idle_per_origin=settings.PROBE_MAX_IDLE_PER_ORIGIN,
+    keepalive=settings.PROBE_KEEPALIVE_SECONDS,
+)
@@ -0,0 +1,176 @@
+"""
+In-process async DNS cache used by the ping engine.
+
+Hostnames are resolved with `aiodns` (A and AAAA queries at once), so records
+are cached exactly as long as their TTL says (`query_dns` on aiodns 4, `query`
+on aiodns 3). Names that DNS does not know (`localhost`, `/etc/hosts` entries,
+search domains) fall back to the system resolver, cached for `default_ttl` seconds. Unknown hostnames
+(NXDOMAIN) are cached for `negative_ttl` seconds, other errors are not cached.
+
+Cache size is bounded, the least recently used hostname is evicted first.
+Concurrent lookups of the same missing hostname share one query.
+"""
+
+import asyncio
+import ipaddress
+import socket
+import time
+from collections import OrderedDict
+from typing import Optional, Union
+
+import aiodns
+
+from app.core.config import settings
+
+Address = tuple[int, tuple]
+_NOT_FOUND_ERRNOS = {socket.EAI_NONAME, getattr(socket, "EAI_NODATA", -5)}
+
+
+class ResolverCache:
+    def __init__(
+        self,
+        maxsize: int,
+        negative_ttl: float,
+        default_ttl: float = 60,
+        min_ttl: float = 1,
+        max_ttl: float = 3600,
+    ) -> None:
+        self.maxsize = maxsize
+        self.negative_ttl = negative_ttl
+        self.default_ttl = default_ttl
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[
+            str, tuple[float, Union[list[Address], socket.gaierror]]
+        ] = OrderedDict()
+        self._pending: dict[str, asyncio.Task[list[Address]]] = {}
+        self._dns_resolver: Optional[aiodns.DNSResolver] = None
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._cache)}
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, hostname: str) -> Optional[Union[list[Address], socket.gaierror]]:
+        entry = self._cache.get(hostname)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._cache[hostname]
+            return None
+        self._cache.move_to_end(hostname)
+        return value
+
+    def _set(
+        self, hostname: str, value: Union[list[Address], socket.gaierror], ttl: float
+    ) -> None:
+        self._cache[hostname] = (time.monotonic() + ttl, value)
+        self._cache.move_to_end(hostname)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    async def resolve(self, hostname: str) -> list[Address]:
+        """
+        Returns list of (family, sockaddr) for `hostname`, raises `socket.gaierror`.
+        """
+        literal = _ip_literal(hostname)
+        if literal is not None:
+            return [literal]
+
+        hostname = hostname.lower().rstrip(".")
+        cached = self._get(hostname)
+        if cached is not None:
+            self.hits += 1
+            if isinstance(cached, socket.gaierror):
+                raise cached
+            return cached
+
+        self.misses += 1
+        task = self._pending.get(hostname)
+        if task is None:
+            task = asyncio.create_task(self._lookup(hostname))
+            self._pending[hostname] = task
+            task.add_done_callback(lambda _: self._pending.pop(hostname, None))
+        return await asyncio.shield(task)
+
+    async def _lookup(self, hostname: str) -> list[Address]:
+        addresses, ttl = await self._query_dns(hostname)
+        if not addresses:
+            try:
+                addresses = await self._getaddrinfo(hostname)
+            except socket.gaierror as error:
+                if error.errno in _NOT_FOUND_ERRNOS:
+                    self._set(hostname, error, self.negative_ttl)
+                raise
+            ttl = self.default_ttl
+        self._set(hostname, addresses, min(max(ttl, self.min_ttl), self.max_ttl))
+        return addresses
+
+    async def _query_dns(self, hostname: str) -> tuple[list[Address], float]:
+        if self._dns_resolver is None:
+            self._dns_resolver = aiodns.DNSResolver()
+        results = await asyncio.gather(
+            self._query(hostname, "A"),
+            self._query(hostname, "AAAA"),
+            return_exceptions=True,
+        )
+        addresses: list[Address] = []
+        ttls: list[float] = []
+        for family, records in zip((socket.AF_INET, socket.AF_INET6), results):
+            if isinstance(records, BaseException):
+                continue
+            for host, ttl in records:
+                if family == socket.AF_INET:
+                    addresses.append((family, (host, 0)))
+                else:
+                    addresses.append((family, (host, 0, 0, 0)))
+                ttls.append(ttl)
+        return addresses, min(ttls, default=self.default_ttl)
+
+    async def _query(self, hostname: str, qtype: str) -> list[tuple[str, float]]:
+        """
+        (address, ttl) of A or AAAA records of `hostname`.
+        """
+        if hasattr(self._dns_resolver, "query_dns"):
+            result = await self._dns_resolver.query_dns(hostname, qtype)
+            # answer section holds CNAME records too
+            return [
+                (record.data.addr, record.ttl)
+                for record in result.answer
+                if hasattr(record.data, "addr")
+            ]
+        records = await self._dns_resolver.query(hostname, qtype)
+        return [(record.host, record.ttl) for record in records]
+
+    async def _getaddrinfo(self, hostname: str) -> list[Address]:
+        loop = asyncio.get_running_loop()
+        info = await loop.getaddrinfo(hostname, 0, type=socket.SOCK_DGRAM)
+        if not info:
+            raise socket.gaierror(socket.EAI_NONAME, f"{hostname} hostname not found")
+        return [(family, address) for family, _, _, _, address in info]
+
+
+def _ip_literal(hostname: str) -> Optional[Address]:
+    try:
+        ip = ipaddress.ip_address(hostname)
+    except ValueError:
+        return None
+    if ip.version == 4:
+        return socket.AF_INET, (hostname, 0)
+    return socket.AF_INET6, (hostname, 0, 0, 0)
+
+
+cache: ResolverCache = ResolverCache(
+    maxsize=settings.PING_DNS_CACHE_SIZE,
+    negative_ttl=settings.PING_DNS_NEGATIVE_TTL,
+)
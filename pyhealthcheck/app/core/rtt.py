@@ -0,0 +1,76 @@
+"""
+Per-host round trip time history, used to derive adaptive ping timeouts.
+
+Same estimator as TCP retransmission timer (RFC 6298): smoothed RTT and RTT
+variance are updated on every reply and the timeout is `srtt + 4 * rttvar`.
+Every lost reply doubles the variance (like TCP backoff), so a host that just
+got slower is not marked down forever. Hosts without history get the caller's
+maximum timeout, every other timeout is clamped to it.
+
+Only two floats per host are stored, the least recently used host is evicted
+when there are more than `maxsize` of them.
+"""
+
+from collections import OrderedDict
+from typing import Optional
+
+from app.core.config import settings
+
+ALPHA = 1 / 8
+BETA = 1 / 4
+K = 4
+
+
+class RttEstimator:
+    def __init__(self, maxsize: int, min_timeout: float) -> None:
+        self.maxsize = maxsize
+        self.min_timeout = min_timeout
+        self._hosts: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._hosts)
+
+    def get(self, hostname: str) -> Optional[tuple[float, float]]:
+        """
+        Returns (srtt, rttvar) in seconds or None if host has no history.
+        """
+        return self._hosts.get(hostname.lower())
+
+    def _set(self, hostname: str, srtt: float, rttvar: float) -> None:
+        self._hosts[hostname] = (srtt, rttvar)
+        self._hosts.move_to_end(hostname)
+        if len(self._hosts) > self.maxsize:
+            self._hosts.popitem(last=False)
+
+    def update(self, hostname: str, rtt: float) -> None:
+        hostname = hostname.lower()
+        history = self._hosts.get(hostname)
+        if history is None:
+            self._set(hostname, rtt, rtt / 2)
+            return
+        srtt, rttvar = history
+        rttvar = (1 - BETA) * rttvar + BETA * abs(srtt - rtt)
+        srtt = (1 - ALPHA) * srtt + ALPHA * rtt
+        self._set(hostname, srtt, rttvar)
+
+    def on_timeout(self, hostname: str) -> None:
+        hostname = hostname.lower()
+        history = self._hosts.get(hostname)
+        if history is not None:
+            self._set(hostname, history[0], history[1] * 2)
+
+    def timeout(self, hostname: str, maximum: float) -> float:
+        """
+        Timeout in seconds for the next ping to `hostname`, at most `maximum`.
+        """
+        history = self.get(hostname)
+        if history is None:
+            return maximum
+        srtt, rttvar = history
+        return min(max(srtt + K * rttvar, self.min_timeout), maximum)
+
+
+estimator: RttEstimator = RttEstimator(
+    maxsize=settings.PING_RTT_HISTORY_SIZE,
+    min_timeout=settings.PING_ADAPTIVE_MIN_TIMEOUT_MS / 1000,
+)
@@ -0,0 +1,178 @@
+"""
+In-process scheduler of periodic healthstack checks.
+
+Jobs are either whole stacks (`CheckJob`) or single domains of a probe plan
+(`ProbeJob`, see `app.core.probeplan`), both are identified by their `key`.
+
+All the jobs live in one heap ordered by next due time, so there is a single
+sleeping task no matter how many stacks there are. Checks are fixed-rate (next
+due time is previous due time + delay, not "now" + delay), so they do not drift.
+First run of every stack is shifted by a stable, evenly spread fraction of its
+delay, so stacks with the same delay do not fire at the same moment.
+
+At most `max_concurrency` checks run at once, when all slots are taken the
+dispatching waits. If a check of one stack is still running when the next one
+is due, the next one is skipped.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, Hashable, NamedTuple, Optional, Union
+
+from app.core.hashring import stable_hash
+
+logger = logging.getLogger(__name__)
+
+GOLDEN_RATIO_FRACTION = 0.6180339887498949
+
+
+class CheckJob(NamedTuple):
+    stack_id: int
+    domains: tuple[str, ...]
+    delay: float
+
+    @property
+    def key(self) -> int:
+        return self.stack_id
+
+
+class ProbeJob(NamedTuple):
+    domain: str
+    delay: float
+
+    @property
+    def key(self) -> str:
+        return self.domain
+
+
+Job = Union[CheckJob, ProbeJob]
+
+
+class CheckScheduler:
+    def __init__(
+        self, check: Callable[[Job], Awaitable[None]], max_concurrency: int
+    ) -> None:
+        self.check = check
+        self.max_concurrency = max_concurrency
+        self._jobs: dict[Hashable, Job] = {}
+        # heap entries are (due, generation, key), entries with outdated
+        # generation belong to unscheduled or rescheduled jobs and are skipped,
+        # unique generation also keeps keys of ties from being compared
+        self._heap: list[tuple[float, int, Hashable]] = []
+        self._generations: dict[Hashable, int] = {}
+        self._generation_counter = itertools.count()
+        self._running: set[Hashable] = set()
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._checks: set["asyncio.Task[None]"] = set()
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def _push(self, key: Hashable, due: float) -> None:
+        generation = next(self._generation_counter)
+        self._generations[key] = generation
+        heapq.heappush(self._heap, (due, generation, key))
+        if self._wakeup is not None and self._heap[0][2] == key:
+            self._wakeup.set()
+
+    def _first_due(self, job: Job) -> float:
+        key = job.key
+        seed = key if isinstance(key, int) else stable_hash(str(key))
+        phase = (seed * GOLDEN_RATIO_FRACTION) % 1
+        return time.monotonic() + phase * job.delay
+
+    def schedule(self, job: Job) -> None:
+        """
+        Add new job or update existing one. Due time is kept if delay is the same.
+        """
+        previous = self._jobs.get(job.key)
+        self._jobs[job.key] = job
+        if previous is None or previous.delay != job.delay:
+            self._push(job.key, self._first_due(job))
+
+    def unschedule(self, key: Hashable) -> None:
+        if self._jobs.pop(key, None) is not None:
+            del self._generations[key]
+
+    def sync(self, jobs: list[Job]) -> None:
+        """
+        Make scheduled jobs exactly `jobs`.
+        """
+        for key in set(self._jobs) - {job.key for job in jobs}:
+            self.unschedule(key)
+        for job in jobs:
+            self.schedule(job)
+        # drop heap entries of jobs that are gone to keep memory bounded
+        if len(self._heap) > 2 * len(self._jobs) + 64:
+            self._heap = [
+                entry
+                for entry in self._heap
+                if self._generations.get(entry[2]) == entry[1]
+            ]
+            heapq.heapify(self._heap)
+
+    async def start(self) -> None:
+        if self.is_running:
+            return
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        tasks = list(self._checks)
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None and self._slots is not None
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            due, generation, key = self._heap[0]
+            now = time.monotonic()
+            if due > now:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), due - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            if self._generations.get(key) != generation:
+                continue
+            job = self._jobs[key]
+            self._push(key, max(due + job.delay, now))
+            if key in self._running:
+                logger.warning("Check of %s is late, skipped", key)
+                continue
+
+            await self._slots.acquire()
+            self._running.add(key)
+            task = asyncio.create_task(self._run_check(job))
+            self._checks.add(task)
+            task.add_done_callback(self._checks.discard)
+
+    async def _run_check(self, job: Job) -> None:
+        assert self._slots is not None
+        try:
+            await self.check(job)
+        except Exception:
+            logger.exception("Check of %s failed", job.key)
+        finally:
+            self._running.discard(job.key)
+            self._slots.release()
@@ -0,0 +1,69 @@
+"""
+Request coalescing: concurrent calls with the same key share one in-flight task.
+
+Optionally the result is reused for `reuse_window` seconds after it completed,
+so a burst of identical calls that arrive just after each other is also
+answered by a single call. When every caller waiting for a task is cancelled,
+the task itself is cancelled too.
+
+Usage:
+
+    flights = SingleFlight(reuse_window=0.5)
+    result = await flights.run(("rafsaf.pl", 2), lambda: make_ping("rafsaf.pl", 2))
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Generic, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    max_recent = 4096
+
+    def __init__(self, reuse_window: float = 0) -> None:
+        self.reuse_window = reuse_window
+        self._in_flight: dict[Hashable, asyncio.Task[T]] = {}
+        self._recent: dict[Hashable, tuple[float, T]] = {}
+        self._waiters: dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        recent = self._recent.get(key)
+        if recent is not None:
+            if recent[0] > time.monotonic():
+                return recent[1]
+            del self._recent[key]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._on_done(key, done))
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            # one impatient caller must not cancel the call for everyone else
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                if not task.done():
+                    if self._in_flight.get(key) is task:
+                        del self._in_flight[key]
+                    task.cancel()
+
+    def _on_done(self, key: Hashable, task: "asyncio.Task[Any]") -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if self.reuse_window <= 0 or task.cancelled() or task.exception():
+            return
+        now = time.monotonic()
+        if len(self._recent) >= self.max_recent:
+            self._recent = {k: v for k, v in self._recent.items() if v[0] > now}
+            if len(self._recent) >= self.max_recent:
+                return
+        self._recent[key] = (now + self.reuse_window, task.result())
@@ -6,9 +6,13 @@ from typing import Any
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
+from app import alerts, changes, checks, results
 from app.api.api import api_router
+from app.core import icmp, probes
 from app.core.config import settings
+from app.core.hashing import HasherBusy, hasher
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -38,3 +42,69 @@ async def add_process_time_header(request: Request, call_next: Any):
     process_time = time() - start_time
     response.headers["Process-Time"] = str(process_time)
     return response
+
+
+@app.exception_handler(HasherBusy)
+async def hasher_busy_handler(request: Request, exc: HasherBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"message": "Server is busy, try again later"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.on_event("startup")
+async def start_check_scheduler():
+    if settings.SCHEDULER_ENABLED:
+        await checks.start()
+
+
+@app.on_event("startup")
+async def start_changes_listener():
+    await changes.listener.start()
+
+
+@app.on_event("startup")
+async def start_alerts():
+    await alerts.start()
+
+
+@app.on_event("startup")
+async def start_partition_maintenance():
+    if settings.CHECK_RESULT_PARTITION_MAINTENANCE:
+        await results.start()
+
+
+@app.on_event("shutdown")
+async def stop_check_scheduler():
+    await checks.stop()
+
+
+@app.on_event("shutdown")
+async def stop_changes_listener():
+    await changes.listener.stop()
+
+
+@app.on_event("shutdown")
+async def stop_alerts():
+    await alerts.stop()
+
+
+@app.on_event("shutdown")
+async def stop_partition_maintenance():
+    await results.stop()
+
+
+@app.on_event("shutdown")
+async def close_icmp_engine():
+    icmp.engine.close()
+
+
+@app.on_event("shutdown")
+async def close_probe_connections():
+    probes.pool.close()
+
+
+@app.on_event("shutdown")
+async def close_password_hasher():
+    hasher.close()
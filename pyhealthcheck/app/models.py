@@ -6,15 +6,32 @@ Note, imported by alembic migrations logic, see `alembic/env.py`
 
 from typing import Any
 
-from sqlalchemy import Boolean, Column, Integer, String
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    Computed,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    Sequence,
+    String,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm.decl_api import declarative_base
-from sqlalchemy.sql import false, null
+from sqlalchemy.sql import false, func, null
 from sqlalchemy.sql.schema import ForeignKey
-from sqlalchemy.sql.sqltypes import ARRAY
+
+from app.core import hashring
 
 Base: Any = declarative_base()
 
+# shared by all rows, so revisions only grow, see `app/changes.py` and `app/api/etag.py`
+healthstack_revision = Sequence("healthstack_revision_seq", metadata=Base.metadata)
+user_revision = Sequence("user_revision_seq", metadata=Base.metadata)
+
 
 class User(Base):
     __tablename__ = "user"
@@ -27,6 +44,18 @@ class User(Base):
     )
     is_root = Column(Boolean, default=False, nullable=False, server_default=false())
     is_worker = Column(Boolean, default=False, nullable=False, server_default=false())
+    is_shard_worker = Column(
+        Boolean, default=False, nullable=False, server_default=false()
+    )
+    last_seen_at = Column(
+        DateTime(timezone=True), nullable=True, default=None, server_default=null()
+    )
+    revision = Column(
+        BigInteger,
+        nullable=False,
+        server_default=user_revision.next_value(),
+        onupdate=user_revision.next_value(),
+    )
     healthstacks = relationship(
         "HealthStack", back_populates="user", foreign_keys="HealthStack.user_id"
     )
@@ -37,9 +66,15 @@ class User(Base):
         foreign_keys="HealthStack.worker_id",
     )
 
+    __mapper_args__ = {"eager_defaults": True}
+
 
 class HealthStack(Base):
     __tablename__ = "healthstack"
+    __table_args__ = (
+        # reverse lookups of domains with && and @>, domains are stored lower-cased
+        Index("ix_healthstack_domains", "domains", postgresql_using="gin"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     custom_name = Column(
         String(254), nullable=True, default=None, server_default=null()
@@ -59,9 +94,90 @@ class HealthStack(Base):
         default=None,
         server_default=null(),
     )
+    next_check_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now(), index=True
+    )
+    leased_by_id = Column(
+        Integer,
+        ForeignKey("user.id", ondelete="SET NULL", name="leased_by_id_fk"),
+        nullable=True,
+        default=None,
+        server_default=null(),
+    )
+    lease_expires_at = Column(
+        DateTime(timezone=True), nullable=True, default=None, server_default=null()
+    )
+    revision = Column(
+        BigInteger,
+        nullable=False,
+        server_default=healthstack_revision.next_value(),
+        onupdate=healthstack_revision.next_value(),
+        index=True,
+    )
+    # position on the ring of shard workers, see `app/core/hashring.py`
+    ring_position = Column(
+        BigInteger,
+        Computed(
+            f"(id::bigint * {hashring.KEY_MULTIPLIER}) % {hashring.RING_SIZE}",
+            persisted=True,
+        ),
+        index=True,
+    )
     user = relationship(
         "User", back_populates="healthstacks", foreign_keys="HealthStack.user_id"
     )
     worker = relationship(
         "User", back_populates="healthstack_job", foreign_keys="HealthStack.worker_id"
     )
+
+    __mapper_args__ = {"eager_defaults": True}
+
+
+class CheckResult(Base):
+    """
+    Partitioned by day of `checked_at`, partitions are managed in `app/results.py`.
+    """
+
+    __tablename__ = "check_result"
+    __table_args__ = (
+        Index(
+            "ix_check_result_healthstack_id_checked_at", "healthstack_id", "checked_at"
+        ),
+        {"postgresql_partition_by": "RANGE (checked_at)"},
+    )
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    checked_at = Column(DateTime(timezone=True), primary_key=True)
+    healthstack_id = Column(Integer, nullable=False)
+    worker_id = Column(Integer, nullable=True)
+    domain = Column(String(100), nullable=False)
+    is_up = Column(Boolean, nullable=False)
+    rtt_ms = Column(Float, nullable=True)
+    error = Column(String(254), nullable=True)
+
+
+class CheckRollupMixin:
+    """
+    Aggregated check results of one healthstack in one time bucket, see `app/rollups.py`.
+    """
+
+    healthstack_id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True, index=True)
+    checks = Column(Integer, nullable=False)
+    up_checks = Column(Integer, nullable=False)
+    rtt_samples = Column(Integer, nullable=False)
+    rtt_sum = Column(Float, nullable=False)
+    rtt_min = Column(Float, nullable=True)
+    rtt_max = Column(Float, nullable=True)
+    rtt_sketch = Column(ARRAY(Integer), nullable=False)
+
+
+class CheckRollup1m(CheckRollupMixin, Base):
+    __tablename__ = "check_rollup_1m"
+
+
+class CheckRollup1h(CheckRollupMixin, Base):
+    __tablename__ = "check_rollup_1h"
+
+
+class CheckRollup1d(CheckRollupMixin, Base):
+    __tablename__ = "check_rollup_1d"
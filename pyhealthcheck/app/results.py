@@ -0,0 +1,181 @@
+"""
+Storage of check results sent by workers.
+
+`check_result` table is partitioned by `checked_at`, one partition per UTC day.
+Partitions for the next `CHECK_RESULT_PARTITIONS_AHEAD` days are created in
+advance and partitions older than `CHECK_RESULT_RETENTION_DAYS` are dropped
+whole, so retention never deletes rows one by one. Maintenance runs on startup
+and then every hour when `CHECK_RESULT_PARTITION_MAINTENANCE` is enabled.
+
+Batches of results are written with a single `COPY`, bypassing the ORM.
+Expired rollups (see `app/rollups.py`) are deleted by the same maintenance.
+"""
+
+import asyncio
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app import models, rollups, schemas
+from app.core.config import settings
+from app.session import async_engine
+
+logger = logging.getLogger(__name__)
+
+TABLE_NAME = models.CheckResult.__tablename__
+PARTITION_PREFIX = f"{TABLE_NAME}_p"
+COPY_COLUMNS = [
+    "checked_at",
+    "healthstack_id",
+    "worker_id",
+    "domain",
+    "is_up",
+    "rtt_ms",
+    "error",
+]
+MAINTENANCE_INTERVAL = 3600
+
+
+def partition_name(day: date) -> str:
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def partition_day(name: str) -> Optional[date]:
+    if not name.startswith(PARTITION_PREFIX):
+        return None
+    try:
+        return datetime.strptime(name[len(PARTITION_PREFIX) :], "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def _day_start(day: date) -> str:
+    return datetime.combine(day, time(), tzinfo=timezone.utc).isoformat()
+
+
+async def create_partitions(
+    connection: AsyncConnection, first_day: date, last_day: date
+) -> None:
+    day = first_day
+    while day <= last_day:
+        await connection.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(day)} "
+                f"PARTITION OF {TABLE_NAME} FOR VALUES "
+                f"FROM ('{_day_start(day)}') TO ('{_day_start(day + timedelta(days=1))}')"
+            )
+        )
+        day += timedelta(days=1)
+
+
+async def drop_partitions_before(connection: AsyncConnection, day: date) -> list[str]:
+    """
+    Drops partitions with rows older than `day`, returns their names.
+    """
+    result = await connection.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = CAST(:table AS regclass)"
+        ),
+        {"table": TABLE_NAME},
+    )
+    dropped = []
+    for (name,) in result:
+        partition = partition_day(name)
+        if partition is not None and partition < day:
+            await connection.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+    return sorted(dropped)
+
+
+async def maintain_partitions(today: Optional[date] = None) -> list[str]:
+    """
+    Creates missing partitions (from yesterday on), drops expired ones and
+    deletes expired rollups.
+    """
+    if today is None:
+        today = datetime.now(timezone.utc).date()
+    async with async_engine.begin() as connection:
+        await create_partitions(
+            connection,
+            today - timedelta(days=1),
+            today + timedelta(days=settings.CHECK_RESULT_PARTITIONS_AHEAD),
+        )
+        dropped = await drop_partitions_before(
+            connection, today - timedelta(days=settings.CHECK_RESULT_RETENTION_DAYS)
+        )
+        await rollups.delete_expired_rollups(
+            connection, datetime.combine(today, time(), tzinfo=timezone.utc)
+        )
+    if dropped:
+        logger.info("Dropped expired check result partitions: %s", dropped)
+    return dropped
+
+
+def accepted_range(now: datetime) -> tuple[datetime, datetime]:
+    """
+    Results outside of this range of `checked_at` have no partition to go to.
+    """
+    oldest = datetime.combine(
+        now.date() - timedelta(days=1), time(), tzinfo=timezone.utc
+    )
+    return max(
+        oldest, now - timedelta(days=settings.CHECK_RESULT_RETENTION_DAYS)
+    ), now + timedelta(hours=1)
+
+
+async def copy_results(
+    session: AsyncSession,
+    results: list[schemas.CheckResultCreate],
+    worker_id: Optional[int],
+) -> int:
+    records = [
+        (
+            result.checked_at
+            if result.checked_at.tzinfo is not None
+            else result.checked_at.replace(tzinfo=timezone.utc),
+            result.healthstack_id,
+            worker_id,
+            result.domain,
+            result.is_up,
+            result.rtt_ms,
+            result.error,
+        )
+        for result in results
+    ]
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(
+        TABLE_NAME, records=records, columns=COPY_COLUMNS
+    )
+    return len(records)
+
+
+_maintenance_task: Optional["asyncio.Task[None]"] = None
+
+
+async def maintain_forever() -> None:
+    while True:
+        try:
+            await maintain_partitions()
+        except Exception:
+            logger.exception("Could not maintain check result partitions")
+        await asyncio.sleep(MAINTENANCE_INTERVAL)
+
+
+async def start() -> None:
+    global _maintenance_task
+    if _maintenance_task is None:
+        _maintenance_task = asyncio.create_task(maintain_forever())
+
+
+async def stop() -> None:
+    global _maintenance_task
+    if _maintenance_task is not None:
+        _maintenance_task.cancel()
+        await asyncio.gather(_maintenance_task, return_exceptions=True)
+        _maintenance_task = None
@@ -0,0 +1,238 @@
+"""
+Incremental rollups of check results, for uptime and latency over long ranges.
+
+Every batch stored by `app.results` is also aggregated per healthstack into
+1 minute, 1 hour and 1 day buckets and upserted into `check_rollup_1m`,
+`check_rollup_1h` and `check_rollup_1d` in the same transaction. Every bucket
+holds counts, RTT sum, min, max and a latency sketch (`app.core.sketch`), all
+of them mergeable, so any range is answered by adding up a handful of rows
+instead of scanning raw results.
+
+1 minute and 1 hour buckets are deleted after `CHECK_ROLLUP_1M_RETENTION_DAYS`
+and `CHECK_ROLLUP_1H_RETENTION_DAYS`, 1 day buckets are kept forever.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, NamedTuple, Optional
+
+from sqlalchemy import delete, func, literal_column, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app import models, schemas
+from app.core import sketch
+from app.core.config import settings
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# asyncpg allows at most 32767 parameters in one statement
+UPSERT_CHUNK_SIZE = 2000
+
+
+class Resolution(NamedTuple):
+    name: str
+    model: Any
+    step: timedelta
+    retention_days: Optional[int]
+
+
+RESOLUTIONS: dict[str, Resolution] = {
+    resolution.name: resolution
+    for resolution in (
+        Resolution(
+            "1m",
+            models.CheckRollup1m,
+            timedelta(minutes=1),
+            settings.CHECK_ROLLUP_1M_RETENTION_DAYS,
+        ),
+        Resolution(
+            "1h",
+            models.CheckRollup1h,
+            timedelta(hours=1),
+            settings.CHECK_ROLLUP_1H_RETENTION_DAYS,
+        ),
+        Resolution("1d", models.CheckRollup1d, timedelta(days=1), None),
+    )
+}
+
+
+class Rollup:
+    def __init__(self) -> None:
+        self.checks = 0
+        self.up_checks = 0
+        self.rtt_samples = 0
+        self.rtt_sum = 0.0
+        self.rtt_min: Optional[float] = None
+        self.rtt_max: Optional[float] = None
+        self.rtt_sketch = sketch.empty()
+
+    @classmethod
+    def from_row(cls, row: Any) -> "Rollup":
+        rollup = cls()
+        rollup.checks = row.checks
+        rollup.up_checks = row.up_checks
+        rollup.rtt_samples = row.rtt_samples
+        rollup.rtt_sum = row.rtt_sum
+        rollup.rtt_min = row.rtt_min
+        rollup.rtt_max = row.rtt_max
+        rollup.rtt_sketch = list(row.rtt_sketch)
+        return rollup
+
+    def add(self, is_up: bool, rtt: Optional[float]) -> None:
+        self.checks += 1
+        self.up_checks += is_up
+        if rtt is None:
+            return
+        self.rtt_samples += 1
+        self.rtt_sum += rtt
+        self.rtt_min = rtt if self.rtt_min is None else min(self.rtt_min, rtt)
+        self.rtt_max = rtt if self.rtt_max is None else max(self.rtt_max, rtt)
+        sketch.add(self.rtt_sketch, rtt)
+
+    def merge(self, other: "Rollup") -> None:
+        self.checks += other.checks
+        self.up_checks += other.up_checks
+        self.rtt_samples += other.rtt_samples
+        self.rtt_sum += other.rtt_sum
+        if other.rtt_min is not None:
+            self.rtt_min = (
+                other.rtt_min
+                if self.rtt_min is None
+                else min(self.rtt_min, other.rtt_min)
+            )
+        if other.rtt_max is not None:
+            self.rtt_max = (
+                other.rtt_max
+                if self.rtt_max is None
+                else max(self.rtt_max, other.rtt_max)
+            )
+        self.rtt_sketch = sketch.merge([self.rtt_sketch, other.rtt_sketch])
+
+    def stats(self) -> dict[str, Optional[float]]:
+        return {
+            "checks": self.checks,
+            "up_checks": self.up_checks,
+            "uptime": self.up_checks / self.checks if self.checks else None,
+            "rtt_avg": self.rtt_sum / self.rtt_samples if self.rtt_samples else None,
+            "rtt_min": self.rtt_min,
+            "rtt_max": self.rtt_max,
+            "rtt_p50": sketch.quantile(self.rtt_sketch, 0.5),
+            "rtt_p95": sketch.quantile(self.rtt_sketch, 0.95),
+            "rtt_p99": sketch.quantile(self.rtt_sketch, 0.99),
+        }
+
+
+def bucket_start(moment: datetime, step: timedelta) -> datetime:
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment - (moment - EPOCH) % step
+
+
+def aggregate(
+    results: Iterable[schemas.CheckResultCreate], step: timedelta
+) -> dict[tuple[int, datetime], Rollup]:
+    rollups: dict[tuple[int, datetime], Rollup] = {}
+    for result in results:
+        key = (result.healthstack_id, bucket_start(result.checked_at, step))
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollup = rollups[key] = Rollup()
+        rollup.add(result.is_up, result.rtt_ms)
+    return rollups
+
+
+async def upsert_rollups(
+    session: AsyncSession, results: list[schemas.CheckResultCreate]
+) -> None:
+    """
+    Adds `results` to rollups of every resolution, rows are locked in key order
+    so concurrent batches do not deadlock.
+    """
+    for resolution in RESOLUTIONS.values():
+        table = resolution.model.__table__
+        rows = [
+            {
+                "healthstack_id": healthstack_id,
+                "bucket": bucket,
+                "checks": rollup.checks,
+                "up_checks": rollup.up_checks,
+                "rtt_samples": rollup.rtt_samples,
+                "rtt_sum": rollup.rtt_sum,
+                "rtt_min": rollup.rtt_min,
+                "rtt_max": rollup.rtt_max,
+                "rtt_sketch": rollup.rtt_sketch,
+            }
+            for (healthstack_id, bucket), rollup in sorted(
+                aggregate(results, resolution.step).items()
+            )
+        ]
+        for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            statement = insert(table).values(rows[start : start + UPSERT_CHUNK_SIZE])
+            excluded = statement.excluded
+            await session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[table.c.healthstack_id, table.c.bucket],
+                    set_={
+                        "checks": table.c.checks + excluded.checks,
+                        "up_checks": table.c.up_checks + excluded.up_checks,
+                        "rtt_samples": table.c.rtt_samples + excluded.rtt_samples,
+                        "rtt_sum": table.c.rtt_sum + excluded.rtt_sum,
+                        # least and greatest skip nulls
+                        "rtt_min": func.least(table.c.rtt_min, excluded.rtt_min),
+                        "rtt_max": func.greatest(table.c.rtt_max, excluded.rtt_max),
+                        "rtt_sketch": literal_column(
+                            "ARRAY(SELECT coalesce(old, 0) + coalesce(new, 0) "
+                            f"FROM unnest({table.name}.rtt_sketch, "
+                            "excluded.rtt_sketch) AS merged(old, new))"
+                        ),
+                    },
+                )
+            )
+
+
+def choose_resolution(since: datetime, until: datetime, now: datetime) -> str:
+    """
+    The finest resolution that needs at most a few hundred rows for the range
+    and still keeps buckets from `since` (they are not deleted yet at `now`).
+    """
+    if until - since <= timedelta(hours=6) and _is_retained("1m", since, now):
+        return "1m"
+    if until - since <= timedelta(days=14) and _is_retained("1h", since, now):
+        return "1h"
+    return "1d"
+
+
+def _is_retained(resolution: str, since: datetime, now: datetime) -> bool:
+    retention_days = RESOLUTIONS[resolution].retention_days
+    return retention_days is None or since >= now - timedelta(days=retention_days)
+
+
+async def load_rollups(
+    session: AsyncSession,
+    healthstack_id: int,
+    resolution: str,
+    since: datetime,
+    until: datetime,
+) -> list[tuple[datetime, Rollup]]:
+    model = RESOLUTIONS[resolution].model
+    result = await session.execute(
+        select(model)
+        .where(
+            model.healthstack_id == healthstack_id,
+            model.bucket >= bucket_start(since, RESOLUTIONS[resolution].step),
+            model.bucket < until,
+        )
+        .order_by(model.bucket)
+    )
+    return [(row.bucket, Rollup.from_row(row)) for row in result.scalars()]
+
+
+async def delete_expired_rollups(connection: AsyncConnection, now: datetime) -> None:
+    for resolution in RESOLUTIONS.values():
+        if resolution.retention_days is None:
+            continue
+        await connection.execute(
+            delete(resolution.model).where(
+                resolution.model.bucket
+                < now - timedelta(days=resolution.retention_days)
+            )
+        )
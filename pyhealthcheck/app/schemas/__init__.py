@@ -1,3 +1,4 @@
+from .check_result import *
 from .common import *
 from .healthstack import *
 from .ping import *
@@ -0,0 +1,106 @@
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
+
+
+class CheckResultCreate(BaseModel):
+    healthstack_id: int
+    domain: str = Field(max_length=100)
+    checked_at: datetime
+    is_up: bool
+    rtt_ms: Optional[float] = Field(default=None, ge=0)
+    error: Optional[str] = Field(default=None, max_length=254)
+
+
+class CheckResultBatch(BaseModel):
+    results: list[CheckResultCreate] = Field(
+        min_items=1, max_items=settings.CHECK_RESULT_MAX_BATCH
+    )
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "results": [
+                    {
+                        "healthstack_id": 4,
+                        "domain": "rafsaf.pl",
+                        "checked_at": "2021-12-12T10:00:00+00:00",
+                        "is_up": True,
+                        "rtt_ms": 12.5,
+                        "error": None,
+                    },
+                    {
+                        "healthstack_id": 4,
+                        "domain": "registry.rafsaf.pl",
+                        "checked_at": "2021-12-12T10:00:00+00:00",
+                        "is_up": False,
+                        "rtt_ms": None,
+                        "error": "Ping timeout",
+                    },
+                ]
+            }
+        }
+
+
+class CheckResultBatchResponse(BaseModel):
+    inserted: int
+
+
+class CheckRollupResolution(str, Enum):
+    minute = "1m"
+    hour = "1h"
+    day = "1d"
+
+
+class CheckStats(BaseModel):
+    checks: int
+    up_checks: int
+    uptime: Optional[float]
+    rtt_avg: Optional[float]
+    rtt_min: Optional[float]
+    rtt_max: Optional[float]
+    rtt_p50: Optional[float]
+    rtt_p95: Optional[float]
+    rtt_p99: Optional[float]
+
+
+class CheckStatsPoint(CheckStats):
+    bucket: datetime
+
+
+class HealthStackStats(CheckStats):
+    healthstack_id: int
+    resolution: CheckRollupResolution
+    since: datetime
+    until: datetime
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "healthstack_id": 4,
+                "resolution": "1d",
+                "since": "2021-09-13T00:00:00+00:00",
+                "until": "2021-12-12T00:00:00+00:00",
+                "checks": 777600,
+                "up_checks": 777212,
+                "uptime": 0.9995,
+                "rtt_avg": 14.81,
+                "rtt_min": 9.12,
+                "rtt_max": 1840.5,
+                "rtt_p50": 13.59,
+                "rtt_p95": 21.93,
+                "rtt_p99": 53.2,
+            }
+        }
+
+
+class HealthStackStatsSeries(BaseModel):
+    healthstack_id: int
+    resolution: CheckRollupResolution
+    since: datetime
+    until: datetime
+    points: list[CheckStatsPoint]
@@ -1,6 +1,9 @@
-from typing import Optional
+from datetime import datetime
+from typing import Any, Optional
 
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, validator
+
+from app.core.config import settings
 
 from .user import User
 
@@ -49,6 +52,10 @@ class HealthStackCreate(BaseModel):
     delay_between_checks: int = Field(ge=2, le=3600)
     emails_to_alert: list[EmailStr]
 
+    @validator("domains", each_item=True)
+    def _normalize_domain(cls, domain: str) -> str:
+        return domain.strip().lower()
+
     class Config:
         schema_extra = {
             "example": {
@@ -59,3 +66,222 @@ class HealthStackCreate(BaseModel):
             }
         }
         orm_mode = True
+
+
+class HealthStackUpdate(HealthStackCreate):
+    id: int
+
+
+class HealthStackBulkCreate(BaseModel):
+    # items are validated one by one as `HealthStackCreate`, so invalid ones
+    # (not objects too) are reported per item instead of failing the whole request
+    healthstacks: list[Any] = Field(
+        min_items=1, max_items=settings.HEALTHSTACK_BULK_MAX_ITEMS
+    )
+    atomic: bool = False
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "healthstacks": [
+                    {
+                        "custom_name": "Fantastic Stack",
+                        "domains": ["rafsaf.pl", "registry.rafsaf.pl"],
+                        "delay_between_checks": 10,
+                        "emails_to_alert": ["example@example.com"],
+                    }
+                ],
+                "atomic": False,
+            }
+        }
+
+
+class HealthStackBulkUpdate(BaseModel):
+    # items are validated one by one as `HealthStackUpdate`
+    healthstacks: list[Any] = Field(
+        min_items=1, max_items=settings.HEALTHSTACK_BULK_MAX_ITEMS
+    )
+    atomic: bool = False
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "healthstacks": [
+                    {
+                        "id": 4,
+                        "custom_name": "Fantastic Stack",
+                        "domains": ["rafsaf.pl", "google.com"],
+                        "delay_between_checks": 30,
+                        "emails_to_alert": ["example@example.com"],
+                    }
+                ],
+                "atomic": False,
+            }
+        }
+
+
+class HealthStackBulkDelete(BaseModel):
+    ids: list[int] = Field(min_items=1, max_items=settings.HEALTHSTACK_BULK_MAX_ITEMS)
+    atomic: bool = False
+
+    class Config:
+        schema_extra = {"example": {"ids": [4, 5, 6], "atomic": False}}
+
+
+class HealthStackBulkItem(BaseModel):
+    index: int
+    id: Optional[int]
+    revision: Optional[int]
+    error: Optional[str]
+
+
+class HealthStackBulkResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: list[HealthStackBulkItem]
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "succeeded": 1,
+                "failed": 1,
+                "results": [
+                    {"index": 0, "id": 4, "revision": 1024, "error": None},
+                    {
+                        "index": 1,
+                        "id": None,
+                        "revision": None,
+                        "error": "delay_between_checks: field required",
+                    },
+                ],
+            }
+        }
+
+
+class HealthStackLease(BaseModel):
+    id: int
+    custom_name: Optional[str]
+    domains: list[str]
+    delay_between_checks: int
+    lease_expires_at: datetime
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "id": 4,
+                "custom_name": "Fantastic Stack",
+                "domains": ["rafsaf.pl", "registry.rafsaf.pl", "google.com"],
+                "delay_between_checks": 10,
+                "lease_expires_at": "2021-12-12T10:00:00+00:00",
+            }
+        }
+        orm_mode = True
+
+
+class HealthStackLeaseRelease(BaseModel):
+    ids: list[int] = Field(max_items=1000)
+
+    class Config:
+        schema_extra = {"example": {"ids": [4, 5, 6]}}
+
+
+class HealthStackCheckJob(BaseModel):
+    id: int
+    custom_name: Optional[str]
+    domains: list[str]
+    delay_between_checks: int
+    revision: int
+
+    class Config:
+        orm_mode = True
+
+
+class WorkerShard(BaseModel):
+    worker_id: int
+    workers: int
+    healthstacks: list[HealthStackCheckJob]
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "worker_id": 10,
+                "workers": 3,
+                "healthstacks": [
+                    {
+                        "id": 4,
+                        "custom_name": "Fantastic Stack",
+                        "domains": ["rafsaf.pl", "registry.rafsaf.pl"],
+                        "delay_between_checks": 10,
+                        "revision": 1024,
+                    }
+                ],
+            }
+        }
+
+
+class HealthStackChanges(BaseModel):
+    cursor: str
+    changed: bool
+    healthstacks: list[HealthStackCheckJob]
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "cursor": "9b1c0f0e2d7a43c1a5e8f6b2",
+                "changed": True,
+                "healthstacks": [
+                    {
+                        "id": 4,
+                        "custom_name": "Fantastic Stack",
+                        "domains": ["rafsaf.pl", "registry.rafsaf.pl"],
+                        "delay_between_checks": 10,
+                        "revision": 1024,
+                    }
+                ],
+            }
+        }
+
+
+class DomainSearch(BaseModel):
+    domains: list[str] = Field(min_items=1, max_items=1000)
+    match_all: bool = False
+
+    @validator("domains", each_item=True)
+    def _normalize_domain(cls, domain: str) -> str:
+        return domain.strip().lower()
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "domains": ["rafsaf.pl", "google.com"],
+                "match_all": False,
+            }
+        }
+
+
+class DomainSearchMatch(BaseModel):
+    id: int
+    custom_name: Optional[str]
+    user_id: int
+    worker_id: Optional[int]
+
+
+class DomainSearchResponse(BaseModel):
+    healthstacks: dict[str, list[DomainSearchMatch]]
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "healthstacks": {
+                    "rafsaf.pl": [
+                        {
+                            "id": 4,
+                            "custom_name": "Fantastic Stack",
+                            "user_id": 1,
+                            "worker_id": 10,
+                        }
+                    ],
+                    "google.com": [],
+                }
+            }
+        }
@@ -5,7 +5,7 @@ from pydantic.fields import Field
 
 
 class ManyPings(BaseModel):
-    hostname_list: List[str] = Field(max_items=100)
+    hostname_list: List[str]
 
     class Config:
         schema_extra = {
@@ -22,11 +22,56 @@ class SinglePing(BaseModel):
         schema_extra = {"example": {"hostname": "rafsaf.pl"}}
 
 
+class PingStatistics(BaseModel):
+    sent: int
+    received: int
+    loss: float
+    min: Optional[float]
+    avg: Optional[float]
+    max: Optional[float]
+    stddev: Optional[float]
+    p50: Optional[float]
+    p95: Optional[float]
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "sent": 5,
+                "received": 4,
+                "loss": 0.2,
+                "min": 50.12,
+                "avg": 51.58,
+                "max": 54.01,
+                "stddev": 1.49,
+                "p50": 51.09,
+                "p95": 53.67,
+            },
+        }
+
+
+class AddressPingResponse(BaseModel):
+    address: str
+    live: bool
+    delay: Optional[float]
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "address": "2a00:1450:401b:800::200e",
+                "live": True,
+                "delay": 11.94,
+            },
+        }
+
+
 class SinglePingResponse(BaseModel):
     hostname: str = Field(max_length=1000)
     live: bool
     delay: Optional[float]
     message: str
+    statistics: Optional[PingStatistics] = None
+    address: Optional[str] = None
+    addresses: Optional[list[AddressPingResponse]] = None
 
     class Config:
         schema_extra = {
@@ -39,9 +84,18 @@ class SinglePingResponse(BaseModel):
         }
 
 
+class ManyPingsSummary(BaseModel):
+    live: int
+    not_live: int
+
+    class Config:
+        schema_extra = {"example": {"live": 2, "not_live": 1}}
+
+
 class ManyPingsResponse(BaseModel):
     live: int
     not_live: int
+    pending: int = 0
     results: list[SinglePingResponse]
 
     class Config:
@@ -49,6 +103,7 @@ class ManyPingsResponse(BaseModel):
             "example": {
                 "live": 2,
                 "not_live": 1,
+                "pending": 0,
                 "results": [
                     {
                         "hostname": "xddd.com",
@@ -71,3 +126,58 @@ class ManyPingsResponse(BaseModel):
                 ],
             },
         }
+
+
+class Probe(BaseModel):
+    target: str = Field(max_length=1000)
+
+    class Config:
+        schema_extra = {"example": {"target": "https://rafsaf.pl/"}}
+
+
+class ManyProbes(BaseModel):
+    target_list: List[str]
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "target_list": [
+                    "https://rafsaf.pl/",
+                    "http://google.com/",
+                    "tcp://registry.rafsaf.pl:443",
+                ]
+            }
+        }
+
+
+class ProbeResponse(BaseModel):
+    target: str = Field(max_length=1000)
+    live: bool
+    status_code: Optional[int]
+    connect: Optional[float]
+    tls: Optional[float]
+    first_byte: Optional[float]
+    total: Optional[float]
+    reused_connection: bool = False
+    message: str
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "target": "https://rafsaf.pl/",
+                "live": True,
+                "status_code": 200,
+                "connect": 24.31,
+                "tls": 51.02,
+                "first_byte": 30.77,
+                "total": 106.55,
+                "reused_connection": False,
+                "message": "Probe response in 106.55 ms",
+            },
+        }
+
+
+class ManyProbesResponse(BaseModel):
+    live: int
+    not_live: int
+    results: list[ProbeResponse]
@@ -20,3 +20,15 @@ class TokenPayload(BaseModel):
 
 class TokenRefresh(BaseModel):
     refresh_token: str = Field(max_length=200)
+
+
+class PasswordHashingStats(BaseModel):
+    workers: int
+    max_queue: int
+    pending: int
+    calls: int
+    rejected: int
+    queue_wait_avg_ms: float
+    queue_wait_max_ms: float
+    hash_time_avg_ms: float
+    hash_time_max_ms: float
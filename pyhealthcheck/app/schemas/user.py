@@ -39,7 +39,7 @@ class UserCreate(BaseUser):
 
 class WorkerUserCreate(BaseUser):
     register_key: str
-    healthstack_id: int
+    healthstack_id: Optional[int] = None
 
 
 class UserGet(BaseUser):
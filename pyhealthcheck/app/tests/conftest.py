@@ -5,6 +5,7 @@ import pytest
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.api import deps
 from app.core.config import settings
 from app.main import app
 from app.models import Base, User
@@ -19,6 +20,14 @@ def event_loop():
     loop.close()
 
 
+@pytest.fixture(autouse=True)
+def clear_user_cache():
+    # tests change users directly in the database, bypassing invalidation
+    deps.user_cache.clear()
+    yield
+    deps.user_cache.clear()
+
+
 @pytest.fixture(scope="session")
 async def client():
     async with AsyncClient(app=app, base_url="http://test") as client:
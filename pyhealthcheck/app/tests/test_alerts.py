@@ -0,0 +1,171 @@
+import asyncio
+from datetime import datetime, timezone
+from email import message_from_bytes
+
+import pytest
+
+from app import alerts
+from app.core.alerts import Alert, AlertDispatcher
+from app.core.mail import SmtpSender
+
+# All test coroutines in file will be treated as marked (async allowed).
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+async def smtp_server():
+    """
+    Minimal local SMTP server, yields (port, received messages, connections).
+    """
+    received: list = []
+    connections: list = []
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connections.append(writer)
+        writer.write(b"220 localhost ready\r\n")
+        while line := await reader.readline():
+            command = line.strip().upper()
+            if command == b"DATA":
+                writer.write(b"354 end with .\r\n")
+                data = await reader.readuntil(b"\r\n.\r\n")
+                received.append(message_from_bytes(data[:-5]))
+                writer.write(b"250 queued\r\n")
+            elif command == b"QUIT":
+                writer.write(b"221 bye\r\n")
+                await writer.drain()
+                writer.close()
+                return
+            else:
+                writer.write(b"250 ok\r\n")
+            await writer.drain()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    yield server.sockets[0].getsockname()[1], received, connections
+    server.close()
+
+
+async def test_dispatcher_debounces_and_coalesces():
+    notified: list[list[Alert]] = []
+
+    async def notify(batch: list[Alert], delivered: dict[Alert, set[str]]):
+        notified.append(batch)
+
+    dispatcher = AlertDispatcher(
+        notify, down_threshold=3, up_threshold=2, batch_seconds=0, queue_size=10
+    )
+    for is_up in (True, True, False, False, True, False, False):
+        dispatcher.observe(1, is_up)
+    # stack 1 was up and never failed 3 times in a row
+    assert dispatcher.pending == []
+
+    dispatcher.observe(1, False)
+    assert [alert.is_up for alert in dispatcher.pending] == [False]
+    # back up before the batch was sent, nothing to tell
+    dispatcher.observe(1, True)
+    dispatcher.observe(1, True)
+    assert dispatcher.pending == []
+
+    for _ in range(3):
+        dispatcher.observe(1, False)
+        dispatcher.observe(2, False)
+    await dispatcher.flush()
+    assert sorted(alert.stack_id for alert in notified[0]) == [1, 2]
+
+    for _ in range(3):
+        dispatcher.observe(1, False)
+    assert dispatcher.pending == []
+    dispatcher.observe(1, True)
+    dispatcher.observe(1, True)
+    assert [alert.is_up for alert in dispatcher.pending] == [True]
+
+
+async def test_dispatcher_batches_queued_outcomes():
+    notified: list[list[Alert]] = []
+
+    async def notify(batch: list[Alert], delivered: dict[Alert, set[str]]):
+        notified.append(batch)
+
+    dispatcher = AlertDispatcher(
+        notify, down_threshold=1, up_threshold=1, batch_seconds=0.1, queue_size=1000
+    )
+    await dispatcher.start()
+    for stack_id in range(100):
+        dispatcher.report(stack_id, False)
+    await asyncio.sleep(0.3)
+    await dispatcher.stop()
+
+    assert len(notified) == 1
+    assert len(notified[0]) == 100
+    dispatcher.report(1, True)
+    assert dispatcher.dropped == 0
+
+
+async def test_dispatcher_retries_only_undelivered_recipients():
+    sent: list[tuple[int, str]] = []
+    failures = 1
+
+    async def notify(batch: list[Alert], delivered: dict[Alert, set[str]]):
+        nonlocal failures
+        for alert in batch:
+            for recipient in ("a@example.com", "b@example.com"):
+                if recipient in delivered[alert]:
+                    continue
+                if recipient == "b@example.com" and failures:
+                    failures -= 1
+                    raise OSError("Connection lost")
+                sent.append((alert.stack_id, recipient))
+                delivered[alert].add(recipient)
+
+    dispatcher = AlertDispatcher(
+        notify, down_threshold=1, up_threshold=1, batch_seconds=0, queue_size=10
+    )
+    dispatcher.observe(1, False)
+    await dispatcher.flush()
+    assert [alert.stack_id for alert in dispatcher.pending] == [1]
+    await dispatcher.flush()
+    assert sent == [(1, "a@example.com"), (1, "b@example.com")]
+    assert dispatcher.pending == []
+
+    dispatcher.observe(2, False)
+    dispatcher.forget(1)
+    dispatcher.forget(2)
+    assert dispatcher.pending == []
+    assert dispatcher._states == {}
+
+
+def test_build_messages_skips_delivered_recipients():
+    alert = Alert(1, False, datetime.now(timezone.utc))
+    messages = alerts.build_messages(
+        [alert],
+        {1: ("first", ["a@example.com", "b@example.com"])},
+        {alert: {"a@example.com"}},
+    )
+    assert [message["To"] for message in messages] == ["b@example.com"]
+
+
+async def test_alert_emails_use_one_connection(smtp_server):
+    port, received, connections = smtp_server
+    sender = SmtpSender("127.0.0.1", port)
+    now = datetime.now(timezone.utc)
+    stacks = {
+        1: ("first", ["a@example.com", "b@example.com"]),
+        2: ("second", ["a@example.com"]),
+    }
+
+    await sender.send(
+        alerts.build_messages(
+            [Alert(1, False, now), Alert(2, False, now), Alert(3, False, now)], stacks
+        )
+    )
+    await sender.send(alerts.build_messages([Alert(2, True, now)], stacks))
+    await sender.close()
+
+    assert [message["To"] for message in received] == [
+        "a@example.com",
+        "b@example.com",
+        "a@example.com",
+    ]
+    assert "2 healthstack(s) down" in received[0]["Subject"]
+    assert "second (id 2)" in received[0].get_payload()
+    assert "back up" in received[2]["Subject"]
+    assert len(connections) == sender.connections == 1
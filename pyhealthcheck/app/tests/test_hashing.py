@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+from app.core.hashing import HasherBusy, PasswordHasher
+
+# All test coroutines in file will be treated as marked (async allowed).
+pytestmark = pytest.mark.asyncio
+
+
+async def test_password_hasher_hashes_in_thread_pool():
+    hasher = PasswordHasher(workers=1, max_queue=0)
+    hashed = await hasher.hash("Password1!")
+    assert await hasher.verify("Password1!", hashed)
+    hasher.close()
+
+    assert hasher.pending == 0
+    assert hasher.stats["calls"] == 2
+    assert hasher.stats["hash_time_max_ms"] > 0
+
+
+async def test_password_hasher_rejects_calls_over_queue_limit():
+    hasher = PasswordHasher(workers=1, max_queue=1)
+    hashed = await hasher.hash("Password1!")
+
+    results = await asyncio.gather(
+        hasher.verify("Password1!", hashed),
+        hasher.verify("wrong", hashed),
+        hasher.verify("Password1!", hashed),
+        return_exceptions=True,
+    )
+    hasher.close()
+
+    assert results[0] is True
+    assert results[1] is False
+    assert isinstance(results[2], HasherBusy)
+    assert hasher.stats["rejected"] == 1
+    assert hasher.stats["calls"] == 3
+    assert hasher.stats["queue_wait_max_ms"] > 0
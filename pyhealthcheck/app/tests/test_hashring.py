@@ -0,0 +1,41 @@
+from app.core.hashring import RING_SIZE, HashRing, key_position
+
+
+def test_hash_ring_splits_keys_evenly():
+    ring = HashRing(range(20), replicas=128)
+    shards: dict = {}
+    for key in range(20000):
+        shards.setdefault(ring.node_for(key), []).append(key)
+
+    assert len(shards) == 20
+    assert min(map(len, shards.values())) > 1000 * 0.6
+    assert max(map(len, shards.values())) < 1000 * 1.4
+
+
+def test_hash_ring_moves_few_keys_when_node_joins_or_leaves():
+    before = HashRing(range(20), replicas=128)
+    joined = HashRing(range(21), replicas=128)
+    left = HashRing(range(19), replicas=128)
+    keys = range(20000)
+
+    moved = [key for key in keys if before.node_for(key) != joined.node_for(key)]
+    assert all(joined.node_for(key) == 20 for key in moved)
+    assert len(moved) < len(keys) / 21 * 1.5
+
+    moved = [key for key in keys if before.node_for(key) != left.node_for(key)]
+    assert all(before.node_for(key) == 19 for key in moved)
+    assert HashRing([], replicas=128).node_for(1) is None
+
+
+def test_hash_ring_ranges_match_node_for():
+    ring = HashRing(range(5), replicas=128)
+    for node in range(5):
+        ranges = ring.ranges(node)
+        assert all(start < end for start, end in ranges)
+        for key in range(2000):
+            position = key_position(key)
+            in_ranges = any(start <= position < end for start, end in ranges)
+            assert in_ranges == (ring.node_for(key) == node)
+    sizes = [end - start for node in range(5) for start, end in ring.ranges(node)]
+    assert sum(sizes) == RING_SIZE
+    assert HashRing([], replicas=128).ranges(1) == []
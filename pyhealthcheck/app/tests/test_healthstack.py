@@ -0,0 +1,671 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio.session import AsyncSession
+
+from app import changes, results, schemas
+from app.api import etag
+from app.core import hashring
+from app.core.config import settings
+from app.models import CheckResult, CheckRollup1d, HealthStack, User
+from app.session import async_engine
+from app.tests.utils import create_healthstack, create_user, reverse
+
+# All test coroutines in file will be treated as marked (async allowed).
+pytestmark = pytest.mark.asyncio
+
+
+async def test_lease_worker_healthstacks(
+    client: AsyncClient,
+    default_user: User,
+    worker_user: User,
+    get_headers,
+    session: AsyncSession,
+):
+    await session.execute(delete(HealthStack))
+    await session.commit()
+    other_worker = await create_user(session, "worker")
+    free_stack = await create_healthstack(session, default_user)
+    own_stack = await create_healthstack(session, default_user, worker=worker_user)
+    await create_healthstack(session, default_user, worker=other_worker)
+
+    result = await client.post(reverse("lease_worker_healthstacks"))
+    assert result.status_code == 401
+
+    headers = await get_headers(worker_user)
+    result = await client.post(reverse("lease_worker_healthstacks"), headers=headers)
+    assert result.status_code == 200
+    assert {stack["id"] for stack in result.json()} == {free_stack.id, own_stack.id}
+
+    # already leased stacks are not leased again
+    result = await client.post(reverse("lease_worker_healthstacks"), headers=headers)
+    assert result.status_code == 200
+    assert result.json() == []
+
+    other_headers = await get_headers(other_worker)
+    result = await client.post(
+        reverse("lease_worker_healthstacks"),
+        headers=other_headers,
+        params={"limit": 5},
+    )
+    assert result.status_code == 200
+    assert len(result.json()) == 1
+
+
+async def test_release_worker_healthstacks(
+    client: AsyncClient,
+    default_user: User,
+    worker_user: User,
+    get_headers,
+    session: AsyncSession,
+):
+    await session.execute(delete(HealthStack))
+    await session.commit()
+    stack = await create_healthstack(session, default_user, delay_between_checks=60)
+    next_check_at = stack.next_check_at
+    headers = await get_headers(worker_user)
+
+    result = await client.post(reverse("lease_worker_healthstacks"), headers=headers)
+    assert [leased["id"] for leased in result.json()] == [stack.id]
+
+    result = await client.post(
+        reverse("release_worker_healthstacks"),
+        headers=headers,
+        json={"ids": [stack.id]},
+    )
+    assert result.status_code == 204
+    await session.refresh(stack)
+    assert stack.leased_by_id is None
+    assert stack.lease_expires_at is None
+    assert stack.next_check_at > next_check_at
+
+    # stack is not due before its delay
+    result = await client.post(reverse("lease_worker_healthstacks"), headers=headers)
+    assert result.json() == []
+
+
+async def test_create_check_results(
+    client: AsyncClient,
+    default_user: User,
+    worker_user: User,
+    get_headers,
+    session: AsyncSession,
+):
+    await results.maintain_partitions()
+    stack = await create_healthstack(session, default_user, worker=worker_user)
+    headers = await get_headers(worker_user)
+    checked_at = datetime.now(timezone.utc).isoformat()
+    batch = {
+        "results": [
+            {
+                "healthstack_id": stack.id,
+                "domain": stack.domains[0],
+                "checked_at": checked_at,
+                "is_up": i % 10 != 0,
+                "rtt_ms": 12.5 if i % 10 else None,
+                "error": None if i % 10 else "Ping timeout",
+            }
+            for i in range(2000)
+        ]
+    }
+
+    result = await client.post(reverse("create_check_results"), json=batch)
+    assert result.status_code == 401
+
+    result = await client.post(
+        reverse("create_check_results"), headers=headers, json=batch
+    )
+    assert result.status_code == 201
+    assert result.json() == {"inserted": 2000}
+    count = await session.scalar(
+        select(func.count())
+        .select_from(CheckResult)
+        .where(CheckResult.healthstack_id == stack.id, CheckResult.is_up.is_(False))
+    )
+    assert count == 200
+
+
+async def test_create_check_results_invalid(
+    client: AsyncClient,
+    default_user: User,
+    worker_user: User,
+    get_headers,
+    session: AsyncSession,
+):
+    await results.maintain_partitions()
+    stack = await create_healthstack(session, default_user, worker=worker_user)
+    headers = await get_headers(worker_user)
+    result = {
+        "healthstack_id": stack.id + 1000,
+        "domain": stack.domains[0],
+        "checked_at": datetime.now(timezone.utc).isoformat(),
+        "is_up": True,
+    }
+
+    response = await client.post(
+        reverse("create_check_results"), headers=headers, json={"results": [result]}
+    )
+    assert response.status_code == 404
+
+    result["healthstack_id"] = stack.id
+    result["checked_at"] = (datetime.now(timezone.utc) - timedelta(days=3)).isoformat()
+    response = await client.post(
+        reverse("create_check_results"), headers=headers, json={"results": [result]}
+    )
+    assert response.status_code == 400
+
+
+async def test_create_check_results_of_other_workers_stack(
+    client: AsyncClient,
+    default_user: User,
+    worker_user: User,
+    get_headers,
+    session: AsyncSession,
+):
+    await results.maintain_partitions()
+    stack = await create_healthstack(session, default_user, worker=worker_user)
+    free_stack = await create_healthstack(session, default_user)
+    other_worker = await create_user(session, "worker")
+    other_headers = await get_headers(other_worker)
+    result = {
+        "healthstack_id": stack.id,
+        "domain": stack.domains[0],
+        "checked_at": datetime.now(timezone.utc).isoformat(),
+        "is_up": True,
+    }
+
+    response = await client.post(
+        reverse("create_check_results"),
+        headers=other_headers,
+        json={"results": [result]},
+    )
+    assert response.status_code == 403
+
+    result["healthstack_id"] = free_stack.id
+    response = await client.post(
+        reverse("create_check_results"),
+        headers=other_headers,
+        json={"results": [result]},
+    )
+    assert response.status_code == 403
+
+    free_stack.lease_expires_at = datetime.now(timezone.utc) + timedelta(minutes=1)
+    free_stack.leased_by_id = other_worker.id
+    session.add(free_stack)
+    await session.commit()
+    response = await client.post(
+        reverse("create_check_results"),
+        headers=other_headers,
+        json={"results": [result]},
+    )
+    assert response.status_code == 201
+
+
+async def test_drop_expired_check_result_partitions():
+    today = datetime.now(timezone.utc).date()
+    expired = today - timedelta(days=400)
+    async with async_engine.begin() as connection:
+        await results.create_partitions(connection, expired, expired)
+
+    dropped = await results.maintain_partitions(today)
+    assert dropped == [results.partition_name(expired)]
+    assert await results.maintain_partitions(today) == []
+
+
+async def test_get_healthstack_stats(
+    client: AsyncClient,
+    default_user: User,
+    worker_user: User,
+    get_headers,
+    session: AsyncSession,
+):
+    await results.maintain_partitions()
+    stack = await create_healthstack(session, default_user, worker=worker_user)
+    worker_headers = await get_headers(worker_user)
+    now = datetime.now(timezone.utc)
+    batch = {
+        "results": [
+            {
+                "healthstack_id": stack.id,
+                "domain": stack.domains[0],
+                "checked_at": (now - timedelta(minutes=i % 3)).isoformat(),
+                "is_up": i % 4 != 0,
+                "rtt_ms": 20.0 if i % 4 else None,
+            }
+            for i in range(40)
+        ]
+    }
+    # second batch is merged into the same rollup rows
+    for _ in range(2):
+        result = await client.post(
+            reverse("create_check_results"), headers=worker_headers, json=batch
+        )
+        assert result.status_code == 201
+
+    headers = await get_headers(default_user)
+    result = await client.get(
+        reverse("get_healthstack_stats", id=stack.id), headers=headers
+    )
+    assert result.status_code == 200
+    stats = result.json()
+    assert stats["resolution"] == "1h"
+    assert stats["checks"] == 80
+    assert stats["uptime"] == 0.75
+    assert stats["rtt_min"] == stats["rtt_max"] == 20.0
+    assert abs(stats["rtt_p95"] - 20.0) / 20.0 < 0.05
+
+    result = await client.get(
+        reverse("get_healthstack_stats_series", id=stack.id),
+        headers=headers,
+        params={"since": (now - timedelta(hours=1)).isoformat()},
+    )
+    assert result.status_code == 200
+    assert result.json()["resolution"] == "1m"
+    assert sum(point["checks"] for point in result.json()["points"]) == 80
+
+    result = await client.get(
+        reverse("get_healthstack_stats_series", id=stack.id),
+        headers=headers,
+        params={"since": (now - timedelta(days=3)).isoformat(), "resolution": "1m"},
+    )
+    assert result.status_code == 400
+
+    other_headers = await get_headers(worker_user)
+    result = await client.get(
+        reverse("get_healthstack_stats", id=stack.id), headers=other_headers
+    )
+    assert result.status_code == 404
+
+
+async def register_shard_worker(client: AsyncClient) -> tuple[int, dict[str, str]]:
+    result = await client.post(
+        reverse("register_worker"),
+        json={"register_key": settings.PYHEALTHCHECK_WORKER_REGISTER_KEY},
+    )
+    assert result.status_code == 200
+    token = await client.post(
+        reverse("login_access_token"),
+        data={
+            "username": result.json()["username"],
+            "password": result.json()["password"],
+        },
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    return result.json()["id"], {
+        "Authorization": f"Bearer {token.json()['access_token']}"
+    }
+
+
+async def test_get_worker_shard(
+    client: AsyncClient,
+    default_user: User,
+    worker_user: User,
+    get_headers,
+    session: AsyncSession,
+):
+    await session.execute(delete(HealthStack))
+    await session.commit()
+    stacks = [await create_healthstack(session, default_user) for _ in range(30)]
+    await create_healthstack(session, default_user, worker=worker_user)
+
+    workers_headers = [(await register_shard_worker(client))[1] for _ in range(3)]
+
+    # first round is a heartbeat of every worker
+    for headers in workers_headers:
+        result = await client.get(reverse("get_worker_shard"), headers=headers)
+        assert result.status_code == 200
+    shards = []
+    for headers in workers_headers:
+        result = await client.get(reverse("get_worker_shard"), headers=headers)
+        assert result.json()["workers"] == 3
+        shards.append({stack["id"] for stack in result.json()["healthstacks"]})
+
+    assert set.union(*shards) == {stack.id for stack in stacks}
+    assert sum(map(len, shards)) == len(stacks)
+
+    result = await client.get(
+        reverse("get_worker_shard"), headers=await get_headers(worker_user)
+    )
+    assert result.status_code == 404
+
+
+async def test_get_worker_healthstack_changes(
+    client: AsyncClient,
+    default_user: User,
+    worker_user: User,
+    get_headers,
+    session: AsyncSession,
+):
+    await changes.listener.start()
+    stack = await create_healthstack(session, default_user, worker=worker_user)
+    headers = await get_headers(worker_user)
+
+    result = await client.get(
+        reverse("get_worker_healthstack_changes"), headers=headers
+    )
+    assert result.status_code == 200
+    assert result.json()["changed"]
+    assert [item["id"] for item in result.json()["healthstacks"]] == [stack.id]
+    cursor = result.json()["cursor"]
+    revision = result.json()["healthstacks"][0]["revision"]
+
+    result = await client.get(
+        reverse("get_worker_healthstack_changes"),
+        headers=headers,
+        params={"cursor": cursor, "timeout": 0},
+    )
+    assert not result.json()["changed"]
+    assert result.json()["cursor"] == cursor
+
+    long_poll = asyncio.create_task(
+        client.get(
+            reverse("get_worker_healthstack_changes"),
+            headers=headers,
+            params={"cursor": cursor, "timeout": 10},
+        )
+    )
+    await asyncio.sleep(0.2)
+    assert not long_poll.done()
+    stack.domains = ["rafsaf.pl"]
+    session.add(stack)
+    await changes.notify_changed(session)
+    await session.commit()
+
+    result = await asyncio.wait_for(long_poll, 2)
+    assert result.json()["changed"]
+    assert result.json()["healthstacks"][0]["domains"] == ["rafsaf.pl"]
+    assert result.json()["healthstacks"][0]["revision"] > revision
+    await changes.listener.stop()
+
+
+async def test_get_worker_healthstack_changes_of_shard(
+    client: AsyncClient,
+    default_user: User,
+    session: AsyncSession,
+):
+    await changes.listener.start()
+    await session.execute(delete(HealthStack))
+    await session.commit()
+    worker_id, headers = await register_shard_worker(client)
+    joining_id, joining_headers = await register_shard_worker(client)
+    result = await client.get(reverse("get_worker_shard"), headers=headers)
+    assert result.status_code == 200
+
+    result = await session.execute(
+        select(User.id).where(
+            User.is_shard_worker.is_(True), User.last_seen_at.is_not(None)
+        )
+    )
+    workers = sorted(result.scalars())
+    ring = hashring.get_ring(tuple(workers), settings.WORKER_SHARD_VIRTUAL_NODES)
+    new_ring = hashring.get_ring(
+        tuple(sorted([*workers, joining_id])), settings.WORKER_SHARD_VIRTUAL_NODES
+    )
+    # stack that moves to the joining worker
+    while True:
+        stack = await create_healthstack(session, default_user)
+        if ring.node_for(stack.id) == worker_id:
+            if new_ring.node_for(stack.id) == joining_id:
+                break
+
+    result = await client.get(
+        reverse("get_worker_healthstack_changes"), headers=headers
+    )
+    assert stack.id in [item["id"] for item in result.json()["healthstacks"]]
+
+    long_poll = asyncio.create_task(
+        client.get(
+            reverse("get_worker_healthstack_changes"),
+            headers=headers,
+            params={"cursor": result.json()["cursor"], "timeout": 10},
+        )
+    )
+    await asyncio.sleep(0.2)
+    assert not long_poll.done()
+    # first heartbeat of the joining worker is notified
+    await client.get(reverse("get_worker_shard"), headers=joining_headers)
+
+    result = await asyncio.wait_for(long_poll, 2)
+    assert result.json()["changed"]
+    assert stack.id not in [item["id"] for item in result.json()["healthstacks"]]
+    await changes.listener.stop()
+
+
+async def test_healthstack_etags(
+    client: AsyncClient,
+    default_user: User,
+    maintainer_user: User,
+    get_headers,
+    session: AsyncSession,
+):
+    stack = await create_healthstack(session, default_user)
+    headers = await get_headers(default_user)
+    maintainer_headers = await get_headers(maintainer_user)
+
+    for url, request_headers in (
+        (reverse("get_all_my_health_stacks"), headers),
+        (reverse("get_all_health_stacks"), maintainer_headers),
+        (reverse("get_healthstack_by_id", id=stack.id), maintainer_headers),
+    ):
+        result = await client.get(url, headers=request_headers)
+        assert result.status_code == 200
+        stack_etag = result.headers["ETag"]
+        result = await client.get(
+            url, headers={**request_headers, "If-None-Match": stack_etag}
+        )
+        assert result.status_code == 304
+
+        stack.delay_between_checks += 1
+        session.add(stack)
+        await session.commit()
+        result = await client.get(
+            url, headers={**request_headers, "If-None-Match": stack_etag}
+        )
+        assert result.status_code == 200
+        assert result.headers["ETag"] != stack_etag
+
+    # ETag of an empty result must not hide a missing or foreign stack
+    other_stack = await create_healthstack(session, maintainer_user)
+    empty_etag = etag.make_etag([])
+    for url, request_headers in (
+        (reverse("get_my_healthstack_by_id", id=other_stack.id), headers),
+        (
+            reverse("get_healthstack_by_id", id=other_stack.id + 1000),
+            maintainer_headers,
+        ),
+    ):
+        for if_none_match in (empty_etag, "*"):
+            result = await client.get(
+                url, headers={**request_headers, "If-None-Match": if_none_match}
+            )
+            assert result.status_code == 404
+
+
+async def test_healthstack_list_fast_path_matches_schema(
+    client: AsyncClient,
+    default_user: User,
+    worker_user: User,
+    get_headers,
+    session: AsyncSession,
+):
+    await create_healthstack(session, default_user)
+    await create_healthstack(session, default_user, worker=worker_user)
+    headers = await get_headers(default_user)
+
+    result = await client.get(reverse("get_all_my_health_stacks"), headers=headers)
+    assert result.status_code == 200
+    assert result.headers["content-type"] == "application/json"
+    healthstacks = result.json()
+    assert len(healthstacks) >= 2
+    assert any(healthstack["worker"] is not None for healthstack in healthstacks)
+    for healthstack in healthstacks:
+        assert schemas.HealthStack(**healthstack).dict() == healthstack
+
+
+async def test_search_healthstacks_by_domains(
+    client: AsyncClient,
+    default_user: User,
+    maintainer_user: User,
+    get_headers,
+    session: AsyncSession,
+):
+    first = await create_healthstack(session, default_user)
+    second = await create_healthstack(session, default_user)
+    second.domains = [first.domains[0], "shared.example.com"]
+    session.add(second)
+    await session.commit()
+    headers = await get_headers(maintainer_user)
+
+    result = await client.post(
+        reverse("search_healthstacks_by_domains"),
+        headers=headers,
+        json={"domains": [first.domains[0].upper(), "shared.example.com", "x.invalid"]},
+    )
+    assert result.status_code == 200
+    healthstacks = result.json()["healthstacks"]
+    assert [item["id"] for item in healthstacks[first.domains[0]]] == [
+        first.id,
+        second.id,
+    ]
+    assert [item["id"] for item in healthstacks["shared.example.com"]] == [second.id]
+    assert healthstacks["x.invalid"] == []
+
+    result = await client.post(
+        reverse("search_healthstacks_by_domains"),
+        headers=headers,
+        json={"domains": second.domains, "match_all": True},
+    )
+    assert [
+        item["id"] for item in result.json()["healthstacks"]["shared.example.com"]
+    ] == [second.id]
+
+    result = await client.post(
+        reverse("search_healthstacks_by_domains"),
+        headers=await get_headers(default_user),
+        json={"domains": ["rafsaf.pl"]},
+    )
+    assert result.status_code == 403
+
+
+async def test_bulk_create_update_delete_healthstacks(
+    client: AsyncClient,
+    default_user: User,
+    maintainer_user: User,
+    get_headers,
+    session: AsyncSession,
+):
+    headers = await get_headers(default_user)
+    valid = {
+        "custom_name": "Bulk Stack",
+        "domains": ["Bulk.Example.com"],
+        "delay_between_checks": 10,
+        "emails_to_alert": ["example@example.com"],
+    }
+    result = await client.post(
+        reverse("bulk_create_healthstacks"),
+        headers=headers,
+        json={"healthstacks": [valid, {"domains": []}, valid], "atomic": True},
+    )
+    assert result.status_code == 400
+    assert result.json()["failed"] == 1
+
+    result = await client.post(
+        reverse("bulk_create_healthstacks"),
+        headers=headers,
+        json={"healthstacks": [valid, {"domains": []}, valid, 1]},
+    )
+    assert result.status_code == 200
+    body = result.json()
+    assert (body["succeeded"], body["failed"]) == (2, 2)
+    first, invalid, second, not_object = body["results"]
+    assert invalid["id"] is None and "delay_between_checks" in invalid["error"]
+    assert not_object["error"] == "Item must be an object"
+    assert first["id"] < second["id"] and first["error"] is None
+    stack = await session.get(HealthStack, first["id"])
+    assert stack.user_id == default_user.id
+    assert stack.domains == ["bulk.example.com"]
+    assert stack.revision == first["revision"]
+
+    result = await client.post(
+        reverse("bulk_create_healthstacks"),
+        headers=headers,
+        json={
+            "healthstacks": [
+                {**valid, "custom_name": f"Bulk Stack {i}"} for i in range(10)
+            ]
+        },
+    )
+    assert result.status_code == 200
+    for i, item in enumerate(result.json()["results"]):
+        named_stack = await session.get(HealthStack, item["id"])
+        assert named_stack.custom_name == f"Bulk Stack {i}"
+
+    other_stack = await create_healthstack(session, maintainer_user)
+    result = await client.post(
+        reverse("bulk_update_healthstacks"),
+        headers=headers,
+        json={
+            "healthstacks": [
+                {**valid, "id": first["id"], "delay_between_checks": 60},
+                {**valid, "id": other_stack.id},
+                {**valid, "id": first["id"]},
+            ]
+        },
+    )
+    assert result.status_code == 200
+    updated, not_found, repeated = result.json()["results"]
+    assert updated["revision"] > first["revision"]
+    assert not_found["error"] == "HealthStack not found"
+    assert repeated["error"] == "HealthStack is repeated in the request"
+    await session.refresh(stack)
+    assert stack.delay_between_checks == 60
+
+    result = await client.post(
+        reverse("bulk_delete_healthstacks"),
+        headers=headers,
+        json={"ids": [first["id"], other_stack.id], "atomic": True},
+    )
+    assert result.status_code == 400
+    await results.maintain_partitions()
+    now = datetime.now(timezone.utc)
+    for stack_id in (first["id"], other_stack.id):
+        session.add(
+            CheckResult(
+                checked_at=now, healthstack_id=stack_id, domain="a.pl", is_up=True
+            )
+        )
+        session.add(
+            CheckRollup1d(
+                healthstack_id=stack_id,
+                bucket=now.replace(hour=0, minute=0, second=0, microsecond=0),
+                checks=1,
+                up_checks=1,
+                rtt_samples=0,
+                rtt_sum=0.0,
+                rtt_sketch=[],
+            )
+        )
+    await session.commit()
+    result = await client.post(
+        reverse("bulk_delete_healthstacks"),
+        headers=headers,
+        json={"ids": [first["id"], second["id"], other_stack.id]},
+    )
+    assert result.status_code == 200
+    assert result.json()["succeeded"] == 2
+    remaining = await session.execute(
+        select(HealthStack.id).where(
+            HealthStack.id.in_([first["id"], second["id"], other_stack.id])
+        )
+    )
+    assert remaining.scalars().all() == [other_stack.id]
+    for model in (CheckResult, CheckRollup1d):
+        remaining = await session.execute(
+            select(model.healthstack_id).where(
+                model.healthstack_id.in_([first["id"], other_stack.id])
+            )
+        )
+        assert remaining.scalars().all() == [other_stack.id]
@@ -0,0 +1,471 @@
+import asyncio
+import json
+import socket
+import time
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import AsyncIterator
+
+import pytest
+from httpx import AsyncClient
+
+from app import schemas
+from app.api.endpoints import ping
+from app.api.endpoints.ping import (
+    PingErrorResponses,
+    make_ping,
+    ping_flights,
+    ping_statistics,
+)
+from app.core import icmp, probes, resolver, rtt
+from app.core.config import settings
+from app.core.singleflight import SingleFlight
+from app.models import User
+from app.schemas import ProbeResponse
+from app.tests.utils import reverse
+
+# All test coroutines in file will be treated as marked (async allowed).
+pytestmark = pytest.mark.asyncio
+
+
+async def test_icmp_engine_shares_one_socket():
+    delays = await asyncio.gather(
+        *(icmp.engine.ping("127.0.0.1", timeout=2) for _ in range(20))
+    )
+    assert all(delay >= 0 for delay in delays)
+    assert list(icmp.engine._sockets) == [socket.AF_INET]
+    assert icmp.engine.get_socket(socket.AF_INET).in_flight == 0
+
+
+async def test_resolver_cache():
+    cache = resolver.ResolverCache(maxsize=2, negative_ttl=5)
+    addresses = await cache.resolve("localhost")
+    assert await cache.resolve("LOCALHOST.") == addresses
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    for _ in range(2):
+        with pytest.raises(socket.gaierror):
+            await cache.resolve("invalid.invalid")
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    assert await cache.resolve("127.0.0.1") == [(socket.AF_INET, ("127.0.0.1", 0))]
+    with pytest.raises(socket.gaierror):
+        await cache.resolve("other.invalid")
+    assert len(cache) == 2
+    await cache.resolve("localhost")
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+class FakeResolverV3:
+    async def query(self, hostname, qtype):
+        if qtype == "AAAA":
+            raise OSError("No AAAA records")
+        return [SimpleNamespace(host="10.0.0.1", ttl=30)]
+
+
+class FakeResolverV4:
+    async def query_dns(self, hostname, qtype):
+        if qtype == "AAAA":
+            raise OSError("No AAAA records")
+        return SimpleNamespace(
+            answer=[
+                SimpleNamespace(data=SimpleNamespace(cname="example.com"), ttl=5),
+                SimpleNamespace(data=SimpleNamespace(addr="10.0.0.1"), ttl=30),
+            ]
+        )
+
+
+@pytest.mark.parametrize("fake_resolver", [FakeResolverV3, FakeResolverV4])
+async def test_resolver_cache_uses_record_ttl(fake_resolver):
+    cache = resolver.ResolverCache(maxsize=2, negative_ttl=5)
+    cache._dns_resolver = fake_resolver()
+    addresses, ttl = await cache._query_dns("example.com")
+    assert addresses == [(socket.AF_INET, ("10.0.0.1", 0))]
+    assert ttl == 30
+
+
+async def test_make_single_ping(client: AsyncClient):
+    result = await client.post(
+        reverse("make_single_ping"), json={"hostname": "127.0.0.1"}
+    )
+    assert result.status_code == 200
+    assert result.json()["live"]
+
+    result = await client.post(
+        reverse("make_single_ping"), json={"hostname": "invalid.invalid"}
+    )
+    assert result.status_code == 400
+    assert result.json()["message"] == PingErrorResponses.invalid_host
+
+
+async def test_make_many_pings(client: AsyncClient):
+    result = await client.post(
+        reverse("make_many_pings"),
+        json={"hostname_list": ["127.0.0.1", "localhost", "invalid.invalid"]},
+    )
+    assert result.status_code == 200
+    assert result.json()["live"] == 2
+    assert result.json()["not_live"] == 1
+
+
+async def test_single_flight_coalesces_identical_calls():
+    calls = 0
+
+    async def func():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    flights: SingleFlight[int] = SingleFlight(reuse_window=60)
+    results = await asyncio.gather(*(flights.run("key", func) for _ in range(10)))
+    assert results == [1] * 10
+    assert await flights.run("key", func) == 1
+    assert await flights.run("other", func) == 2
+    assert len(flights) == 0
+
+
+async def test_make_many_pings_skips_duplicates(client: AsyncClient):
+    result = await client.post(
+        reverse("make_many_pings"),
+        json={"hostname_list": ["127.0.0.1", "127.0.0.1", "localhost"]},
+    )
+    assert result.status_code == 200
+    assert result.json()["live"] == 2
+    assert len(result.json()["results"]) == 2
+
+
+async def test_make_many_pings_stream(client: AsyncClient):
+    result = await client.post(
+        reverse("make_many_pings_stream"),
+        json={"hostname_list": ["127.0.0.1", "localhost", "invalid.invalid"]},
+    )
+    assert result.status_code == 200
+    assert result.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in result.text.splitlines()]
+    assert len(lines) == 4
+    assert {line["hostname"] for line in lines[:3]} == {
+        "127.0.0.1",
+        "localhost",
+        "invalid.invalid",
+    }
+    assert lines[3] == {"live": 2, "not_live": 1}
+
+
+async def test_make_many_pings_stream_disconnect():
+    response = await ping.make_many_pings_stream(
+        schemas.ManyPings(hostname_list=["127.0.0.1", "10.255.255.1"]),
+        timeout=5,
+        count=1,
+        interval_ms=100,
+        adaptive_timeout=False,
+        all_addresses=False,
+    )
+    lines = response.body_iterator
+    assert json.loads(await lines.__anext__())["hostname"] == "127.0.0.1"
+    # client went away before the slow ping finished
+    await lines.aclose()
+
+    await asyncio.sleep(0.01)
+    assert len(ping_flights) == 0
+    assert icmp.engine.get_socket(socket.AF_INET).in_flight == 0
+
+
+async def test_make_many_pings_deadline(client: AsyncClient):
+    result = await client.post(
+        reverse("make_many_pings"),
+        params={"timeout": 5, "deadline_ms": 200},
+        json={"hostname_list": ["127.0.0.1", "10.255.255.1"]},
+    )
+    assert result.status_code == 200
+    data = result.json()
+    assert (data["live"], data["not_live"], data["pending"]) == (1, 0, 1)
+    assert data["results"][1]["hostname"] == "10.255.255.1"
+    assert data["results"][1]["message"] == PingErrorResponses.deadline_exceeded
+
+    await asyncio.sleep(0)
+    assert len(ping_flights) == 0
+    assert icmp.engine.get_socket(socket.AF_INET).in_flight == 0
+
+
+async def test_cancelled_shared_ping_is_not_reused(monkeypatch):
+    monkeypatch.setattr(ping_flights, "reuse_window", 60)
+    tasks = [
+        asyncio.ensure_future(make_ping("10.255.255.1", timeout=5)) for _ in range(2)
+    ]
+    await asyncio.sleep(0.05)
+    for task in tasks:
+        task.cancel()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+
+    await asyncio.sleep(0.01)
+    assert len(ping_flights) == 0
+    assert not ping_flights._recent
+
+
+async def test_make_single_ping_statistics(client: AsyncClient):
+    result = await client.post(
+        reverse("make_single_ping"),
+        params={"count": 5, "interval_ms": 10},
+        json={"hostname": "127.0.0.1"},
+    )
+    assert result.status_code == 200
+    statistics = result.json()["statistics"]
+    assert (statistics["sent"], statistics["received"], statistics["loss"]) == (5, 5, 0)
+    assert statistics["min"] <= statistics["p50"] <= statistics["max"]
+
+
+def test_ping_statistics():
+    statistics = ping_statistics(5, [10, 40, 20, 30])
+    assert statistics.loss == 0.2
+    assert (statistics.min, statistics.avg, statistics.max) == (10, 25, 40)
+    assert statistics.p50 == 25
+    assert statistics.p95 == pytest.approx(38.5)
+    assert statistics.stddev == pytest.approx(11.18, abs=0.01)
+
+    assert ping_statistics(2, []).loss == 1
+
+
+async def test_make_many_pings_over_old_limit(client: AsyncClient):
+    hostname_list = [f"127.0.0.{i}" for i in range(1, 201)]
+    result = await client.post(
+        reverse("make_many_pings"), json={"hostname_list": hostname_list}
+    )
+    assert result.status_code == 200
+    assert result.json()["live"] == 200
+
+
+async def test_send_pacer():
+    pacer = icmp.SendPacer(rate=100, burst=2)
+    start = time.monotonic()
+    for _ in range(6):
+        await pacer.wait()
+    assert time.monotonic() - start >= 0.035
+
+
+def test_rtt_estimator():
+    estimator = rtt.RttEstimator(maxsize=2, min_timeout=0.02)
+    assert estimator.timeout("rafsaf.pl", maximum=2) == 2
+
+    estimator.update("rafsaf.pl", 0.1)
+    assert estimator.get("rafsaf.pl") == (0.1, 0.05)
+    assert estimator.timeout("RAFSAF.pl", maximum=2) == pytest.approx(0.3)
+    estimator.update("rafsaf.pl", 0.1)
+    assert estimator.timeout("rafsaf.pl", maximum=2) == pytest.approx(0.25)
+    estimator.on_timeout("rafsaf.pl")
+    assert estimator.timeout("rafsaf.pl", maximum=2) == pytest.approx(0.4)
+    assert estimator.timeout("rafsaf.pl", maximum=0.2) == 0.2
+
+    estimator.update("127.0.0.1", 0.0001)
+    assert estimator.timeout("127.0.0.1", maximum=2) == 0.02
+    estimator.update("google.com", 0.01)
+    assert len(estimator) == 2
+    assert estimator.get("rafsaf.pl") is None
+
+
+async def test_make_single_ping_adaptive_timeout(client: AsyncClient):
+    rtt.estimator.update("10.255.255.1", 0.01)
+    start = time.monotonic()
+    result = await client.post(
+        reverse("make_single_ping"),
+        params={"timeout": 5, "adaptive_timeout": True},
+        json={"hostname": "10.255.255.1"},
+    )
+    assert result.status_code == 400
+    assert result.json()["message"] == PingErrorResponses.time_out
+    assert time.monotonic() - start < 1
+
+
+@asynccontextmanager
+async def serve_http(response: bytes) -> AsyncIterator[int]:
+    """
+    Answers every request on a new localhost port with `response`.
+    """
+    handlers: set[asyncio.Task] = set()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        handlers.add(asyncio.current_task())
+        try:
+            while await reader.readuntil(b"\r\n\r\n"):
+                writer.write(response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    try:
+        yield server.sockets[0].getsockname()[1]
+    finally:
+        server.close()
+        await server.wait_closed()
+        for task in handlers:
+            task.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+
+@pytest.fixture
+async def http_server():
+    async with serve_http(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok") as port:
+        yield port
+
+
+@pytest.fixture
+async def probe_headers(default_user: User, get_headers, monkeypatch):
+    """
+    Headers of a user allowed to probe local test servers.
+    """
+    monkeypatch.setattr(settings, "PROBE_ALLOW_PRIVATE_ADDRESSES", True)
+    monkeypatch.setattr(settings, "PROBE_ALLOWED_PORTS", None)
+    return await get_headers(default_user)
+
+
+async def test_make_single_probe(
+    client: AsyncClient, http_server: int, probe_headers: dict
+):
+    results = []
+    for _ in range(2):
+        result = await client.post(
+            reverse("make_single_probe"),
+            headers=probe_headers,
+            json={"target": f"http://127.0.0.1:{http_server}/health"},
+        )
+        assert result.status_code == 200
+        results.append(result.json())
+    assert results[0]["status_code"] == 200
+    assert not results[0]["reused_connection"]
+    assert results[0]["connect"] is not None
+    assert results[1]["reused_connection"]
+    assert results[1]["connect"] is None
+
+    result = await client.post(
+        reverse("make_single_probe"),
+        headers=probe_headers,
+        json={"target": f"tcp://127.0.0.1:{http_server}"},
+    )
+    assert result.status_code == 200
+    assert result.json()["connect"] is not None
+
+    result = await client.post(
+        reverse("make_single_probe"),
+        headers=probe_headers,
+        json={"target": "ftp://127.0.0.1"},
+    )
+    assert result.status_code == 400
+    assert result.json()["message"] == PingErrorResponses.invalid_target
+
+
+async def test_make_many_probes(
+    client: AsyncClient, http_server: int, probe_headers: dict
+):
+    result = await client.post(
+        reverse("make_many_probes"),
+        headers=probe_headers,
+        json={
+            "target_list": [
+                f"http://127.0.0.1:{http_server}/",
+                f"tcp://localhost:{http_server}",
+                "tcp://127.0.0.1:1",
+            ]
+        },
+    )
+    assert result.status_code == 200
+    assert (result.json()["live"], result.json()["not_live"]) == (2, 1)
+
+
+async def test_make_single_probe_bad_response(client: AsyncClient, probe_headers: dict):
+    async with serve_http(b"HTTP/1.1 abc OK\r\n\r\n") as port:
+        result = await client.post(
+            reverse("make_single_probe"),
+            headers=probe_headers,
+            json={"target": f"http://127.0.0.1:{port}/"},
+        )
+    assert result.status_code == 400
+    assert result.json()["message"] == PingErrorResponses.bad_response
+
+
+async def test_make_many_probes_concurrency(
+    client: AsyncClient, probe_headers: dict, monkeypatch
+):
+    running = 0
+    max_running = 0
+
+    async def make_probe(target: str, timeout: int):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return ProbeResponse(target=target, live=True, message="")
+
+    monkeypatch.setattr(settings, "PROBE_MAX_CONCURRENCY", 3)
+    monkeypatch.setattr(ping, "make_probe", make_probe)
+    result = await client.post(
+        reverse("make_many_probes"),
+        headers=probe_headers,
+        json={"target_list": [f"tcp://127.0.0.1:{port}" for port in range(1, 11)]},
+    )
+    assert result.status_code == 200
+    assert result.json()["live"] == 10
+    assert max_running == 3
+
+
+def test_probe_check_allowed():
+    public = probes.parse_target("https://rafsaf.pl/")
+    probes.check_allowed(public, "93.184.216.34")
+    for target, ip in (
+        (public, "127.0.0.1"),
+        (public, "10.0.0.1"),
+        (public, "169.254.169.254"),
+        (public, "fe80::1%eth0"),
+        (probes.parse_target("tcp://rafsaf.pl:6379"), "93.184.216.34"),
+    ):
+        with pytest.raises(probes.ForbiddenTarget):
+            probes.check_allowed(target, ip)
+
+
+async def test_make_probes_requires_user_and_public_target(
+    client: AsyncClient, http_server: int, default_user: User, get_headers
+):
+    target = {"target": f"http://127.0.0.1:{http_server}/"}
+    result = await client.post(reverse("make_single_probe"), json=target)
+    assert result.status_code == 401
+
+    result = await client.post(
+        reverse("make_single_probe"),
+        json=target,
+        headers=await get_headers(default_user),
+    )
+    assert result.status_code == 400
+    assert result.json()["message"] == PingErrorResponses.forbidden_target
+
+
+def test_interleave_families():
+    ipv4 = [(socket.AF_INET, (f"10.0.0.{i}", 0)) for i in range(3)]
+    ipv6 = [(socket.AF_INET6, (f"fe80::{i}", 0, 0, 0)) for i in range(2)]
+    assert icmp.interleave_families(ipv4 + ipv6) == [
+        ipv6[0],
+        ipv4[0],
+        ipv6[1],
+        ipv4[1],
+        ipv4[2],
+    ]
+
+
+async def test_make_single_ping_all_addresses(client: AsyncClient):
+    result = await client.post(
+        reverse("make_single_ping"),
+        params={"all_addresses": True},
+        json={"hostname": "localhost"},
+    )
+    assert result.status_code == 200
+    data = result.json()
+    assert data["addresses"]
+    fastest = min(
+        (address for address in data["addresses"] if address["live"]),
+        key=lambda address: address["delay"],
+    )
+    assert data["address"] == fastest["address"]
+    assert data["delay"] == fastest["delay"]
@@ -0,0 +1,61 @@
+from app.core.probeplan import ProbePlan
+from app.core.scheduler import CheckJob, ProbeJob
+
+
+def test_probe_plan_deduplicates_domains_with_shortest_delay():
+    plan = ProbePlan()
+    plan.sync(
+        [
+            CheckJob(1, ("rafsaf.pl", "example.com"), 60),
+            CheckJob(2, ("Example.com",), 10),
+            CheckJob(3, ("example.com", "example.com"), 30),
+        ]
+    )
+
+    assert len(plan) == 2
+    assert plan.subscriptions == 4
+    assert sorted(plan.jobs()) == [
+        ProbeJob("example.com", 10),
+        ProbeJob("rafsaf.pl", 60),
+    ]
+    assert plan.subscribers("example.com") == {1, 2, 3}
+
+
+def test_probe_plan_incremental_updates():
+    plan = ProbePlan()
+    assert plan.update(CheckJob(1, ("example.com",), 60)) == (
+        [ProbeJob("example.com", 60)],
+        [],
+    )
+    # same delay or slower subscriber does not change the plan
+    assert plan.update(CheckJob(2, ("example.com",), 120)) == ([], [])
+    assert plan.update(CheckJob(2, ("example.com",), 120)) == ([], [])
+    # faster subscriber reschedules the domain
+    assert plan.update(CheckJob(3, ("example.com", "rafsaf.pl"), 30)) == (
+        [ProbeJob("example.com", 30), ProbeJob("rafsaf.pl", 30)],
+        [],
+    )
+    # edit drops a domain without other subscribers
+    assert plan.update(CheckJob(3, ("example.com",), 30)) == ([], ["rafsaf.pl"])
+    assert plan.remove(3) == ([ProbeJob("example.com", 60)], [])
+    assert plan.remove(1) == ([ProbeJob("example.com", 120)], [])
+    assert plan.remove(2) == ([], ["example.com"])
+    assert plan.remove(2) == ([], [])
+    assert len(plan) == 0
+
+
+def test_probe_plan_fans_out_results_once_all_domains_are_probed():
+    plan = ProbePlan()
+    plan.sync(
+        [
+            CheckJob(1, ("example.com",), 10),
+            CheckJob(2, ("example.com", "rafsaf.pl"), 10),
+        ]
+    )
+
+    assert plan.record("example.com", True) == [(1, True)]
+    assert plan.record("rafsaf.pl", False) == [(2, False)]
+    assert plan.record("example.com", True) == [(1, True)]
+    assert plan.record("example.com", True) == [(1, True)]
+    assert sorted(plan.record("rafsaf.pl", True)) == [(2, True)]
+    assert plan.record("unknown.com", True) == []
@@ -0,0 +1,78 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+from app import rollups, schemas
+from app.core import sketch
+from app.core.config import settings
+
+
+def test_sketch_quantiles_are_within_relative_error():
+    values = [random.lognormvariate(3, 1) for _ in range(10000)]
+    latency_sketch = sketch.empty()
+    for value in values:
+        sketch.add(latency_sketch, value)
+
+    values.sort()
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * len(values)) - 1]
+        assert abs(sketch.quantile(latency_sketch, q) - exact) / exact < 0.06
+    assert sketch.quantile(sketch.empty(), 0.5) is None
+
+
+def test_sketch_merge_equals_sketch_of_all_values():
+    first, second, both = sketch.empty(), sketch.empty(), sketch.empty()
+    for value in (0.01, 1, 12.5, 300):
+        sketch.add(first, value)
+        sketch.add(both, value)
+    for value in (7, 90, 100000):
+        sketch.add(second, value)
+        sketch.add(both, value)
+
+    assert sketch.merge([first, second]) == both
+    assert sum(both) == 7
+
+
+def test_aggregate_results_into_buckets():
+    start = datetime(2021, 12, 12, 10, 0, tzinfo=timezone.utc)
+    results = [
+        schemas.CheckResultCreate(
+            healthstack_id=1,
+            domain="rafsaf.pl",
+            checked_at=start + timedelta(seconds=30 * i),
+            is_up=i != 3,
+            rtt_ms=None if i == 3 else 10 + i,
+        )
+        for i in range(4)
+    ]
+
+    minutes = rollups.aggregate(results, timedelta(minutes=1))
+    assert sorted(minutes) == [(1, start), (1, start + timedelta(minutes=1))]
+
+    hours = rollups.aggregate(results, timedelta(hours=1))
+    rollup = hours[(1, start)]
+    assert rollup.stats()["checks"] == 4
+    assert rollup.stats()["uptime"] == 0.75
+    assert rollup.stats()["rtt_avg"] == 11
+    assert (rollup.rtt_min, rollup.rtt_max) == (10, 12)
+
+    total = rollups.Rollup()
+    for rollup in minutes.values():
+        total.merge(rollup)
+    assert total.stats() == hours[(1, start)].stats()
+
+
+def test_choose_resolution():
+    now = datetime.now(timezone.utc)
+    assert rollups.choose_resolution(now - timedelta(hours=1), now, now) == "1m"
+    assert rollups.choose_resolution(now - timedelta(days=7), now, now) == "1h"
+    assert rollups.choose_resolution(now - timedelta(days=90), now, now) == "1d"
+
+    # narrow windows older than retention of finer buckets
+    since = now - timedelta(days=settings.CHECK_ROLLUP_1M_RETENTION_DAYS + 3)
+    until = since + timedelta(hours=1)
+    assert rollups.choose_resolution(since, until, now) == "1h"
+    since = now - timedelta(days=settings.CHECK_ROLLUP_1H_RETENTION_DAYS + 3)
+    until = since + timedelta(hours=1)
+    assert rollups.choose_resolution(since, until, now) == "1d"
+    until = since + timedelta(days=7)
+    assert rollups.choose_resolution(since, until, now) == "1d"
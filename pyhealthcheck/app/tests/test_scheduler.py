@@ -0,0 +1,74 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from app.core.scheduler import CheckJob, CheckScheduler, ProbeJob
+
+# All test coroutines in file will be treated as marked (async allowed).
+pytestmark = pytest.mark.asyncio
+
+
+async def test_scheduler_runs_checks_periodically():
+    checked: Counter[int] = Counter()
+    running = 0
+    max_running = 0
+
+    async def check(job: CheckJob):
+        nonlocal running, max_running
+        checked[job.stack_id] += 1
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    scheduler = CheckScheduler(check, max_concurrency=2)
+    scheduler.sync([CheckJob(stack_id, ("127.0.0.1",), 0.05) for stack_id in range(4)])
+    await scheduler.start()
+    await asyncio.sleep(0.27)
+    await scheduler.stop()
+
+    assert set(checked) == {0, 1, 2, 3}
+    assert all(4 <= count <= 6 for count in checked.values())
+    assert max_running <= 2
+
+
+async def test_scheduler_sync_and_unschedule():
+    checked: list[int] = []
+
+    async def check(job: CheckJob):
+        checked.append(job.stack_id)
+
+    scheduler = CheckScheduler(check, max_concurrency=10)
+    await scheduler.start()
+    scheduler.sync(
+        [CheckJob(1, ("127.0.0.1",), 0.02), CheckJob(2, ("localhost",), 0.02)]
+    )
+    scheduler.sync([CheckJob(2, ("localhost",), 0.02)])
+    scheduler.unschedule(2)
+    scheduler.schedule(CheckJob(2, ("localhost",), 0.02))
+    assert len(scheduler) == 1
+    await asyncio.sleep(0.05)
+    await scheduler.stop()
+
+    assert 1 not in checked
+    assert 2 <= checked.count(2) <= 3
+
+
+async def test_scheduler_runs_probe_jobs_by_domain():
+    checked: Counter[str] = Counter()
+
+    async def check(job: ProbeJob):
+        checked[job.domain] += 1
+
+    scheduler = CheckScheduler(check, max_concurrency=10)
+    scheduler.sync([ProbeJob("localhost", 0.05), ProbeJob("127.0.0.1", 0.05)])
+    await scheduler.start()
+    await asyncio.sleep(0.12)
+    scheduler.unschedule("localhost")
+    await asyncio.sleep(0.1)
+    await scheduler.stop()
+
+    assert len(scheduler) == 1
+    assert 1 <= checked["localhost"] <= 3
+    assert checked["127.0.0.1"] >= 4
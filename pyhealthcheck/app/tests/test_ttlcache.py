@@ -0,0 +1,32 @@
+import time
+
+from app.core.ttlcache import TTLCache
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache: TTLCache[int, str] = TTLCache(maxsize=2, ttl=60)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    assert cache.get(1) == "a"
+    cache.set(3, "c")
+
+    assert cache.get(2) is None
+    assert cache.get(1) == "a"
+    assert cache.get(3) == "c"
+    assert cache.stats == {"hits": 3, "misses": 1, "size": 2}
+
+
+def test_ttl_cache_expires_and_invalidates():
+    cache: TTLCache[int, str] = TTLCache(maxsize=10, ttl=0.01)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    cache.invalidate(2)
+    assert cache.get(1) == "a"
+    assert cache.get(2) is None
+    time.sleep(0.02)
+    assert cache.get(1) is None
+    assert len(cache) == 0
+
+    disabled: TTLCache[int, str] = TTLCache(maxsize=10, ttl=0)
+    disabled.set(1, "a")
+    assert disabled.get(1) is None
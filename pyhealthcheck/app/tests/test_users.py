@@ -1,7 +1,9 @@
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio.session import AsyncSession
-from app.tests.utils import random_lower_string, reverse
+from app.api import deps
+from app.tests.utils import create_user, random_lower_string, reverse
 from app.models import User
 
 # All test coroutines in file will be treated as marked (async allowed).
@@ -41,3 +43,85 @@ async def test_update_user_me(
     await session.refresh(default_user)
     assert result.json()["full_name"] == default_user.full_name
     assert result.json()["full_name"] == to_update["full_name"]
+
+
+async def test_read_user_me_etag(
+    client: AsyncClient, default_user: User, get_headers, session: AsyncSession
+):
+    headers = await get_headers(default_user)
+    result = await client.get(reverse("read_user_me"), headers=headers)
+    assert result.status_code == 200
+    user_etag = result.headers["ETag"]
+
+    result = await client.get(
+        reverse("read_user_me"), headers={**headers, "If-None-Match": user_etag}
+    )
+    assert result.status_code == 304
+    assert result.content == b""
+
+    default_user.full_name = random_lower_string()
+    session.add(default_user)
+    await session.commit()
+    # written past the API, so the cached user must be dropped by hand
+    deps.user_cache.invalidate(default_user.id)
+    result = await client.get(
+        reverse("read_user_me"), headers={**headers, "If-None-Match": user_etag}
+    )
+    assert result.status_code == 200
+    assert result.headers["ETag"] != user_etag
+
+
+async def test_read_all_users_pages(
+    client: AsyncClient, maintainer_user: User, get_headers, session: AsyncSession
+):
+    for _ in range(5):
+        await create_user(session)
+    headers = await get_headers(maintainer_user)
+    total = await session.scalar(select(func.count()).select_from(User))
+
+    seen = []
+    params = {"limit": 2}
+    while True:
+        result = await client.get(
+            reverse("read_all_users"), headers=headers, params=params
+        )
+        assert result.status_code == 200
+        seen.extend(user["id"] for user in result.json())
+        if "Next-Cursor" not in result.headers:
+            break
+        params["cursor"] = result.headers["Next-Cursor"]
+
+    assert seen == sorted(seen)
+    assert len(seen) == total
+
+    result = await client.get(
+        reverse("read_all_users"), headers=headers, params={"cursor": "invalid"}
+    )
+    assert result.status_code == 400
+
+
+async def test_current_user_cache_is_invalidated(
+    client: AsyncClient, maintainer_user: User, session: AsyncSession, get_headers
+):
+    user = await create_user(session)
+    headers = await get_headers(user)
+    maintainer_headers = await get_headers(maintainer_user)
+    result = await client.get(reverse("read_user_me"), headers=headers)
+    assert result.json()["is_maintainer"] is False
+
+    result = await client.put(
+        reverse("update_other_user", username=user.username),
+        headers=maintainer_headers,
+        json={"is_maintainer": True},
+    )
+    assert result.status_code == 200
+    result = await client.get(reverse("read_user_me"), headers=headers)
+    assert result.json()["is_maintainer"] is True
+
+    result = await client.delete(
+        reverse("delete_other_user", username=user.username),
+        headers=maintainer_headers,
+    )
+    assert result.status_code == 204
+    result = await client.get(reverse("read_user_me"), headers=headers)
+    assert result.status_code == 404
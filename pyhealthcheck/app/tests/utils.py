@@ -1,13 +1,13 @@
 import random
 import string
-from typing import Literal
+from typing import Any, Literal, Optional
 
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.security import get_password_hash
-from app.models import User
 from app.main import app
+from app.models import HealthStack, User
 
 
 def random_lower_string(length: int = 32) -> str:
@@ -18,10 +18,10 @@ def random_email(length: int = 10) -> str:
     return f"{random_lower_string(length)}@{random_lower_string(length)}.com"
 
 
-def reverse(view_function_name: str) -> str:
+def reverse(view_function_name: str, **path_params: Any) -> str:
     # for route in app.routes:
     #    print(route.__dict__["path"])
-    return app.url_path_for(view_function_name)
+    return app.url_path_for(view_function_name, **path_params)
 
 
 async def create_user(
@@ -56,3 +56,23 @@ async def get_header_for_user(user: User, client: AsyncClient):
         headers={"Content-Type": "application/x-www-form-urlencoded"},
     )
     return {"Authorization": f"Bearer {access_token.json()['access_token']}"}
+
+
+async def create_healthstack(
+    session: AsyncSession,
+    user: User,
+    worker: Optional[User] = None,
+    delay_between_checks: int = 10,
+) -> HealthStack:
+    new_healthstack = HealthStack(
+        custom_name=random_lower_string(),
+        domains=[f"{random_lower_string(10)}.com"],
+        delay_between_checks=delay_between_checks,
+        emails_to_alert=[random_email()],
+        user_id=user.id,
+        worker_id=worker.id if worker else None,
+    )
+    session.add(new_healthstack)
+    await session.commit()
+    await session.refresh(new_healthstack)
+    return new_healthstack